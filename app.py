@@ -1,15 +1,18 @@
 from flask import Flask
 from dependency_container import container
 from logging_config import configure_logging
-from auth import auth_bp, login_manager
-from routes import routes_bp
+from auth import auth_bp, can_access_deployment, login_manager
+from routes import routes_bp, markdown_converter
+from deployment_tasks import create_worker_pool
+from ml_model import get_model, ModelUnavailableError
+from node_health import get_node_health_monitor
+from metrics_aggregator import get_metrics_aggregator
+from event_bus import create_socketio, get_event_bus, register_socketio_handlers
+import http_metrics
 from flask_cors import CORS
 from flask_healthz import healthz
-from flask_socketio import SocketIO
-from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST
 import json
 import logging.config
-from datetime import datetime
 import os
 
 def create_app():
@@ -42,8 +45,14 @@ def create_app():
         }
     })
     
-    # Initialize SocketIO
-    socketio = SocketIO(app, cors_allowed_origins="*")
+    # Initialize SocketIO; with a message queue, events reach clients of every worker
+    socketio = create_socketio(app, app_config['socketio'])
+    container.register_service('socketio', socketio)
+    event_bus = get_event_bus()
+    register_socketio_handlers(
+        socketio, event_bus,
+        authorize=lambda user, deployment_id: can_access_deployment(
+            user, container.get_service('job_store').get_job(deployment_id)))
     
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -53,9 +62,41 @@ def create_app():
     # Initialize Flask-Login
     login_manager.init_app(app)
     
-    # Add Prometheus metrics
-    REQUESTS = Counter('web_requests_total', 'Total web requests', ['endpoint'])
-    LATENCY = Histogram('web_request_latency_seconds', 'Request latency', ['endpoint'])
+    # Pre-render the documentation pages so the first requests hit the cache
+    if app_config['docs']['warm_up']:
+        markdown_converter.warm_up()
+    
+    # Load the model at startup rather than on the first prediction; its arrays are memory-mapped,
+    # so gunicorn workers share them through the page cache
+    if app_config['ml']['preload']:
+        try:
+            get_model()
+        except ModelUnavailableError as e:
+            app.logger.warning(str(e))
+    
+    # Start in-process deployment workers unless they run via deployment_worker.py
+    jobs_config = app_config['jobs']
+    if jobs_config['run_in_app']:
+        worker_pool = create_worker_pool(container.get_service('job_store'), jobs_config,
+                                         on_output=event_bus.publish_output,
+                                         telemetry=container.get_service('telemetry_store'),
+                                         on_event=event_bus.publish)
+        worker_pool.start()
+        container.register_service('worker_pool', worker_pool)
+    
+    # Probe the Besu nodes in the background; the dashboard reads the latest snapshot
+    if app_config['nodes']['probe_in_app']:
+        node_health = get_node_health_monitor()
+        node_health.start()
+        container.register_service('node_health', node_health)
+    
+    # Sample the dashboard figures in the background so page views never compute them
+    metrics_aggregator = get_metrics_aggregator()
+    metrics_aggregator.start()
+    container.register_service('metrics_aggregator', metrics_aggregator)
+    
+    # Prometheus metrics labelled by route template, served at /metrics
+    http_metrics.init_app(app, on_latency=metrics_aggregator.observe_latency)
     
     # Health check functions
     def liveness():
@@ -77,10 +118,6 @@ def create_app():
         }
     )
     
-    @app.before_request
-    def before_request():
-        request.start_time = datetime.utcnow()
-    
     @app.after_request
     def after_request(response):
         try:
@@ -94,12 +131,6 @@ def create_app():
                 'Referrer-Policy': 'strict-origin-when-cross-origin'
             })
             
-            # Update metrics
-            if hasattr(request, 'start_time'):
-                latency = (datetime.utcnow() - request.start_time).total_seconds()
-                LATENCY.labels(endpoint=request.path).observe(latency)
-            REQUESTS.labels(endpoint=request.path).inc()
-            
         except Exception as e:
             app.logger.error(f"Error in after_request: {str(e)}")
             
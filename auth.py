@@ -1,10 +1,15 @@
-from flask import Blueprint, request, redirect, url_for, render_template, session, jsonify
+from flask import Blueprint, request, redirect, url_for, render_template, session, jsonify, make_response
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_oauthlib.client import OAuth
 import os
+import threading
 from datetime import datetime, timedelta
 import jwt
 from functools import wraps
+from dependency_container import container
+from token_cache import RedisRevocationStore, TokenVerifier
+from rate_limiter import get_rate_limiter, RATE_LIMIT_REJECTIONS
+import rate_limiter
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -50,6 +55,37 @@ class User(UserMixin):
     def has_role(self, role):
         return role in self.roles
 
+def _user_from_claims(claims):
+    return User(id=claims['user_id'], email=claims.get('email'), roles=claims.get('roles', []))
+
+_token_verifier = None
+_token_verifier_lock = threading.Lock()
+
+def get_token_verifier():
+    """Get the process-wide JWT verifier; the signing key is read once from the app config"""
+    global _token_verifier
+    if _token_verifier is None:
+        with _token_verifier_lock:
+            if _token_verifier is None:
+                try:
+                    app_config = container.get_config('app_config')
+                    secret_key = app_config['app']['jwt_secret_key']
+                    security_config = app_config['security']
+                except KeyError:
+                    secret_key = os.getenv('JWT_SECRET_KEY')
+                    security_config = {'rate_limit_backend': 'memory', 'redis_url': None}
+                # Share logouts between worker processes through the rate limiter's Redis
+                revocations = None
+                if security_config['rate_limit_backend'] == 'redis' and rate_limiter.redis is not None:
+                    revocations = RedisRevocationStore(rate_limiter.redis.Redis.from_url(security_config['redis_url']))
+                _token_verifier = TokenVerifier(secret_key, factory=_user_from_claims, revocations=revocations)
+    return _token_verifier
+
+def revoke_token(token):
+    """Stop accepting a token before it expires"""
+    if token:
+        get_token_verifier().revoke(token)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -65,8 +101,7 @@ def token_required(f):
             return {'message': 'Token is missing'}, 401
 
         try:
-            data = jwt.decode(token, os.getenv('JWT_SECRET_KEY'), algorithms=["HS256"])
-            current_user = User(id=data['user_id'], email=data.get('email'), roles=data.get('roles', []))
+            current_user = get_token_verifier().verify(token)
         except jwt.ExpiredSignatureError:
             return {'message': 'Token has expired'}, 401
         except jwt.InvalidTokenError:
@@ -82,7 +117,7 @@ def generate_token(user):
         'roles': user.roles,
         'exp': datetime.utcnow() + timedelta(days=1)
     }
-    return jwt.encode(token_data, os.getenv('JWT_SECRET_KEY'), algorithm='HS256')
+    return jwt.encode(token_data, get_token_verifier().secret_key, algorithm='HS256')
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -97,6 +132,12 @@ def load_user(user_id):
         )
     return None
 
+def can_access_deployment(user, job):
+    """Whether user may see or follow a deployment: admins, and the user who requested it"""
+    if job is None or not user.is_authenticated:
+        return False
+    return user.has_role('admin') or str(user.id) == job.get('requested_by')
+
 def requires_roles(*roles):
     def wrapper(f):
         @wraps(f)
@@ -113,20 +154,23 @@ def requires_roles(*roles):
 
 # Rate limiting decorator
 def rate_limit(max_requests=100, window=60):
+    """Limit each user (or client IP when anonymous) to max_requests per window seconds on an endpoint"""
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            if not hasattr(wrapped, '_requests'):
-                wrapped._requests = []
-            
-            now = datetime.utcnow()
-            wrapped._requests = [t for t in wrapped._requests if (now - t).seconds < window]
-            
-            if len(wrapped._requests) >= max_requests:
-                return jsonify({'error': 'Rate limit exceeded'}), 429
-                
-            wrapped._requests.append(now)
-            return f(*args, **kwargs)
+            if current_user.is_authenticated:
+                identity = f"user:{current_user.get_id()}"
+            else:
+                identity = f"ip:{request.remote_addr}"
+            result = get_rate_limiter().hit(f"{request.endpoint}:{identity}", max_requests, window)
+
+            if result.allowed:
+                response = make_response(f(*args, **kwargs))
+            else:
+                RATE_LIMIT_REJECTIONS.labels(endpoint=request.endpoint).inc()
+                response = make_response(jsonify({'error': 'Rate limit exceeded'}), 429)
+            response.headers.update(result.headers())
+            return response
         return wrapped
     return decorator
 
@@ -190,6 +234,7 @@ def authorized():
 @auth_bp.route('/logout')
 @login_required
 def logout():
+    revoke_token(session.get('jwt_token'))
     session.clear()
     logout_user()
     return redirect(url_for('auth.login'))
@@ -1,27 +1,19 @@
 import os
 import json
 import logging
-import subprocess
+import threading
 import requests
 from flask import jsonify
 from azure.identity import DefaultAzureCredential
-from azure.mgmt.resource import ResourceManagementClient
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.storage import StorageManagementClient
 from azure.mgmt.monitor import MonitorManagementClient
 from azure.core.exceptions import AzureError
-import re
 from datetime import datetime, timedelta
+from dependency_container import container
+from command_runner import AsyncCommandRunner, current_command_context
+from validation_schema import OPERATION_SCHEMA, error_messages
 
 logger = logging.getLogger(__name__)
 
-# Initialize Azure credentials and Resource Management client
-credential = DefaultAzureCredential()
-subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
-resource_client = ResourceManagementClient(credential, subscription_id)
-network_client = NetworkManagementClient(credential, subscription_id)
-storage_client = StorageManagementClient(credential, subscription_id)
-
 # Function to validate configuration data
 
 def validate_config_data(config):
@@ -32,50 +24,7 @@ def validate_config_data(config):
         else:
             config_data = config
 
-        errors = []
-        
-        # Required fields validation
-        required_fields = {
-            'name': r'^[a-zA-Z0-9-_]{3,64}$',
-            'location': r'^[a-zA-Z][a-zA-Z0-9-]+$',
-            'resource_group': r'^[a-zA-Z0-9-_]{3,64}$',
-            'vm_name': r'^[a-zA-Z][a-zA-Z0-9-]{2,63}$',
-            'admin_username': r'^[a-zA-Z][a-zA-Z0-9-]{2,31}$'
-        }
-
-        for field, pattern in required_fields.items():
-            value = config_data.get(field)
-            if not value:
-                errors.append(f"Missing required field: {field}")
-            elif not re.match(pattern, value):
-                errors.append(f"Invalid {field} format")
-
-        # Network configuration validation
-        if 'network' in config_data:
-            network = config_data['network']
-            if not re.match(r'^[a-zA-Z0-9-_]{2,64}$', network.get('vnet', '')):
-                errors.append("Invalid virtual network name")
-            if 'subnet_prefix' in network:
-                if not re.match(r'^([0-9]{1,3}\.){3}[0-9]{1,3}\/[0-9]{1,2}$', network['subnet_prefix']):
-                    errors.append("Invalid subnet prefix format")
-
-        # Security validation
-        if 'security' in config_data:
-            security = config_data['security']
-            for rule in security.get('firewall_rules', []):
-                if not 0 <= int(rule.get('port', -1)) <= 65535:
-                    errors.append(f"Invalid port number: {rule.get('port')}")
-
-        # Monitoring validation
-        if config_data.get('monitoring', {}).get('enabled'):
-            monitoring = config_data['monitoring']
-            try:
-                retention = int(monitoring.get('retention', 0))
-                if not 1 <= retention <= 365:
-                    errors.append("Retention period must be between 1 and 365 days")
-            except ValueError:
-                errors.append("Invalid retention period value")
-
+        errors = error_messages(OPERATION_SCHEMA.validate(config_data))
         return (None, errors) if errors else (config_data, None)
 
     except json.JSONDecodeError as e:
@@ -86,14 +35,51 @@ def validate_config_data(config):
 
 # Function to run a command
 
-def run_command(cmd):
+_command_runner = None
+_command_runner_lock = threading.Lock()
+
+
+def get_command_runner():
+    """Get the process-wide subprocess runner, sized from the commands config"""
+    global _command_runner
+    if _command_runner is None:
+        with _command_runner_lock:
+            if _command_runner is None:
+                try:
+                    commands_config = container.get_config('app_config')['commands']
+                except KeyError:
+                    commands_config = {'max_concurrency': 8, 'timeout': 1800, 'output_lines': 500}
+                _command_runner = AsyncCommandRunner(
+                    max_concurrency=commands_config['max_concurrency'],
+                    default_timeout=commands_config['timeout'],
+                    max_output_lines=commands_config['output_lines']
+                )
+    return _command_runner
+
+def run_command(cmd, timeout=None):
+    """Run a command; the current deployment step can cancel it and receives its output lines"""
+    context = current_command_context()
     try:
         logging.info("Executing command: %s", " ".join(cmd))
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT, universal_newlines=True)
-        return output
-    except subprocess.CalledProcessError as e:
-        logging.error("Command failed: %s", e.output)
-        return f"Error: {e.output}"
+        result = get_command_runner().run(
+            cmd,
+            timeout=timeout,
+            cancel_event=context.cancel_event if context else None,
+            on_line=context.on_line if context else None
+        )
+    except OSError as e:
+        logging.error("Command failed to start: %s", str(e))
+        return f"Error: {str(e)}"
+    if result.cancelled:
+        logging.info("Command cancelled: %s", " ".join(cmd))
+        return "Error: Command cancelled"
+    if result.timed_out:
+        logging.error("Command timed out after %.0fs: %s", result.duration, result.output)
+        return f"Error: Command timed out after {result.duration:.0f}s\n{result.output}"
+    if result.returncode != 0:
+        logging.error("Command failed: %s", result.output)
+        return f"Error: {result.output}"
+    return result.output
 
 # Function to create a resource group
 
@@ -101,8 +87,7 @@ def create_resource_group(config):
     config_data, error = validate_config_data(config)
     if error:
         return error
-    cmd = ["az", "group", "create", "--name", config_data.get("name", "BesuResourceGroup"), "--location", config_data.get("location", "eastus")]
-    return run_command(cmd)
+    return get_backend().create_resource_group(config_data)
 
 # Function to deploy a virtual machine
 
@@ -110,15 +95,7 @@ def deploy_vm(config):
     config_data, error = validate_config_data(config)
     if error:
         return error
-    cmd = [
-        "az", "vm", "create",
-        "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
-        "--name", config_data.get("vm_name", "BesuNode1"),
-        "--image", config_data.get("image", "UbuntuLTS"),
-        "--admin-username", config_data.get("admin_username", "azureuser"),
-        "--generate-ssh-keys"
-    ]
-    return run_command(cmd)
+    return get_backend().deploy_vm(config_data)
 
 # Function to deploy via REST API
 
@@ -167,13 +144,7 @@ def create_network(config):
     config_data, error = validate_config_data(config)
     if error:
         return error
-    cmd = [
-        "az", "network", "vnet", "create",
-        "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
-        "--name", config_data.get("vnet_name", "BesuVNet"),
-        "--address-prefix", config_data.get("address_prefix", "10.0.0.0/16")
-    ]
-    return run_command(cmd)
+    return get_backend().create_network(config_data)
 
 # Function to create a storage account
 
@@ -181,15 +152,148 @@ def create_storage_account(config):
     config_data, error = validate_config_data(config)
     if error:
         return error
-    cmd = [
-        "az", "storage", "account", "create",
-        "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
-        "--name", config_data.get("storage_account_name", "besustorage"),
-        "--sku", config_data.get("sku", "Standard_LRS"),
-        "--kind", config_data.get("kind", "StorageV2"),
-        "--location", config_data.get("location", "eastus")
-    ]
-    return run_command(cmd)
+    return get_backend().create_storage_account(config_data)
+
+# Execution backends
+
+class CliBackend:
+    """Runs operations through the az CLI, one subprocess per operation"""
+
+    name = 'cli'
+
+    def create_resource_group(self, config_data):
+        cmd = ["az", "group", "create", "--name", config_data.get("name", "BesuResourceGroup"), "--location", config_data.get("location", "eastus")]
+        return run_command(cmd)
+
+    def deploy_vm(self, config_data):
+        cmd = [
+            "az", "vm", "create",
+            "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
+            "--name", config_data.get("vm_name", "BesuNode1"),
+            "--image", config_data.get("image", "UbuntuLTS"),
+            "--admin-username", config_data.get("admin_username", "azureuser"),
+            "--generate-ssh-keys"
+        ]
+        return run_command(cmd)
+
+    def create_network(self, config_data):
+        cmd = [
+            "az", "network", "vnet", "create",
+            "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
+            "--name", config_data.get("vnet_name", "BesuVNet"),
+            "--address-prefix", config_data.get("address_prefix", "10.0.0.0/16")
+        ]
+        return run_command(cmd)
+
+    def create_storage_account(self, config_data):
+        cmd = [
+            "az", "storage", "account", "create",
+            "--resource-group", config_data.get("resource_group", "BesuResourceGroup"),
+            "--name", config_data.get("storage_account_name", "besustorage"),
+            "--sku", config_data.get("sku", "Standard_LRS"),
+            "--kind", config_data.get("kind", "StorageV2"),
+            "--location", config_data.get("location", "eastus")
+        ]
+        return run_command(cmd)
+
+
+class SdkBackend:
+    """Runs operations through the shared Azure SDK clients of the service container.
+
+    Results and failures are returned as strings, like the CLI backend does.
+    VM creation needs a compute client plus NIC, public IP and SSH key
+    provisioning that `az vm create` does for us, so it goes to the fallback.
+    """
+
+    name = 'sdk'
+
+    def __init__(self, resource_client, network_client, storage_client, fallback):
+        self.resource_client = resource_client
+        self.network_client = network_client
+        self.storage_client = storage_client
+        self.fallback = fallback
+
+    def _run(self, description, operation):
+        try:
+            logging.info("Executing SDK operation: %s", description)
+            result = operation()
+            return json.dumps(result.as_dict(), indent=4)
+        except AzureError as e:
+            logging.error("SDK operation failed: %s", str(e))
+            return f"Error: {str(e)}"
+
+    def create_resource_group(self, config_data):
+        name = config_data.get("name", "BesuResourceGroup")
+        return self._run(f"create resource group {name}", lambda: self.resource_client.resource_groups.create_or_update(
+            name,
+            {"location": config_data.get("location", "eastus")}
+        ))
+
+    def deploy_vm(self, config_data):
+        return self.fallback.deploy_vm(config_data)
+
+    def create_network(self, config_data):
+        name = config_data.get("vnet_name", "BesuVNet")
+        return self._run(f"create virtual network {name}", lambda: self.network_client.virtual_networks.begin_create_or_update(
+            config_data.get("resource_group", "BesuResourceGroup"),
+            name,
+            {
+                "location": config_data.get("location", "eastus"),
+                "address_space": {"address_prefixes": [config_data.get("address_prefix", "10.0.0.0/16")]}
+            }
+        ).result())
+
+    def create_storage_account(self, config_data):
+        name = config_data.get("storage_account_name", "besustorage")
+        return self._run(f"create storage account {name}", lambda: self.storage_client.storage_accounts.begin_create(
+            config_data.get("resource_group", "BesuResourceGroup"),
+            name,
+            {
+                "sku": {"name": config_data.get("sku", "Standard_LRS")},
+                "kind": config_data.get("kind", "StorageV2"),
+                "location": config_data.get("location", "eastus")
+            }
+        ).result())
+
+
+EXECUTION_BACKENDS = ('sdk', 'cli')
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name):
+    """Create an execution backend by name, falling back to the CLI when SDK clients are unavailable"""
+    if name not in EXECUTION_BACKENDS:
+        raise ValueError(f"Unknown Azure execution backend: {name}. Must be one of: {', '.join(EXECUTION_BACKENDS)}")
+    cli_backend = CliBackend()
+    if name == 'cli':
+        return cli_backend
+    try:
+        return SdkBackend(
+            container.get_service('resource_client'),
+            container.get_service('network_client'),
+            container.get_service('storage_client'),
+            fallback=cli_backend
+        )
+    except KeyError as e:
+        logger.warning(f"Azure SDK clients not available ({str(e)}), using the az CLI backend")
+        return cli_backend
+
+
+def get_backend():
+    """Get the configured execution backend (created once per process)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                try:
+                    name = container.get_config('app_config')['azure']['execution_backend']
+                except KeyError:
+                    name = os.getenv('AZURE_EXECUTION_BACKEND', 'sdk')
+                _backend = create_backend(name)
+                logger.info(f"Using Azure execution backend: {_backend.name}")
+    return _backend
 
 # Function to setup monitoring and alerts
 
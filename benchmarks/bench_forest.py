@@ -0,0 +1,45 @@
+"""Compare scikit-learn and compiled forest prediction latency.
+
+Usage: python benchmarks/bench_forest.py [--trees 100] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sklearn.ensemble import RandomForestClassifier
+from feature_encoder import FeatureEncoder
+from forest_compiler import CompiledForest, ForestPredictor, compile_forest
+from train_model import generate_configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compiled forest prediction')
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--max-rows', type=int, default=500, help='ForestPredictor batch size threshold')
+    args = parser.parse_args()
+
+    configs, y = generate_configs(1000)
+    encoder = FeatureEncoder()
+    X = encoder.fit_transform(configs)
+    model = RandomForestClassifier(n_estimators=args.trees, random_state=42).fit(X, y)
+    with tempfile.TemporaryDirectory() as directory:
+        compile_forest(model, X, directory)
+        compiled = CompiledForest.load(directory)
+        served = ForestPredictor(compiled, lambda: model, args.max_rows)
+
+        def measure(predictor, batch):
+            return min(timeit.repeat(lambda: predictor.predict(batch), number=args.repeat, repeat=3)) / args.repeat * 1e3
+
+        print(f"{'rows':>6}{'sklearn ms':>14}{'compiled ms':>14}{'served ms':>12}{'speedup':>10}")
+        for rows in (1, 10, 100, 250, 500, 1000):
+            batch = X[:rows]
+            sklearn_ms, compiled_ms, served_ms = measure(model, batch), measure(compiled, batch), measure(served, batch)
+            print(f"{rows:>6}{sklearn_ms:>14.3f}{compiled_ms:>14.3f}{served_ms:>12.3f}{sklearn_ms / served_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
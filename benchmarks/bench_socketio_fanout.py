@@ -0,0 +1,169 @@
+"""Load benchmark of deployment event fan-out across SocketIO workers.
+
+Starts --workers server processes sharing a message queue, connects clients
+spread evenly over them to one deployment room, publishes events from the
+first worker and reports how long they take to reach every client.
+
+Usage: python benchmarks/bench_socketio_fanout.py --workers 4 --message-queue redis://localhost:6379/0 --clients 10,100,500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEPLOYMENT_ID = 'dep-benchmark'
+
+
+def serve(port, message_queue, flush_interval):
+    """One worker: the app's SocketIO setup and event bus, plus a route that publishes events"""
+    from flask import Flask, request
+    from flask_login import AnonymousUserMixin, LoginManager
+    from event_bus import DeploymentEventBus, create_socketio, register_socketio_handlers
+
+    class BenchmarkUser(AnonymousUserMixin):
+        id = 'benchmark'
+
+        @property
+        def is_authenticated(self):
+            return True
+
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+    login_manager.anonymous_user = BenchmarkUser
+    socketio = create_socketio(app, {'message_queue': message_queue, 'async_mode': 'threading'})
+    bus = DeploymentEventBus(lambda event, data, room: socketio.emit(event, data, to=room),
+                             flush_interval=flush_interval)
+    register_socketio_handlers(socketio, bus)
+
+    @app.route('/publish', methods=['POST'])
+    def publish():
+        events, rate = int(request.args['events']), float(request.args['rate'])
+        for i in range(events):
+            bus.publish(DEPLOYMENT_ID, 'step', {'i': i, 'sent': time.time()})
+            time.sleep(1 / rate)
+        bus.flush()
+        return {'published': events}
+
+    @app.route('/ready')
+    def ready():
+        return 'ok'
+
+    socketio.run(app, host='127.0.0.1', port=port)
+
+
+def _wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Worker on port {port} did not start')
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000 if values else float('nan')
+
+
+def run_round(ports, clients, events, rate, transport):
+    import socketio
+
+    latencies = []
+    received = [0]
+    lock = threading.Lock()
+    connections = []
+
+    for n in range(clients):
+        client = socketio.Client(reconnection=False)
+
+        def on_events(batch):
+            now = time.time()
+            with lock:
+                for envelope in batch['events']:
+                    latencies.append(now - envelope['data']['sent'])
+                    received[0] += 1
+
+        client.on('deployment_events', on_events)
+        client.connect(f'http://127.0.0.1:{ports[n % len(ports)]}', transports=[transport])
+        client.emit('subscribe', {'deployment_id': DEPLOYMENT_ID, 'last_seq': 10 ** 9})
+        connections.append(client)
+    time.sleep(1)  # Let every subscription be processed
+
+    started = time.time()
+    request = urllib.request.Request(f'http://127.0.0.1:{ports[0]}/publish?events={events}&rate={rate}',
+                                     method='POST')
+    urllib.request.urlopen(request, timeout=events / rate + 60)
+    expected = events * clients
+    deadline = time.time() + 30
+    while time.time() < deadline and received[0] < expected:
+        time.sleep(0.05)
+    elapsed = time.time() - started
+
+    for client in connections:
+        client.disconnect()
+    with lock:
+        return {
+            'clients': clients,
+            'delivered': received[0] / expected * 100,
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'throughput': received[0] / elapsed
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SocketIO event fan-out across workers')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--message-queue', help='Required with more than one worker, e.g. redis://localhost:6379/0')
+    parser.add_argument('--clients', default='10,50,100', help='Comma-separated client counts, one round each')
+    parser.add_argument('--events', type=int, default=50, help='Events published per round')
+    parser.add_argument('--rate', type=float, default=100.0, help='Events published per second')
+    parser.add_argument('--flush-interval', type=float, default=0.1, help='Event bus batching interval')
+    parser.add_argument('--transport', default='polling', choices=['polling', 'websocket'])
+    parser.add_argument('--base-port', type=int, default=5600)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.message_queue, args.flush_interval)
+        return 0
+    if args.workers > 1 and not args.message_queue:
+        parser.error('--message-queue is needed for events to reach clients of other workers')
+
+    ports = [args.base_port + i for i in range(args.workers)]
+    servers = []
+    for port in ports:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', str(port),
+                   '--flush-interval', str(args.flush_interval)]
+        if args.message_queue:
+            command += ['--message-queue', args.message_queue]
+        servers.append(subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    try:
+        for port in ports:
+            _wait_ready(port)
+        print(f"{args.workers} workers, {args.events} events at {args.rate:g}/s, "
+              f"flush interval {args.flush_interval:g}s, {args.transport}")
+        print(f"{'clients':>8}{'delivered %':>13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'msgs/s':>10}")
+        for clients in (int(c) for c in args.clients.split(',')):
+            result = run_round(ports, clients, args.events, args.rate, args.transport)
+            print(f"{result['clients']:>8}{result['delivered']:>13.1f}{result['p50']:>10.1f}"
+                  f"{result['p95']:>10.1f}{result['p99']:>10.1f}{result['throughput']:>10,.0f}")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
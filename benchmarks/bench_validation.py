@@ -0,0 +1,54 @@
+"""Micro-benchmark of the compiled validation schemas.
+
+Usage: python benchmarks/bench_validation.py [--iterations N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from validation_schema import SIMPLE_SCHEMA, EXPERT_SCHEMA, OPERATION_SCHEMA
+
+CASES = {
+    'simple/valid': (SIMPLE_SCHEMA, {
+        'resourceGroup': 'my-resource-group', 'location': 'eastus',
+        'nodeType': 'validator', 'vmSize': 'Standard_D2s_v3'
+    }),
+    'simple/invalid': (SIMPLE_SCHEMA, {
+        'resourceGroup': 'rg; rm -rf /', 'location': 'mars',
+        'nodeType': 'miner', 'vmSize': 'huge'
+    }),
+    'expert/valid': (EXPERT_SCHEMA, {
+        'network': {'vnetName': 'test-vnet', 'subnetPrefix': '10.0.0.0/24'},
+        'nodes': {'count': 4, 'consensusProtocol': 'qbft'},
+        'monitoring': {'enabled': True, 'retention': 30, 'alertEmail': 'ops@example.com'},
+        'security': {'firewall_rules': [{'port': 30303, 'protocol': 'TCP'},
+                                        {'port': 8545, 'protocol': 'TCP', 'sourceAddress': '10.0.0.4'}]}
+    }),
+    'expert/invalid': (EXPERT_SCHEMA, {
+        'network': {'vnetName': '!', 'subnetPrefix': '10.0.0.0/8'},
+        'nodes': {'count': 50, 'consensusProtocol': 'pow'},
+        'monitoring': {'enabled': True, 'retention': 0, 'alertEmail': 'nobody'},
+        'security': {'firewall_rules': [{'port': 0, 'protocol': 'icmp'}]}
+    }),
+    'operation/valid': (OPERATION_SCHEMA, {
+        'name': 'rg-1', 'location': 'eastus', 'resource_group': 'rg-1',
+        'vm_name': 'node-1', 'admin_username': 'azureuser'
+    })
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled validation schemas')
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'case':<18}{'validations/s':>16}{'us/validation':>16}")
+    for name, (schema, config) in CASES.items():
+        elapsed = min(timeit.repeat(lambda: schema.validate(config), number=args.iterations, repeat=3))
+        print(f"{name:<18}{args.iterations / elapsed:>16,.0f}{elapsed / args.iterations * 1e6:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
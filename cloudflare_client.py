@@ -0,0 +1,189 @@
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Histogram
+
+CF_API_BASE = "https://api.cloudflare.com/client/v4"
+# Cloudflare allows 1200 requests per 5 minutes per user
+DEFAULT_RATE = 4.0
+DEFAULT_BURST = 20
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+CF_API_LATENCY = Histogram('cloudflare_api_latency_seconds', 'Cloudflare API call latency',
+                           ['method', 'endpoint', 'status'])
+CF_API_RETRIES = Counter('cloudflare_api_retries_total', 'Cloudflare API calls retried', ['reason'])
+
+_ID_RE = re.compile(r'/[0-9a-f]{32}(?=/|$)')
+
+
+class CloudflareAPIError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, body: Any = None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, up to capacity.
+
+    acquire() reserves a token and sleeps until it is due, so callers are
+    served in order and the long-run rate never exceeds rate.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, waiting if needed; returns the time waited"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class CloudflareClient:
+    """Shared Cloudflare API client.
+
+    Calls go through one pooled requests.Session, wait for a token bucket
+    sized to the API rate limit and are retried with exponential backoff on
+    connection errors, 429 and 5xx, honoring Retry-After. map() runs calls
+    on a bounded thread pool.
+    """
+
+    def __init__(self, api_key: str, email: str, base_url: str = CF_API_BASE,
+                 max_workers: int = 8, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                 timeout: tuple = (5, 30), session: Optional[requests.Session] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        session.headers.update({
+            "X-Auth-Email": email,
+            "X-Auth-Key": api_key,
+            "Content-Type": "application/json"
+        })
+        self.session = session
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """Call the API and return the decoded body; raises CloudflareAPIError on failure"""
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        endpoint = _ID_RE.sub('/:id', '/' + path.lstrip('/'))
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                CF_API_LATENCY.labels(method, endpoint, 'error').observe(time.monotonic() - started)
+                if attempt == self.max_retries:
+                    raise CloudflareAPIError(f"{method} {endpoint} failed: {e}")
+                CF_API_RETRIES.labels('connection').inc()
+                self.sleep(self._delay(attempt))
+                continue
+            CF_API_LATENCY.labels(method, endpoint, str(response.status_code)).observe(
+                time.monotonic() - started)
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                CF_API_RETRIES.labels(str(response.status_code)).inc()
+                delay = self._delay(attempt, _retry_after(response))
+                self.logger.warning(f"{method} {endpoint} returned {response.status_code}, "
+                                    f"retrying in {delay:.1f}s")
+                self.sleep(delay)
+                continue
+
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if response.status_code != 200 or not body or not body.get('success'):
+                raise CloudflareAPIError(f"{method} {endpoint} returned {response.status_code}",
+                                         response.status_code, body)
+            return body
+        raise CloudflareAPIError(f"{method} {endpoint} failed after {self.max_retries} retries")
+
+    def get(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> Dict[str, Any]:
+        return self.request('DELETE', path, **kwargs)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Apply fn to every item on the worker pool; results keep the order of items"""
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='cloudflare')
+        return list(self._executor.map(fn, items))
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
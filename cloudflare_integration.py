@@ -3,9 +3,11 @@
 import os
 import json
 import argparse
-import requests
-import time
+import threading
 from dotenv import load_dotenv
+from cloudflare_client import CloudflareClient, CloudflareAPIError, DEFAULT_RATE
+from cloudflare_purge import PurgeQueue, DEFAULT_WINDOW
+from cloudflare_rules import page_rule_key, sync_firewall_rules, sync_page_rules
 
 # Load environment variables from .env file
 load_dotenv()
@@ -25,101 +27,115 @@ def get_cloudflare_credentials():
     
     return api_key, email, zone_id
 
+_clients = {}
+_purge_queues = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key, email):
+    """Shared API client for a set of credentials (CF_MAX_WORKERS, CF_RATE_LIMIT tune it)"""
+    with _clients_lock:
+        client = _clients.get((api_key, email))
+        if client is None:
+            client = CloudflareClient(
+                api_key, email,
+                max_workers=int(os.getenv('CF_MAX_WORKERS', '8')),
+                rate=float(os.getenv('CF_RATE_LIMIT', str(DEFAULT_RATE)))
+            )
+            _clients[(api_key, email)] = client
+        return client
+
+def _report_failure(message, error):
+    print(message)
+    print(f"Response: {error.body if error.body is not None else error}")
+
 def create_dns_record(api_key, email, zone_id, record):
     """Create a DNS record in Cloudflare"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.post(url, headers=headers, json=record)
-    
-    if response.status_code == 200 and response.json()["success"]:
-        print(f"Successfully created DNS record for {record['name']}")
-        return response.json()["result"]
-    else:
-        print(f"Failed to create DNS record for {record['name']}")
-        print(f"Response: {response.json()}")
+    try:
+        result = get_client(api_key, email).post(f"zones/{zone_id}/dns_records", json=record)["result"]
+    except CloudflareAPIError as e:
+        _report_failure(f"Failed to create DNS record for {record['name']}", e)
         return None
+    print(f"Successfully created DNS record for {record['name']}")
+    return result
 
 def update_dns_record(api_key, email, zone_id, record_id, record):
     """Update a DNS record in Cloudflare"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{record_id}"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.put(url, headers=headers, json=record)
-    
-    if response.status_code == 200 and response.json()["success"]:
-        print(f"Successfully updated DNS record for {record['name']}")
-        return response.json()["result"]
-    else:
-        print(f"Failed to update DNS record for {record['name']}")
-        print(f"Response: {response.json()}")
+    try:
+        result = get_client(api_key, email).put(
+            f"zones/{zone_id}/dns_records/{record_id}", json=record)["result"]
+    except CloudflareAPIError as e:
+        _report_failure(f"Failed to update DNS record for {record['name']}", e)
         return None
+    print(f"Successfully updated DNS record for {record['name']}")
+    return result
 
 def get_dns_records(api_key, email, zone_id, name=None):
     """Get DNS records from Cloudflare"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
     params = {}
     if name:
         params["name"] = name
-    
-    response = requests.get(url, headers=headers, params=params)
-    
-    if response.status_code == 200 and response.json()["success"]:
-        return response.json()["result"]
-    else:
-        print("Failed to get DNS records")
-        print(f"Response: {response.json()}")
+    try:
+        return get_client(api_key, email).get(f"zones/{zone_id}/dns_records", params=params)["result"]
+    except CloudflareAPIError as e:
+        _report_failure("Failed to get DNS records", e)
         return []
 
-def purge_cache(api_key, email, zone_id, urls=None):
-    """Purge Cloudflare cache for specific URLs or everything"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/purge_cache"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # If URLs are specified, purge cache for those URLs.
-    # Otherwise, purge everything
-    if urls:
-        data = {"files": urls}
-    else:
-        data = {"purge_everything": True}
-    
-    response = requests.post(url, headers=headers, json=data)
-    
-    if response.status_code == 200 and response.json()["success"]:
-        print("Successfully purged cache")
+def get_purge_queue(api_key, email, zone_id):
+    """Shared purge queue of a zone (CF_PURGE_WINDOW sets its coalescing window in seconds)"""
+    with _clients_lock:
+        queue = _purge_queues.get((api_key, email, zone_id))
+    if queue is None:
+        queue = PurgeQueue(get_client(api_key, email), zone_id,
+                           window=float(os.getenv('CF_PURGE_WINDOW', str(DEFAULT_WINDOW))))
+        with _clients_lock:
+            queue = _purge_queues.setdefault((api_key, email, zone_id), queue)
+    return queue
+
+def purge_cache(api_key, email, zone_id, urls=None, hosts=None, prefixes=None,
+                purge_everything=False, wait=True):
+    """Purge Cloudflare cache for specific URLs, hosts or prefixes, or everything.
+
+    Purges are queued and coalesced with others made within a short window;
+    purge_everything affects every site on the zone, so it must be asked for.
+    """
+    if not (urls or hosts or prefixes or purge_everything):
+        print("Nothing to purge")
         return True
-    else:
-        print("Failed to purge cache")
-        print(f"Response: {response.json()}")
+
+    future = get_purge_queue(api_key, email, zone_id).add(
+        files=urls or (), hosts=hosts or (), prefixes=prefixes or (), everything=purge_everything)
+    if not wait:
+        return future
+    try:
+        result = future.result()
+    except Exception as e:
+        print(f"Failed to purge cache: {str(e)}")
         return False
+    if result.success:
+        print(f"Successfully purged cache ({result.requests} requests)")
+        return True
+    print("Failed to purge cache")
+    for error in result.errors:
+        print(f"Response: {error}")
+    return False
+
+def _zone_of(node_configs):
+    return node_configs[0]["server_name"].split('.', 1)[1] if node_configs else ''
+
+def _report_rule_plan(plan, key):
+    print(plan.describe(key))
+    if plan.errors:
+        print(f"Failed to sync {plan.kind}s")
+        for error in plan.errors:
+            print(f"Response: {error}")
+    elif plan.changes:
+        print(f"Successfully synced {plan.kind}s")
+
+def setup_page_rules(api_key, email, zone_id, node_configs, zone_name=None, prune=False, plan_only=False):
+    """Sync page rules for caching and security: existing matching rules are kept,
+    changed ones updated and rules of nodes no longer configured removed"""
+    rules = []
 
-def setup_page_rules(api_key, email, zone_id, node_configs):
-    """Set up page rules for caching and security"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/pagerules"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
     # Create page rules for each node
     for node_config in node_configs:
         server_name = node_config["server_name"]
@@ -166,24 +182,15 @@ def setup_page_rules(api_key, email, zone_id, node_configs):
             "status": "active"
         }
         
-        # Send request to create rules
-        for rule in [rule1, rule2]:
-            response = requests.post(url, headers=headers, json=rule)
-            if response.status_code == 200 and response.json()["success"]:
-                print(f"Successfully created page rule for {server_name}")
-            else:
-                print(f"Failed to create page rule for {server_name}")
-                print(f"Response: {response.json()}")
-
-def setup_firewall_rules(api_key, email, zone_id):
-    """Set up firewall rules to protect against common attacks"""
-    url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/firewall/rules"
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
-    
+        rules.extend([rule1, rule2])
+
+    plan = sync_page_rules(get_client(api_key, email), zone_id, zone_name or _zone_of(node_configs),
+                           rules, prune=prune, plan_only=plan_only)
+    _report_rule_plan(plan, page_rule_key)
+    return plan
+
+def setup_firewall_rules(api_key, email, zone_id, prune=False, plan_only=False):
+    """Sync firewall rules to protect against common attacks"""
     # Create some basic firewall rules
     rules = [
         {
@@ -193,6 +200,7 @@ def setup_firewall_rules(api_key, email, zone_id):
             },
             "action": "allow",
             "description": "Allow JSON-RPC POST requests",
+            "ref": "deployer-allow-json-rpc-post",
             "paused": False
         },
         {
@@ -202,6 +210,7 @@ def setup_firewall_rules(api_key, email, zone_id):
             },
             "action": "block",
             "description": "Block non-POST/OPTIONS requests to JSON-RPC",
+            "ref": "deployer-block-json-rpc-methods",
             "paused": False
         },
         {
@@ -211,32 +220,156 @@ def setup_firewall_rules(api_key, email, zone_id):
             },
             "action": "block",
             "description": "Block JSON-RPC requests from outside allowed countries",
+            "ref": "deployer-geo-restrict-json-rpc",
             "paused": True
         }
     ]
     
-    # Send request to create rules
-    for rule in rules:
-        response = requests.post(url, headers=headers, json=rule)
-        if response.status_code == 200 and response.json()["success"]:
-            print(f"Successfully created firewall rule: {rule['description']}")
-        else:
-            print(f"Failed to create firewall rule: {rule['description']}")
-            print(f"Response: {response.json()}")
-
-def deploy_dns_records(api_key, email, zone_id, dns_records):
-    """Deploy DNS records to Cloudflare"""
-    for record in dns_records:
-        # Check if record already exists
-        existing_records = get_dns_records(api_key, email, zone_id, f"{record['name']}.{record['zone_name']}")
-        
-        if existing_records:
-            # Update existing record
-            record_id = existing_records[0]["id"]
-            update_dns_record(api_key, email, zone_id, record_id, record)
-        else:
-            # Create new record
-            create_dns_record(api_key, email, zone_id, record)
+    plan = sync_firewall_rules(get_client(api_key, email), zone_id, rules, prune=prune, plan_only=plan_only)
+    _report_rule_plan(plan, lambda rule: rule.get("ref") or rule.get("description"))
+    return plan
+
+DNS_PAGE_SIZE = 100
+# Marks records created by this script, so --prune-dns never deletes anything else
+MANAGED_COMMENT = "managed by cloudflare_integration.py"
+
+def delete_dns_record(api_key, email, zone_id, record):
+    """Delete a DNS record in Cloudflare"""
+    try:
+        get_client(api_key, email).delete(f"zones/{zone_id}/dns_records/{record['id']}")
+    except CloudflareAPIError as e:
+        _report_failure(f"Failed to delete DNS record for {record['name']}", e)
+        return False
+    print(f"Successfully deleted DNS record for {record['name']}")
+    return True
+
+def list_dns_records(api_key, email, zone_id, per_page=DNS_PAGE_SIZE):
+    """Get every DNS record of the zone, following pagination.
+
+    Returns the records and the number of API calls it took.
+    """
+    client = get_client(api_key, email)
+    records = []
+    page = 1
+    while True:
+        body = client.get(f"zones/{zone_id}/dns_records", params={"page": page, "per_page": per_page})
+        records.extend(body["result"])
+        total_pages = body.get("result_info", {}).get("total_pages", 1)
+        if page >= total_pages or not body["result"]:
+            return records, page
+        page += 1
+
+def index_dns_records(records):
+    """Index records by (type, name); names are lower-case FQDNs"""
+    index = {}
+    for record in records:
+        index.setdefault((record["type"], record["name"].lower()), []).append(record)
+    return index
+
+def desired_dns_record(record, zone_name):
+    """Cloudflare payload of a record from the DNS records file"""
+    name = record["name"]
+    if name != zone_name and not name.endswith(f".{zone_name}"):
+        name = f"{name}.{zone_name}"
+    return {
+        "type": record["type"],
+        "name": name.lower(),
+        "content": record["content"],
+        "ttl": record.get("ttl", 1),
+        "proxied": record.get("proxied", False),
+        "comment": record.get("comment", MANAGED_COMMENT)
+    }
+
+def _record_differs(desired, actual):
+    fields = ["content", "proxied", "comment"]
+    # Proxied records always report an automatic TTL
+    if not desired["proxied"]:
+        fields.append("ttl")
+    return any(desired[field] != actual.get(field) for field in fields)
+
+class DnsPlan:
+    """Changes that bring the zone in line with the desired records"""
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = []
+        self.list_calls = 0
+
+    @property
+    def api_calls(self):
+        return self.list_calls + len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def describe(self):
+        lines = [f"+ create {r['type']} {r['name']} -> {r['content']}" for r in self.creates]
+        lines += [f"~ update {r['type']} {r['name']} -> {r['content']}" for _, r in self.updates]
+        lines += [f"- delete {r['type']} {r['name']} ({r['content']})" for r in self.deletes]
+        lines.append(f"{len(self.creates)} to create, {len(self.updates)} to update, "
+                     f"{len(self.deletes)} to delete, {len(self.unchanged)} unchanged")
+        return "\n".join(lines)
+
+def plan_dns_changes(desired_records, index, prune=False):
+    """Diff desired records against the zone index.
+
+    A name may carry several records of one type (round-robin A records, SPF
+    next to verification TXT records): desired records are matched to existing
+    ones by content first, then in order. Existing records left over are only
+    deleted with prune, and only when they carry MANAGED_COMMENT.
+    """
+    plan = DnsPlan()
+    grouped = {}
+    for desired in desired_records:
+        grouped.setdefault((desired["type"], desired["name"]), []).append(desired)
+    leftover = []
+    for key, desired_group in grouped.items():
+        existing = list(index.get(key, []))
+        unmatched = []
+        for desired in desired_group:
+            match = next((r for r in existing if r.get("content") == desired["content"]), None)
+            if match is None:
+                unmatched.append(desired)
+                continue
+            existing.remove(match)
+            if _record_differs(desired, match):
+                plan.updates.append((match["id"], desired))
+            else:
+                plan.unchanged.append(desired)
+        for desired in unmatched:
+            if existing:
+                plan.updates.append((existing.pop(0)["id"], desired))
+            else:
+                plan.creates.append(desired)
+        leftover.extend(existing)
+    leftover.extend(record for key, records in index.items() if key not in grouped for record in records)
+    if prune:
+        plan.deletes.extend(record for record in leftover if record.get("comment") == MANAGED_COMMENT)
+    return plan
+
+def deploy_dns_records(api_key, email, zone_id, dns_records, plan_only=False, prune=False):
+    """Reconcile DNS records with Cloudflare using one paginated listing of the zone.
+
+    Only records that are missing or differ are written. Returns the plan.
+    """
+    zone_records, list_calls = list_dns_records(api_key, email, zone_id)
+    desired = [desired_dns_record(record, record['zone_name']) for record in dns_records]
+    plan = plan_dns_changes(desired, index_dns_records(zone_records), prune=prune)
+    plan.list_calls = list_calls
+    print(plan.describe())
+    if plan_only:
+        return plan
+
+    # Changes are independent of each other, so they run concurrently
+    changes = ([lambda r=record: create_dns_record(api_key, email, zone_id, r) for record in plan.creates] +
+               [lambda i=record_id, r=record: update_dns_record(api_key, email, zone_id, i, r)
+                for record_id, record in plan.updates] +
+               [lambda r=record: delete_dns_record(api_key, email, zone_id, r) for record in plan.deletes])
+    get_client(api_key, email).map(lambda change: change(), changes)
+
+    # Previously every record cost a lookup plus a write
+    saved = 2 * len(dns_records) - plan.api_calls
+    print(f"Cloudflare API calls: {plan.api_calls} ({saved} saved over per-record lookups)")
+    return plan
 
 def main():
     parser = argparse.ArgumentParser(description='Deploy Cloudflare DNS records and configure CDN')
@@ -249,7 +382,15 @@ def main():
     parser.add_argument('--setup-firewall', action='store_true',
                         help='Set up firewall rules')
     parser.add_argument('--purge-cache', action='store_true',
-                        help='Purge cache after deployment')
+                        help='Purge the cache of the node hosts after deployment')
+    parser.add_argument('--purge-everything', action='store_true',
+                        help='Purge the cache of the whole zone, including other sites on it')
+    parser.add_argument('--plan', action='store_true',
+                        help='Show the DNS and rule changes that would be made without applying them')
+    parser.add_argument('--prune-rules', action='store_true',
+                        help='Delete managed page and firewall rules that are no longer wanted or duplicated')
+    parser.add_argument('--prune-dns', action='store_true',
+                        help='Delete records created by this script that are no longer in the file')
     
     args = parser.parse_args()
     
@@ -266,7 +407,7 @@ def main():
             record['zone_name'] = args.zone_name
         
         # Deploy DNS records
-        deploy_dns_records(api_key, email, zone_id, dns_records)
+        deploy_dns_records(api_key, email, zone_id, dns_records, plan_only=args.plan, prune=args.prune_dns)
         
         # Set up page rules if requested
         if args.setup_page_rules:
@@ -277,15 +418,23 @@ def main():
                 }
                 for record in dns_records
             ]
-            setup_page_rules(api_key, email, zone_id, node_configs)
+            setup_page_rules(api_key, email, zone_id, node_configs, zone_name=args.zone_name,
+                             prune=args.prune_rules, plan_only=args.plan)
         
         # Set up firewall rules if requested
         if args.setup_firewall:
-            setup_firewall_rules(api_key, email, zone_id)
+            setup_firewall_rules(api_key, email, zone_id, prune=args.prune_rules,
+                                 plan_only=args.plan)
+        
+        if args.plan:
+            return 0
         
         # Purge cache if requested
-        if args.purge_cache:
-            purge_cache(api_key, email, zone_id)
+        if args.purge_everything:
+            purge_cache(api_key, email, zone_id, purge_everything=True)
+        elif args.purge_cache:
+            purge_cache(api_key, email, zone_id,
+                        hosts=[f"{record['name']}.{args.zone_name}" for record in dns_records])
         
         print("Deployment completed successfully!")
         
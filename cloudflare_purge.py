@@ -0,0 +1,156 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter
+
+from cloudflare_client import CloudflareAPIError, CloudflareClient
+
+# Cloudflare accepts at most 30 files, hosts or prefixes per purge request
+PURGE_CHUNK_SIZE = 30
+DEFAULT_WINDOW = 2.0
+
+PURGE_ITEMS = Counter('cloudflare_purge_items_total', 'Items sent to Cloudflare cache purges', ['kind'])
+PURGE_COALESCED = Counter('cloudflare_purge_coalesced_total',
+                          'Purge items dropped as duplicates or covered by a host or prefix purge')
+
+
+def _normalize_host(host: str) -> str:
+    return host.strip().lower().rstrip('.')
+
+
+def _normalize_prefix(prefix: str) -> str:
+    # Prefixes are given without a scheme, e.g. node1.example.com/assets
+    parts = urlsplit(prefix if '://' in prefix else f'//{prefix}')
+    return f"{parts.netloc.lower()}{parts.path}".rstrip('/')
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class PurgeResult:
+    def __init__(self, requests: int = 0, purged: Optional[Dict[str, int]] = None,
+                 errors: Optional[List[str]] = None):
+        self.requests = requests
+        self.purged = purged or {}
+        self.errors = errors or []
+
+    @property
+    def success(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'requests': self.requests, 'purged': self.purged, 'errors': self.errors}
+
+
+class PurgeQueue:
+    """Collects cache purges for a zone and sends them together.
+
+    Purges added within window seconds of the first pending one are merged:
+    duplicates are dropped, as are files and prefixes already covered by a
+    host or shorter prefix in the same batch. The batch is split into
+    requests of chunk_size items that run concurrently on the client's pool.
+    add() returns a Future resolved with the PurgeResult of its batch.
+    """
+
+    def __init__(self, client: CloudflareClient, zone_id: str, window: float = DEFAULT_WINDOW,
+                 chunk_size: int = PURGE_CHUNK_SIZE):
+        self.client = client
+        self.zone_id = zone_id
+        self.window = window
+        self.chunk_size = chunk_size
+        self._files: Dict[str, None] = {}
+        self._hosts: Dict[str, None] = {}
+        self._prefixes: Dict[str, None] = {}
+        self._everything = False
+        self._waiters: List[Future] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def add(self, files: Iterable[str] = (), hosts: Iterable[str] = (), prefixes: Iterable[str] = (),
+            everything: bool = False) -> Future:
+        """Queue a purge; it is sent with everything else queued within the window"""
+        future = Future()
+        with self._lock:
+            self._files.update(dict.fromkeys(f.strip() for f in files if f.strip()))
+            self._hosts.update(dict.fromkeys(_normalize_host(h) for h in hosts if h.strip()))
+            self._prefixes.update(dict.fromkeys(_normalize_prefix(p) for p in prefixes if p.strip()))
+            self._everything = self._everything or everything
+            self._waiters.append(future)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def _payloads(self, files: List[str], hosts: List[str], prefixes: List[str],
+                  everything: bool) -> List[Dict[str, Any]]:
+        if everything:
+            return [{'purge_everything': True}]
+        host_set = set(hosts)
+        kept_prefixes = []
+        for prefix in sorted(prefixes, key=len):
+            covered = prefix.split('/', 1)[0] in host_set or any(
+                prefix == p or prefix.startswith(p + '/') for p in kept_prefixes)
+            if not covered:
+                kept_prefixes.append(prefix)
+        kept_files = []
+        for url in files:
+            parts = urlsplit(url)
+            location = f"{parts.netloc.lower()}{parts.path}"
+            if parts.netloc.lower() in host_set or any(
+                    location == p or location.startswith(p + '/') for p in kept_prefixes):
+                continue
+            kept_files.append(url)
+        dropped = len(files) + len(prefixes) - len(kept_files) - len(kept_prefixes)
+        if dropped:
+            PURGE_COALESCED.inc(dropped)
+
+        payloads = []
+        for kind, items in (('files', kept_files), ('hosts', hosts), ('prefixes', kept_prefixes)):
+            PURGE_ITEMS.labels(kind).inc(len(items))
+            payloads.extend({kind: chunk} for chunk in _chunks(items, self.chunk_size))
+        return payloads
+
+    def flush(self) -> PurgeResult:
+        """Send everything queued now; every waiter is resolved, with an exception if the batch failed"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            files, hosts, prefixes = list(self._files), list(self._hosts), list(self._prefixes)
+            everything, waiters = self._everything, self._waiters
+            self._files, self._hosts, self._prefixes = {}, {}, {}
+            self._everything, self._waiters = False, []
+
+        def send(payload):
+            try:
+                self.client.post(f"zones/{self.zone_id}/purge_cache", json=payload)
+                return None
+            except CloudflareAPIError as e:
+                return f"{', '.join(payload)}: {e.body if e.body is not None else e}"
+            except Exception as e:
+                return f"{', '.join(payload)}: {e.__class__.__name__}: {e}"
+
+        try:
+            payloads = self._payloads(files, hosts, prefixes, everything)
+            errors = [error for error in self.client.map(send, payloads) if error]
+        except Exception as e:
+            self.logger.error(f"Cache purge failed: {str(e)}")
+            for waiter in waiters:
+                waiter.set_exception(e)
+            raise
+        purged = {kind: sum(len(p[kind]) for p in payloads if kind in p)
+                  for kind in ('files', 'hosts', 'prefixes')}
+        result = PurgeResult(len(payloads), purged, errors)
+        if payloads:
+            self.logger.info(f"Purged {purged} in {len(payloads)} requests"
+                             + (f", {len(errors)} failed" if errors else ''))
+        for waiter in waiters:
+            waiter.set_result(result)
+        return result
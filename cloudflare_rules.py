@@ -0,0 +1,188 @@
+"""Idempotent sync of Cloudflare page rules and firewall rules.
+
+Existing rules are listed once and matched to the desired ones by key
+(the URL pattern of a page rule, the ref of a firewall rule). A rule whose
+content hash (target or expression plus actions) matches is left alone;
+changed rules are updated and missing ones created. Managed rules that are
+no longer wanted, or duplicate a wanted one, are only deleted with prune:
+page rules are recognized by shape alone, so a rule made by hand or for
+another deployment on a shared zone could otherwise be lost. Firewall changes go out as one bulk request
+per kind; page rules have no bulk API and are sent concurrently.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from cloudflare_client import CloudflareAPIError, CloudflareClient
+
+FIREWALL_PAGE_SIZE = 100
+# Prefix of the ref of firewall rules created by this module
+MANAGED_REF_PREFIX = 'deployer-'
+# Page rules have no name or comment; managed ones are recognized by shape
+_MANAGED_PAGE_RULES = (
+    (re.compile(r'^\*[^/*]+/json-rpc\*$'), {'id': 'cache_level', 'value': 'bypass'}),
+    (re.compile(r'^\*[^/*]+/\*$'), {'id': 'security_level', 'value': 'high'}),
+)
+
+
+def content_hash(content: Any) -> str:
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def page_rule_key(rule: Dict[str, Any]) -> str:
+    return rule['targets'][0]['constraint']['value']
+
+
+def page_rule_hash(rule: Dict[str, Any]) -> str:
+    # Priorities shift as rules are added elsewhere on the zone, so they are not compared
+    return content_hash({'targets': rule['targets'], 'actions': rule['actions'],
+                         'status': rule.get('status', 'active')})
+
+
+def is_managed_page_rule(rule: Dict[str, Any], zone_name: str) -> bool:
+    if len(rule.get('targets', [])) != 1 or len(rule.get('actions', [])) != 1:
+        return False
+    pattern = page_rule_key(rule)
+    action = {'id': rule['actions'][0].get('id'), 'value': rule['actions'][0].get('value')}
+    return pattern.split('/', 1)[0].endswith(f'.{zone_name}') and any(
+        regex.match(pattern) and action == managed_action for regex, managed_action in _MANAGED_PAGE_RULES)
+
+
+def firewall_rule_hash(rule: Dict[str, Any]) -> str:
+    return content_hash({'expression': rule['filter']['expression'],
+                         'filter_paused': rule['filter'].get('paused', False),
+                         'action': rule['action'], 'paused': rule.get('paused', False),
+                         'description': rule.get('description'), 'ref': rule.get('ref')})
+
+
+class RulePlan:
+    """Rule changes of one sync"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.creates: List[Dict[str, Any]] = []
+        self.updates: List[tuple] = []  # (existing, desired)
+        self.deletes: List[Dict[str, Any]] = []
+        self.unchanged: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+
+    @property
+    def changes(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def describe(self, key: Callable[[Dict[str, Any]], str]) -> str:
+        lines = [f"+ create {self.kind} {key(r)}" for r in self.creates]
+        lines += [f"~ update {self.kind} {key(r)}" for _, r in self.updates]
+        lines += [f"- delete {self.kind} {key(r)}" for r in self.deletes]
+        lines.append(f"{self.kind}s: {len(self.creates)} to create, {len(self.updates)} to update, "
+                     f"{len(self.deletes)} to delete, {len(self.unchanged)} unchanged")
+        return '\n'.join(lines)
+
+
+def plan_rules(kind: str, desired: List[Dict[str, Any]], existing: List[Dict[str, Any]],
+               key: Callable[[Dict[str, Any]], Optional[str]], digest: Callable[[Dict[str, Any]], str],
+               is_managed: Callable[[Dict[str, Any]], bool], prune: bool = False) -> RulePlan:
+    """Match desired rules to existing ones by key and compare their content hashes"""
+    plan = RulePlan(kind)
+    by_key: Dict[str, List[Dict[str, Any]]] = {}
+    for rule in existing:
+        by_key.setdefault(key(rule), []).append(rule)
+    wanted = set()
+    for rule in desired:
+        rule_key = key(rule)
+        wanted.add(rule_key)
+        matches = by_key.get(rule_key, [])
+        if not matches:
+            plan.creates.append(rule)
+            continue
+        current = next((m for m in matches if digest(m) == digest(rule)), matches[0])
+        if digest(current) == digest(rule):
+            plan.unchanged.append(rule)
+        else:
+            plan.updates.append((current, rule))
+        # Duplicates left behind by earlier, non-idempotent runs
+        if prune:
+            plan.deletes.extend(m for m in matches if m is not current and is_managed(m))
+    if prune:
+        plan.deletes.extend(rule for rule_key, rules in by_key.items() if rule_key not in wanted
+                            for rule in rules if is_managed(rule))
+    return plan
+
+
+def sync_page_rules(client: CloudflareClient, zone_id: str, zone_name: str,
+                    desired: List[Dict[str, Any]], prune: bool = False, plan_only: bool = False) -> RulePlan:
+    """Make the zone's managed page rules match desired"""
+    existing = client.get(f"zones/{zone_id}/pagerules")['result']
+    plan = plan_rules('page rule', desired, existing, page_rule_key, page_rule_hash,
+                      lambda rule: is_managed_page_rule(rule, zone_name), prune)
+    if plan_only or not plan.changes:
+        return plan
+
+    def call(change):
+        method, path, body, rule = change
+        try:
+            client.request(method, path, **({'json': body} if body is not None else {}))
+        except CloudflareAPIError as e:
+            return f"{method} page rule {page_rule_key(rule)}: {e.body if e.body is not None else e}"
+        return None
+
+    changes = ([('POST', f"zones/{zone_id}/pagerules", rule, rule) for rule in plan.creates] +
+               [('PUT', f"zones/{zone_id}/pagerules/{current['id']}", rule, rule)
+                for current, rule in plan.updates] +
+               [('DELETE', f"zones/{zone_id}/pagerules/{rule['id']}", None, rule) for rule in plan.deletes])
+    plan.errors = [error for error in client.map(call, changes) if error]
+    return plan
+
+
+def list_firewall_rules(client: CloudflareClient, zone_id: str) -> List[Dict[str, Any]]:
+    rules = []
+    page = 1
+    while True:
+        body = client.get(f"zones/{zone_id}/firewall/rules",
+                          params={'page': page, 'per_page': FIREWALL_PAGE_SIZE})
+        rules.extend(body['result'])
+        if page >= body.get('result_info', {}).get('total_pages', 1) or not body['result']:
+            return rules
+        page += 1
+
+
+def sync_firewall_rules(client: CloudflareClient, zone_id: str, desired: List[Dict[str, Any]],
+                        prune: bool = False, plan_only: bool = False) -> RulePlan:
+    """Make the zone's managed firewall rules match desired; every rule needs a ref"""
+    existing = list_firewall_rules(client, zone_id)
+    # Rules created before refs were set are matched by description, and get their ref on update
+    refs_by_description = {rule['description']: rule['ref'] for rule in desired}
+
+    def key(rule):
+        return rule.get('ref') or refs_by_description.get(rule.get('description'))
+
+    plan = plan_rules('firewall rule', desired, existing, key, firewall_rule_hash,
+                      lambda rule: (key(rule) or '').startswith(MANAGED_REF_PREFIX), prune)
+    if plan_only or not plan.changes:
+        return plan
+
+    def attempt(description, fn):
+        try:
+            fn()
+        except CloudflareAPIError as e:
+            plan.errors.append(f"{description}: {e.body if e.body is not None else e}")
+
+    if plan.deletes:
+        ids = [rule['id'] for rule in plan.deletes]
+        filter_ids = [rule['filter']['id'] for rule in plan.deletes if rule.get('filter', {}).get('id')]
+        attempt('delete firewall rules', lambda: client.delete(
+            f"zones/{zone_id}/firewall/rules", params={'id': ids}))
+        if filter_ids:
+            attempt('delete filters', lambda: client.delete(
+                f"zones/{zone_id}/filters", params={'id': filter_ids}))
+    if plan.updates:
+        attempt('update filters', lambda: client.put(f"zones/{zone_id}/filters", json=[
+            dict(rule['filter'], id=current['filter']['id']) for current, rule in plan.updates]))
+        attempt('update firewall rules', lambda: client.put(f"zones/{zone_id}/firewall/rules", json=[
+            dict(rule, id=current['id'], filter={'id': current['filter']['id']})
+            for current, rule in plan.updates]))
+    if plan.creates:
+        attempt('create firewall rules', lambda: client.post(
+            f"zones/{zone_id}/firewall/rules", json=plan.creates))
+    return plan
@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+# Poll interval for cancellation requests while a command is running
+_CANCEL_POLL_SECONDS = 0.25
+# Grace period between SIGTERM and SIGKILL
+_TERMINATE_GRACE_SECONDS = 5.0
+# Maximum length of a single output line read from a command
+_LINE_LIMIT = 1024 * 1024
+
+_command_context = contextvars.ContextVar('command_context', default=None)
+
+
+class CommandContext:
+    """Cancellation and output streaming for the commands run by the current step"""
+
+    def __init__(self, cancel_event: Optional[threading.Event] = None,
+                 on_line: Optional[Callable[[str], None]] = None):
+        self.cancel_event = cancel_event
+        self.on_line = on_line
+
+
+@contextmanager
+def command_context(cancel_event: Optional[threading.Event] = None,
+                    on_line: Optional[Callable[[str], None]] = None):
+    """Attach a cancel event and output listener to commands run in this block"""
+    token = _command_context.set(CommandContext(cancel_event, on_line))
+    try:
+        yield
+    finally:
+        _command_context.reset(token)
+
+
+def current_command_context() -> Optional[CommandContext]:
+    return _command_context.get()
+
+
+class CommandResult:
+    """Exit status and the last lines of output of a command"""
+
+    def __init__(self, cmd: List[str], returncode: Optional[int], lines: deque,
+                 dropped_lines: int, duration: float, timed_out: bool = False,
+                 cancelled: bool = False):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.lines = list(lines)
+        self.dropped_lines = dropped_lines
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def output(self) -> str:
+        return '\n'.join(self.lines)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+
+class AsyncCommandRunner:
+    """Runs subprocesses on a private asyncio loop with bounded concurrency.
+
+    Callers block on run() from any thread. Output is read line by line,
+    forwarded to an optional listener and kept in a ring buffer of the last
+    max_output_lines lines, so a chatty command cannot exhaust memory.
+    """
+
+    def __init__(self, max_concurrency: int = 8, default_timeout: Optional[float] = 1800,
+                 max_output_lines: int = 500):
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.max_output_lines = max_output_lines
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run_loop():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run_loop, name='command-runner', daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def run(self, cmd: List[str], timeout: Optional[float] = None,
+            cancel_event: Optional[threading.Event] = None,
+            on_line: Optional[Callable[[str], None]] = None) -> CommandResult:
+        """Run a command and wait for it to exit, time out or be cancelled"""
+        loop = self._ensure_loop()
+        timeout = self.default_timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(cmd, timeout, cancel_event, on_line), loop)
+        return future.result()
+
+    async def _run(self, cmd, timeout, cancel_event, on_line) -> CommandResult:
+        async with self._semaphore:
+            started = time.monotonic()
+            lines = deque(maxlen=self.max_output_lines)
+            counter = {'total': 0}
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=_LINE_LIMIT
+            )
+            reader = asyncio.ensure_future(self._read_lines(process.stdout, lines, counter, on_line))
+            timed_out = cancelled = False
+            deadline = started + timeout if timeout else None
+
+            while not reader.done():
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    timed_out = True
+                    break
+                await asyncio.wait({reader}, timeout=_CANCEL_POLL_SECONDS)
+
+            if timed_out or cancelled:
+                await self._terminate(process)
+                # Children that inherited the pipe can keep it open after the kill
+                await asyncio.wait({reader}, timeout=_TERMINATE_GRACE_SECONDS)
+                if not reader.done():
+                    reader.cancel()
+            else:
+                await reader
+            returncode = await process.wait()
+
+            return CommandResult(
+                cmd, returncode, lines,
+                dropped_lines=max(0, counter['total'] - self.max_output_lines),
+                duration=time.monotonic() - started,
+                timed_out=timed_out,
+                cancelled=cancelled
+            )
+
+    async def _read_lines(self, stream, lines, counter, on_line) -> None:
+        while True:
+            raw = await stream.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            lines.append(line)
+            counter['total'] += 1
+            if on_line is not None:
+                try:
+                    on_line(line)
+                except Exception as e:
+                    self.logger.error(f"Command output listener failed: {str(e)}")
+
+    async def _terminate(self, process) -> None:
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), _TERMINATE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
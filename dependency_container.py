@@ -4,6 +4,8 @@ from azure.mgmt.resource import ResourceManagementClient
 from azure.mgmt.network import NetworkManagementClient
 from azure.mgmt.storage import StorageManagementClient
 from azure.mgmt.monitor import MonitorManagementClient
+from deployment_jobs import DeploymentJobStore
+from deployment_telemetry import DeploymentTelemetryStore
 import os
 import logging
 from functools import lru_cache
@@ -73,6 +75,14 @@ class ServiceContainer:
             self.logger.error(f"Failed to initialize Azure clients: {str(e)}")
             raise
 
+    def initialize_job_queue(self) -> None:
+        """Open the persistent deployment job queue"""
+        jobs_config = self.get_config('app_config')['jobs']
+        self.register_service('job_store', DeploymentJobStore(jobs_config['db_path']))
+        self.logger.info(f"Deployment job queue opened at {jobs_config['db_path']}")
+        ml_config = self.get_config('app_config')['ml']
+        self.register_service('telemetry_store', DeploymentTelemetryStore(ml_config['telemetry_db_path']))
+
     def load_config_from_env(self) -> None:
         """Load configuration from environment variables"""
         config = {
@@ -80,7 +90,8 @@ class ServiceContainer:
                 'subscription_id': os.getenv('AZURE_SUBSCRIPTION_ID'),
                 'tenant_id': os.getenv('AZURE_TENANT_ID'),
                 'client_id': os.getenv('AZURE_CLIENT_ID'),
-                'client_secret': os.getenv('AZURE_CLIENT_SECRET')
+                'client_secret': os.getenv('AZURE_CLIENT_SECRET'),
+                'execution_backend': os.getenv('AZURE_EXECUTION_BACKEND', 'sdk')
             },
             'app': {
                 'secret_key': os.getenv('SECRET_KEY'),
@@ -91,11 +102,73 @@ class ServiceContainer:
             'security': {
                 'allowed_origins': os.getenv('ALLOWED_ORIGINS', '').split(','),
                 'rate_limit_requests': int(os.getenv('RATE_LIMIT_REQUESTS', '100')),
-                'rate_limit_window': int(os.getenv('RATE_LIMIT_WINDOW', '3600'))
+                'rate_limit_window': int(os.getenv('RATE_LIMIT_WINDOW', '3600')),
+                'rate_limit_backend': os.getenv('RATE_LIMIT_BACKEND', 'memory'),
+                'redis_url': os.getenv('REDIS_URL', 'redis://localhost:6379/0')
             },
             'monitoring': {
                 'retention_days': int(os.getenv('LOG_RETENTION_DAYS', '30')),
-                'alert_email': os.getenv('ALERT_EMAIL')
+                'alert_email': os.getenv('ALERT_EMAIL'),
+                'latency_buckets': os.getenv('METRICS_LATENCY_BUCKETS', ''),
+                'multiproc_dir': os.getenv('PROMETHEUS_MULTIPROC_DIR') or None
+            },
+            'commands': {
+                'max_concurrency': int(os.getenv('COMMAND_MAX_CONCURRENCY', '8')),
+                'timeout': float(os.getenv('COMMAND_TIMEOUT', '1800')),
+                'output_lines': int(os.getenv('COMMAND_OUTPUT_LINES', '500'))
+            },
+            'jobs': {
+                'db_path': os.getenv('JOB_DB_PATH', 'data/deployment_jobs.db'),
+                'workers': int(os.getenv('JOB_WORKERS', '4')),
+                'poll_interval': float(os.getenv('JOB_POLL_INTERVAL', '1.0')),
+                'lease_seconds': float(os.getenv('JOB_LEASE_SECONDS', '60')),
+                'max_parallel_steps': int(os.getenv('DEPLOYMENT_MAX_PARALLEL_STEPS', '4')),
+                'failure_policy': os.getenv('DEPLOYMENT_FAILURE_POLICY', 'fail_fast'),
+                'run_in_app': os.getenv('JOB_WORKERS_IN_APP', '1') == '1'
+            },
+            'ml': {
+                'model_path': os.getenv('ML_MODEL_PATH', 'ml_model.pkl'),
+                'encoder_path': os.getenv('ML_ENCODER_PATH', 'feature_encoder.json'),
+                'compiled_model_dir': os.getenv('ML_COMPILED_MODEL_DIR', 'compiled_model'),
+                'compiled_max_rows': int(os.getenv('ML_COMPILED_MAX_ROWS', '500')),
+                'mmap_mode': os.getenv('ML_MODEL_MMAP_MODE', 'r') or None,
+                'preload': os.getenv('ML_MODEL_PRELOAD', '0') == '1',
+                'registry_dir': os.getenv('ML_MODEL_REGISTRY_DIR', 'models'),
+                'reload_interval': float(os.getenv('ML_MODEL_RELOAD_INTERVAL', '30')),
+                'telemetry_db_path': os.getenv('TELEMETRY_DB_PATH', 'data/deployment_telemetry.db')
+            },
+            'docs': {
+                'warm_up': os.getenv('DOCS_WARM_UP', '1') == '1'
+            },
+            'validation': {
+                'batch_max_items': int(os.getenv('VALIDATION_BATCH_MAX_ITEMS', '1000'))
+            },
+            'nodes': {
+                'docker_ps_file': os.getenv('NODE_DOCKER_PS_FILE', 'docker_ps_output.txt'),
+                'rpc_host': os.getenv('NODE_RPC_HOST', '127.0.0.1'),
+                'probe_in_app': os.getenv('NODE_HEALTH_PROBE', '1') == '1',
+                'probe_interval': float(os.getenv('NODE_PROBE_INTERVAL', '10')),
+                'probe_timeout': float(os.getenv('NODE_PROBE_TIMEOUT', '3')),
+                'max_block_lag': int(os.getenv('NODE_MAX_BLOCK_LAG', '5')),
+                'min_peers': int(os.getenv('NODE_MIN_PEERS', '1')),
+                'rise': int(os.getenv('NODE_HEALTH_RISE', '2')),
+                'fall': int(os.getenv('NODE_HEALTH_FALL', '3')),
+                'snapshot_path': os.getenv('NODE_HEALTH_SNAPSHOT', 'data/node_health.json')
+            },
+            'metrics': {
+                'sample_interval': float(os.getenv('METRICS_SAMPLE_INTERVAL', '15')),
+                'history': int(os.getenv('METRICS_HISTORY', '240')),
+                'latency_window': int(os.getenv('METRICS_LATENCY_WINDOW', '4096'))
+            },
+            'events': {
+                'replay_size': int(os.getenv('EVENT_REPLAY_SIZE', '500')),
+                'flush_interval': float(os.getenv('EVENT_FLUSH_INTERVAL', '0.1')),
+                'max_deployments': int(os.getenv('EVENT_MAX_DEPLOYMENTS', '200'))
+            },
+            'socketio': {
+                'message_queue': os.getenv('SOCKETIO_MESSAGE_QUEUE') or None,
+                'channel': os.getenv('SOCKETIO_CHANNEL', 'flask-socketio'),
+                'async_mode': os.getenv('SOCKETIO_ASYNC_MODE') or None
             }
         }
         
@@ -106,6 +179,7 @@ class ServiceContainer:
         """Initialize all services and configurations"""
         try:
             self.load_config_from_env()
+            self.initialize_job_queue()
             self.initialize_azure_clients()
             self.logger.info("Service container initialized successfully")
         except Exception as e:
@@ -172,7 +172,7 @@ fi
 echo -e "\n${YELLOW}Step 4: Generating Docker container information...${NC}"
 if [ ! -f "$DOCKER_PS_FILE" ] || [ "$(find "$DOCKER_PS_FILE" -mmin +60)" ]; then
     echo -e "${YELLOW}Docker PS output file is missing or older than 60 minutes. Generating a new one...${NC}"
-    docker ps --format "table {{.ID}}\t{{.Image}}\t{{.Command}}\t{{.CreatedAt}}\t{{.Status}}\t{{.Ports}}\t{{.Names}}" > "$DOCKER_PS_FILE"
+    docker ps --format '{{json .}}' > "$DOCKER_PS_FILE"
     echo -e "${GREEN}✓ Generated fresh Docker PS output in $DOCKER_PS_FILE.${NC}"
 else
     echo -e "${GREEN}✓ Using existing Docker PS output file: $DOCKER_PS_FILE${NC}"
@@ -0,0 +1,500 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from command_runner import command_context
+
+QUEUED = 'queued'
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    requested_by TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_steps (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    duration_seconds REAL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+
+def new_deployment_id() -> str:
+    """Generate a unique, time-ordered deployment ID"""
+    return f"dep-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class DeploymentJobStore:
+    """Persistent deployment queue backed by SQLite.
+
+    The database file can be shared by every web worker and by standalone
+    worker processes on the same host; jobs are claimed atomically.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'cancel_requested' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0')
+            if 'lease_expires_at' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN lease_expires_at REAL')
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, mode: str, payload: Dict[str, Any],
+                requested_by: Optional[str] = None) -> Dict[str, Any]:
+        """Add a deployment job to the queue"""
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, mode, payload, status, requested_by, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, mode, json.dumps(payload), QUEUED, requested_by, _now())
+            )
+        return self.get_job(job_id)
+
+    def claim_next(self, worker: str, lease_seconds: float = 60.0) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it.
+
+        The worker holds the job for lease_seconds and must renew the lease
+        while it runs; once the lease expires the job counts as interrupted.
+        """
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1',
+                    (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    'UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, '
+                    'started_at = ?, lease_expires_at = ? WHERE id = ?',
+                    (RUNNING, worker, _now(), time.time() + lease_seconds, row['id'])
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return self.get_job(row['id'])
+
+    def plan_steps(self, job_id: str, names: List[str]) -> None:
+        """Register the steps a job is going to run, in execution order"""
+        with self._connection() as conn:
+            offset = conn.execute(
+                'SELECT COUNT(*) FROM job_steps WHERE job_id = ?', (job_id,)
+            ).fetchone()[0]
+            conn.executemany(
+                'INSERT OR IGNORE INTO job_steps (job_id, name, position, status) VALUES (?, ?, ?, ?)',
+                [(job_id, name, offset + i, PENDING) for i, name in enumerate(names)]
+            )
+
+    def start_step(self, job_id: str, name: str) -> None:
+        """Record that a step of a job has started"""
+        with self._connection() as conn:
+            position = conn.execute(
+                'SELECT COUNT(*) FROM job_steps WHERE job_id = ?', (job_id,)
+            ).fetchone()[0]
+            conn.execute(
+                'INSERT INTO job_steps (job_id, name, position, status, started_at) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (job_id, name) DO UPDATE SET status = excluded.status, '
+                'started_at = excluded.started_at, finished_at = NULL, output = NULL, error = NULL',
+                (job_id, name, position, RUNNING, _now())
+            )
+
+    def finish_step(self, job_id: str, name: str, status: str, output: Any = None,
+                    error: Optional[str] = None, duration: Optional[float] = None) -> None:
+        """Record the final state of a step"""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE job_steps SET status = ?, output = ?, error = ?, finished_at = ?, '
+                'duration_seconds = ? WHERE job_id = ? AND name = ?',
+                (status, json.dumps(output) if output is not None else None, error,
+                 _now(), duration, job_id, name)
+            )
+
+    def complete_job(self, job_id: str, status: str, result: Any = None,
+                     error: Optional[str] = None) -> None:
+        """Mark a job as finished"""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, _now(), job_id)
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job immediately, or ask the worker running it to stop"""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+                (CANCELLED, _now(), job_id, QUEUED)
+            )
+            conn.execute(
+                'UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?',
+                (job_id, RUNNING)
+            )
+        return self.get_job(job_id)
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        """Return the subset of the given running jobs that should stop"""
+        if not job_ids:
+            return []
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self._connection() as conn:
+            rows = conn.execute(
+                f'SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})',
+                list(job_ids)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def renew_leases(self, job_ids: List[str], lease_seconds: float = 60.0) -> None:
+        """Extend the leases of running jobs, showing their worker is still alive"""
+        if not job_ids:
+            return
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self._connection() as conn:
+            conn.execute(
+                f'UPDATE jobs SET lease_expires_at = ? WHERE status = ? AND id IN ({placeholders})',
+                [time.time() + lease_seconds, RUNNING] + list(job_ids)
+            )
+
+    def recover_interrupted(self, max_attempts: int = 3, now: Optional[float] = None) -> int:
+        """Requeue running jobs whose lease expired, i.e. whose worker died; fail them after max_attempts.
+
+        Jobs of live workers keep being renewed and are never taken over.
+        """
+        expired = 'status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)'
+        now = time.time() if now is None else now
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    f'UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_expires_at = NULL '
+                    f'WHERE {expired} AND attempts >= ?',
+                    (FAILED, 'Worker interrupted too many times', _now(), RUNNING, now, max_attempts)
+                )
+                cursor = conn.execute(
+                    f'UPDATE jobs SET status = ?, worker = NULL, lease_expires_at = NULL WHERE {expired}',
+                    (QUEUED, RUNNING, now)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return cursor.rowcount
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job together with the state of each of its steps"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            steps = conn.execute(
+                'SELECT * FROM job_steps WHERE job_id = ? ORDER BY position', (job_id,)
+            ).fetchall()
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['steps'] = [self._step_to_dict(step) for step in steps]
+        return job
+
+    @staticmethod
+    def _step_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        step = dict(row)
+        step.pop('job_id', None)
+        step['output'] = json.loads(step['output']) if step['output'] else None
+        return step
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._connection() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        with self._connection() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)
+            ).fetchone()[0]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _notify(on_event: Optional[Callable[[str, str, Dict[str, Any]], None]], job_id: str,
+            event: str, data: Dict[str, Any]) -> None:
+    """Tell the progress listener (if any) about a job; its failures never fail the job"""
+    if on_event is None:
+        return
+    try:
+        on_event(job_id, event, data)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"on_event listener failed for {job_id}: {str(e)}")
+
+
+class JobContext:
+    """Handle given to job handlers for recording per-step progress"""
+
+    def __init__(self, store: DeploymentJobStore, job: Dict[str, Any],
+                 on_output: Optional[Callable[[str, str, str], None]] = None,
+                 on_event: Optional[Callable[[str, str, Dict[str, Any]], None]] = None):
+        self.store = store
+        self.job_id = job['id']
+        self.mode = job['mode']
+        self.payload = job['payload']
+        self.on_output = on_output
+        self.on_event = on_event
+        self.cancel_event = threading.Event()
+
+    def _event(self, event: str, data: Dict[str, Any]) -> None:
+        _notify(self.on_event, self.job_id, event, data)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def plan(self, names: List[str]) -> None:
+        """Make the upcoming steps visible in the job status as pending"""
+        self.store.plan_steps(self.job_id, names)
+        self._event('plan', {'steps': names})
+
+    def skip(self, name: str, reason: str) -> None:
+        """Record a step that will not run"""
+        self.store.finish_step(self.job_id, name, SKIPPED, error=reason)
+        self._event('step', {'step': name, 'status': SKIPPED, 'error': reason})
+
+    @contextmanager
+    def step(self, name: str):
+        """Record a step; the block's exception (if any) marks it failed and propagates.
+
+        Commands run inside the block stop when the job is cancelled and
+        stream their output lines to the on_output listener.
+        """
+        if self.cancelled:
+            raise JobCancelled('Deployment cancelled')
+        self.store.start_step(self.job_id, name)
+        self._event('step', {'step': name, 'status': RUNNING})
+        started = time.monotonic()
+        recorder = _StepRecorder()
+        on_line = None
+        if self.on_output is not None:
+            def on_line(line):
+                self.on_output(self.job_id, name, line)
+        try:
+            with command_context(self.cancel_event, on_line):
+                yield recorder
+        except Exception as e:
+            self.store.finish_step(self.job_id, name, FAILED, error=str(e),
+                                   duration=time.monotonic() - started)
+            self._event('step', {'step': name, 'status': FAILED, 'error': str(e)})
+            raise
+        self.store.finish_step(self.job_id, name, SUCCEEDED, output=recorder.output,
+                               duration=time.monotonic() - started)
+        self._event('step', {'step': name, 'status': SUCCEEDED})
+
+
+class _StepRecorder:
+    def __init__(self):
+        self.output = None
+
+
+class DeploymentWorkerPool:
+    """Pool of worker threads that execute queued deployment jobs"""
+
+    def __init__(self, store: DeploymentJobStore,
+                 handlers: Dict[str, Callable[[JobContext], Any]],
+                 workers: int = 4, poll_interval: float = 1.0,
+                 on_output: Optional[Callable[[str, str, str], None]] = None,
+                 on_complete: Optional[Callable[[Dict[str, Any], str, float, Optional[str]], None]] = None,
+                 on_event: Optional[Callable[[str, str, Dict[str, Any]], None]] = None,
+                 lease_seconds: float = 60.0):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.on_output = on_output
+        self.on_complete = on_complete
+        self.on_event = on_event
+        self._active: Dict[str, JobContext] = {}
+        self._active_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stop.clear()
+        self.recover()
+        prefix = f"{os.getpid()}"
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                args=(f"{prefix}-{i}",),
+                name=f"deployment-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        watcher = threading.Thread(target=self._watch_jobs,
+                                   name='deployment-job-watcher', daemon=True)
+        watcher.start()
+        self._threads.append(watcher)
+        self.logger.info(f"Started {self.workers} deployment workers")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting jobs and wait for running ones to finish"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wake idle workers, e.g. right after a job was enqueued"""
+        self._wakeup.set()
+
+    def _worker_loop(self, worker_name: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim_next(worker_name, self.lease_seconds)
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to claim deployment job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def recover(self) -> int:
+        """Requeue the jobs of workers (of any process) whose lease expired"""
+        try:
+            recovered = self.store.recover_interrupted()
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to recover interrupted deployments: {str(e)}")
+            return 0
+        if recovered:
+            self.logger.info(f"Requeued {recovered} interrupted deployments")
+            self._wakeup.set()
+        return recovered
+
+    def _watch_jobs(self) -> None:
+        """Renew the leases of running jobs, check for cancellations and recover dead workers' jobs"""
+        last_renewal = last_recovery = time.monotonic()
+        while not self._stop.wait(min(self.poll_interval, self.lease_seconds / 3)):
+            with self._active_lock:
+                active = dict(self._active)
+            now = time.monotonic()
+            if now - last_renewal >= self.lease_seconds / 3:
+                try:
+                    self.store.renew_leases(list(active), self.lease_seconds)
+                    last_renewal = now
+                except sqlite3.Error as e:
+                    self.logger.error(f"Failed to renew deployment leases: {str(e)}")
+            if now - last_recovery >= self.lease_seconds:
+                self.recover()
+                last_recovery = now
+            try:
+                cancelled = self.store.cancel_requested(list(active))
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to check for cancelled deployments: {str(e)}")
+                continue
+            for job_id in cancelled:
+                if not active[job_id].cancelled:
+                    self.logger.info(f"Cancelling deployment {job_id}")
+                    active[job_id].cancel_event.set()
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """Execute a claimed job with its registered handler"""
+        handler = self.handlers.get(job['mode'])
+        if handler is None:
+            self.store.complete_job(job['id'], FAILED, error=f"Unknown deployment mode: {job['mode']}")
+            return
+        self.logger.info(f"Running deployment {job['id']} ({job['mode']})")
+        ctx = JobContext(self.store, job, on_output=self.on_output, on_event=self.on_event)
+        with self._active_lock:
+            self._active[job['id']] = ctx
+        _notify(self.on_event, job['id'], 'status', {'status': RUNNING})
+        started = time.monotonic()
+        try:
+            result = handler(ctx)
+        except Exception as e:
+            if ctx.cancelled:
+                self.logger.info(f"Deployment {job['id']} cancelled")
+                self._complete(job, CANCELLED, started, error=str(e))
+            else:
+                self.logger.error(f"Deployment {job['id']} failed: {str(e)}")
+                self._complete(job, FAILED, started, error=str(e))
+            return
+        finally:
+            with self._active_lock:
+                self._active.pop(job['id'], None)
+        self._complete(job, SUCCEEDED, started, result=result)
+        self.logger.info(f"Deployment {job['id']} completed")
+
+    def _complete(self, job: Dict[str, Any], status: str, started: float,
+                  result: Any = None, error: Optional[str] = None) -> None:
+        self.store.complete_job(job['id'], status, result=result, error=error)
+        _notify(self.on_event, job['id'], 'status', {'status': status, 'error': error})
+        if self.on_complete is not None:
+            try:
+                self.on_complete(job, status, time.monotonic() - started, error)
+            except Exception as e:
+                self.logger.error(f"on_complete listener failed for {job['id']}: {str(e)}")
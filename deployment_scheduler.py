@@ -0,0 +1,159 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from deployment_jobs import PENDING, RUNNING, SUCCEEDED, FAILED, SKIPPED
+
+FAIL_FAST = 'fail_fast'
+CONTINUE_ON_ERROR = 'continue_on_error'
+FAILURE_POLICIES = frozenset([FAIL_FAST, CONTINUE_ON_ERROR])
+
+
+class SchedulerError(Exception):
+    pass
+
+
+class StepResult:
+    """Outcome and timing of a single scheduled step"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = PENDING
+        self.output = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'status': self.status,
+            'error': self.error,
+            'duration_seconds': self.duration
+        }
+
+
+class DeploymentScheduler:
+    """Runs a dependency graph of deployment steps with bounded parallelism.
+
+    A step starts as soon as every step it depends on has succeeded. When a
+    step fails, everything that depends on it is skipped; with the fail-fast
+    policy no further steps are started at all, while running ones finish.
+    """
+
+    def __init__(self, max_concurrency: int = 4, policy: str = FAIL_FAST,
+                 on_skip: Optional[Callable[[str, str], None]] = None):
+        if policy not in FAILURE_POLICIES:
+            raise SchedulerError(f"Unknown failure policy: {policy}")
+        if max_concurrency < 1:
+            raise SchedulerError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.policy = policy
+        self.on_skip = on_skip
+        self._steps: Dict[str, Callable[[], Any]] = {}
+        self._depends_on: Dict[str, List[str]] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def add_step(self, name: str, func: Callable[[], Any], depends_on: Iterable[str] = ()) -> None:
+        """Register a step; dependencies may be added before or after it"""
+        if name in self._steps:
+            raise SchedulerError(f"Duplicate step: {name}")
+        self._steps[name] = func
+        self._depends_on[name] = list(depends_on)
+
+    @property
+    def step_names(self) -> List[str]:
+        """Step names in a valid execution order"""
+        return self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        for name, deps in self._depends_on.items():
+            for dep in deps:
+                if dep not in self._steps:
+                    raise SchedulerError(f"Step {name} depends on unknown step {dep}")
+        remaining = {name: len(deps) for name, deps in self._depends_on.items()}
+        dependents = self._dependents()
+        ready = [name for name, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for child in dependents[name]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+        if len(order) != len(self._steps):
+            cyclic = sorted(set(self._steps) - set(order))
+            raise SchedulerError(f"Dependency cycle between steps: {', '.join(cyclic)}")
+        return order
+
+    def _dependents(self) -> Dict[str, List[str]]:
+        dependents: Dict[str, List[str]] = {name: [] for name in self._steps}
+        for name, deps in self._depends_on.items():
+            for dep in deps:
+                dependents[dep].append(name)
+        return dependents
+
+    def run(self) -> Dict[str, StepResult]:
+        """Execute every step and return the results keyed by step name"""
+        order = self._topological_order()
+        dependents = self._dependents()
+        results = {name: StepResult(name) for name in order}
+        waiting_on = {name: len(self._depends_on[name]) for name in order}
+        ready = [name for name in order if waiting_on[name] == 0]
+        halted = False
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                thread_name_prefix='deployment-step') as executor:
+            running = {}
+            while ready or running:
+                while ready and not halted and len(running) < self.max_concurrency:
+                    name = ready.pop(0)
+                    results[name].status = RUNNING
+                    results[name].started_at = time.monotonic()
+                    running[executor.submit(self._steps[name])] = name
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result = results[name]
+                    result.duration = time.monotonic() - result.started_at
+                    error = future.exception()
+                    if error is None:
+                        result.status = SUCCEEDED
+                        result.output = future.result()
+                        for child in dependents[name]:
+                            waiting_on[child] -= 1
+                            if waiting_on[child] == 0:
+                                ready.append(child)
+                    else:
+                        result.status = FAILED
+                        result.error = str(error)
+                        self.logger.error(f"Deployment step {name} failed: {result.error}")
+                        self._skip_dependents(name, dependents, results)
+                        if self.policy == FAIL_FAST:
+                            halted = True
+
+        for name in order:
+            if results[name].status == PENDING:
+                self._skip(results[name], 'Deployment halted after an earlier failure')
+        return results
+
+    def _skip_dependents(self, failed: str, dependents: Dict[str, List[str]],
+                         results: Dict[str, StepResult]) -> None:
+        stack = list(dependents[failed])
+        while stack:
+            name = stack.pop()
+            if results[name].status != PENDING:
+                continue
+            self._skip(results[name], f"Dependency {failed} failed")
+            stack.extend(dependents[name])
+
+    def _skip(self, result: StepResult, reason: str) -> None:
+        result.status = SKIPPED
+        result.error = reason
+        if self.on_skip:
+            self.on_skip(result.name, reason)
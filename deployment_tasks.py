@@ -0,0 +1,181 @@
+import os
+import re
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from azure_operations import (
+    create_resource_group, deploy_vm, create_network, create_storage_account, setup_monitoring_and_alerts
+)
+from deployment_jobs import DeploymentJobStore, DeploymentWorkerPool, JobContext, FAILED
+from deployment_telemetry import DeploymentTelemetryStore
+from deployment_scheduler import DeploymentScheduler, FAIL_FAST
+
+DEFAULT_LOCATION = 'eastus'
+DEFAULT_SUBNET_PREFIX = '10.0.0.0/16'
+DEFAULT_ADMIN_USERNAME = 'azureuser'
+
+# Prefixes of the strings azure_operations returns instead of raising
+_FAILURE_PREFIXES = ('Error', 'Invalid JSON format', 'Validation error', 'Exception occurred')
+
+
+class DeploymentStepError(Exception):
+    pass
+
+
+def _check(result: Any) -> Any:
+    """Raise if an azure_operations call reported a failure"""
+    if isinstance(result, list):
+        raise DeploymentStepError('; '.join(result))
+    if isinstance(result, str) and result.startswith(_FAILURE_PREFIXES):
+        raise DeploymentStepError(result)
+    if isinstance(result, dict) and result.get('error'):
+        raise DeploymentStepError(result['error'])
+    return result
+
+
+def _operation_config(resource_group: str, location: str, vm_name: str, **extra) -> Dict[str, Any]:
+    """Build a config accepted by azure_operations.validate_config_data"""
+    config = {
+        'name': resource_group,
+        'resource_group': resource_group,
+        'location': location,
+        'vm_name': vm_name,
+        'admin_username': DEFAULT_ADMIN_USERNAME
+    }
+    config.update(extra)
+    return config
+
+
+def run_simple_deployment(ctx: JobContext) -> Dict[str, Any]:
+    """Process simple mode deployment"""
+    data = ctx.payload
+    resource_group = data['resourceGroup']
+    location = data['location']
+    vm_name = f"{data['nodeType']}-{int(time.time())}"
+
+    with ctx.step('resource_group') as step:
+        step.output = _check(create_resource_group(
+            _operation_config(resource_group, location, vm_name)))
+
+    with ctx.step(f'vm:{vm_name}') as step:
+        step.output = _check(deploy_vm(_operation_config(
+            resource_group, location, vm_name,
+            vm_size=data['vmSize'],
+            node_type=data['nodeType']
+        )))
+
+    return {'resource_group': resource_group, 'vm_name': vm_name}
+
+
+def _storage_account_name(resource_group: str, job_id: str) -> str:
+    """Derive a globally unique storage account name (3-24 lowercase alphanumerics)"""
+    prefix = re.sub(r'[^a-z0-9]', '', resource_group.lower())[:16]
+    return f"{prefix}{job_id[-8:]}"
+
+
+def _run_step(ctx: JobContext, name: str, operation: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap an azure_operations call so that it is recorded as a job step"""
+    def run():
+        with ctx.step(name) as step:
+            step.output = _check(operation())
+        return step.output
+    return run
+
+
+def run_expert_deployment(ctx: JobContext, max_parallel_steps: int = 4,
+                          failure_policy: str = FAIL_FAST) -> Dict[str, Any]:
+    """Process expert mode deployment as a dependency graph of steps.
+
+    resource group -> network (and storage) -> every VM in parallel -> monitoring per VM
+    """
+    data = ctx.payload
+    network = data['network']
+    nodes = data['nodes']
+    monitoring = data.get('monitoring', {})
+    storage = data.get('storage', {})
+    resource_group = data.get('resourceGroup') or f"{network['vnetName']}-rg"
+    location = data.get('location', DEFAULT_LOCATION)
+    vm_names = [f"node-{i + 1}" for i in range(int(nodes['count']))]
+
+    scheduler = DeploymentScheduler(max_concurrency=max_parallel_steps, policy=failure_policy,
+                                    on_skip=ctx.skip)
+    scheduler.add_step('resource_group', _run_step(ctx, 'resource_group', partial(
+        create_resource_group, _operation_config(resource_group, location, vm_names[0]))))
+
+    scheduler.add_step('network', _run_step(ctx, 'network', partial(create_network, _operation_config(
+        resource_group, location, vm_names[0],
+        vnet_name=network['vnetName'],
+        address_prefix=network.get('subnetPrefix') or DEFAULT_SUBNET_PREFIX
+    ))), depends_on=['resource_group'])
+    infrastructure = ['network']
+
+    if storage.get('enabled'):
+        account_name = storage.get('accountName') or _storage_account_name(resource_group, ctx.job_id)
+        scheduler.add_step('storage', _run_step(ctx, 'storage', partial(create_storage_account, _operation_config(
+            resource_group, location, vm_names[0],
+            storage_account_name=account_name,
+            sku=storage.get('sku', 'Standard_LRS')
+        ))), depends_on=['resource_group'])
+        infrastructure.append('storage')
+
+    for vm_name in vm_names:
+        vm_step = f'vm:{vm_name}'
+        scheduler.add_step(vm_step, _run_step(ctx, vm_step, partial(deploy_vm, _operation_config(
+            resource_group, location, vm_name,
+            consensus_protocol=nodes['consensusProtocol']
+        ))), depends_on=infrastructure)
+
+        if monitoring.get('enabled'):
+            monitoring_step = f'monitoring:{vm_name}'
+            scheduler.add_step(monitoring_step, _run_step(ctx, monitoring_step, partial(setup_monitoring_and_alerts, {
+                'subscription_id': os.getenv('AZURE_SUBSCRIPTION_ID'),
+                'resource_group': resource_group,
+                'location': location,
+                'vm_name': vm_name,
+                'retention_days': monitoring.get('retention', 30),
+                'alert_email': monitoring.get('alertEmail')
+            })), depends_on=[vm_step])
+
+    ctx.plan(scheduler.step_names)
+    results = scheduler.run()
+
+    failed = [r for r in results.values() if r.status == FAILED]
+    if failed:
+        raise DeploymentStepError('; '.join(f"{r.name}: {r.error}" for r in failed))
+
+    return {
+        'resource_group': resource_group,
+        'nodes': vm_names,
+        'monitoring': monitoring.get('enabled', False),
+        'steps': [r.to_dict() for r in results.values()]
+    }
+
+
+def create_worker_pool(store: DeploymentJobStore, jobs_config: Dict[str, Any],
+                       on_output: Optional[Callable[[str, str, str], None]] = None,
+                       telemetry: Optional[DeploymentTelemetryStore] = None,
+                       on_event: Optional[Callable[[str, str, Dict[str, Any]], None]] = None) -> DeploymentWorkerPool:
+    """Create a worker pool that runs deployment jobs from the given store.
+
+    Outcomes of finished deployments are recorded to telemetry when given;
+    status, plan and step changes go to on_event.
+    """
+    handlers = {
+        'simple': run_simple_deployment,
+        'expert': partial(
+            run_expert_deployment,
+            max_parallel_steps=jobs_config['max_parallel_steps'],
+            failure_policy=jobs_config['failure_policy']
+        )
+    }
+    return DeploymentWorkerPool(
+        store,
+        handlers,
+        workers=jobs_config['workers'],
+        poll_interval=jobs_config['poll_interval'],
+        lease_seconds=jobs_config['lease_seconds'],
+        on_output=on_output,
+        on_complete=telemetry.record_job if telemetry is not None else None,
+        on_event=on_event
+    )
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from deployment_jobs import SUCCEEDED, FAILED
+from feature_encoder import field_value
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployment_outcomes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    deployment_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    config TEXT NOT NULL,
+    location TEXT,
+    vm_size TEXT,
+    node_type TEXT,
+    duration_seconds REAL,
+    success INTEGER NOT NULL,
+    error TEXT,
+    recorded_at TEXT NOT NULL
+);
+"""
+
+
+class DeploymentTelemetryStore:
+    """Append-only log of deployment outcomes, the training data of the model.
+
+    Rows get increasing ids, so a training run reads only the outcomes
+    recorded since its last cursor (see training_pipeline).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, deployment_id: str, mode: str, config: Dict[str, Any], success: bool,
+               duration_seconds: Optional[float] = None, error: Optional[str] = None) -> None:
+        """Store the outcome of a finished deployment"""
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO deployment_outcomes (deployment_id, mode, config, location, vm_size, '
+                'node_type, duration_seconds, success, error, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (deployment_id, mode, json.dumps(config), field_value(config, 'location'),
+                 field_value(config, 'vm_size'), field_value(config, 'node_type'),
+                 duration_seconds, int(bool(success)), error, datetime.utcnow().isoformat())
+            )
+
+    def record_job(self, job: Dict[str, Any], status: str, duration_seconds: float,
+                   error: Optional[str] = None) -> None:
+        """on_complete listener for DeploymentWorkerPool; cancelled jobs say nothing about the config"""
+        if status not in (SUCCEEDED, FAILED):
+            return
+        try:
+            self.record(job['id'], job['mode'], job['payload'], status == SUCCEEDED,
+                        duration_seconds, error)
+        except sqlite3.Error as e:
+            logging.getLogger(__name__).error(f"Failed to record outcome of {job['id']}: {str(e)}")
+
+    def fetch_since(self, last_id: int = 0, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Outcomes with an id greater than last_id, oldest first"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                'SELECT * FROM deployment_outcomes WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id, limit)
+            ).fetchall()
+        outcomes = []
+        for row in rows:
+            outcome = dict(row)
+            outcome['config'] = json.loads(outcome['config'])
+            outcome['success'] = bool(outcome['success'])
+            outcomes.append(outcome)
+        return outcomes
+
+    def count(self) -> int:
+        with self._connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM deployment_outcomes').fetchone()[0]
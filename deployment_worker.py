@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import signal
+import threading
+
+from dependency_container import container
+from deployment_tasks import create_worker_pool
+from event_bus import create_socketio, get_event_bus, message_queue_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run deployment workers outside the web process')
+    parser.add_argument('--workers', type=int,
+                        help='Number of concurrent deployments (defaults to JOB_WORKERS)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    container.initialize()
+    jobs_config = dict(container.get_config('app_config')['jobs'])
+    if args.workers:
+        jobs_config['workers'] = args.workers
+
+    store = container.get_service('job_store')
+
+    # Progress reaches browsers only through a message queue shared with the web workers
+    socketio_config = container.get_config('app_config')['socketio']
+    event_bus = None
+    if message_queue_url(socketio_config):
+        container.register_service('socketio', create_socketio(None, socketio_config))
+        event_bus = get_event_bus()
+
+    pool = create_worker_pool(store, jobs_config, telemetry=container.get_service('telemetry_store'),
+                              on_output=event_bus.publish_output if event_bus else None,
+                              on_event=event_bus.publish if event_bus else None)
+    stopped = threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info('Shutting down deployment workers')
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    pool.start()
+    stopped.wait()
+    pool.stop()
+    if event_bus is not None:
+        event_bus.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,313 @@
+"""Deployment events over SocketIO, one room per deployment.
+
+Every event gets a sequence number per deployment and is kept in a bounded
+replay buffer, so a client that joins late or reconnects asks for the events
+after the last one it saw instead of re-querying the deployment. Events are
+batched: everything a deployment publishes within the flush interval goes out
+as one 'deployment_events' message, with output lines coalesced into 'output'
+events.
+
+With a message queue configured, every web worker and deployment worker
+process emits through it, so clients get events wherever the deployment
+runs; the replay buffer is then kept in Redis as well.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from dependency_container import container
+
+try:
+    import redis
+except ImportError:  # Only needed for a Redis message queue
+    redis = None
+
+DEPLOYMENT_EVENTS = 'deployment_events'
+DEPLOYMENT_REPLAY = 'deployment_replay'
+STATUS_UPDATE = 'status_update'
+
+EVENTS_PUBLISHED = Counter('deployment_events_published_total', 'Deployment events published', ['event'])
+EVENT_BATCHES = Counter('deployment_event_batches_total', 'SocketIO messages carrying deployment events')
+
+
+def deployment_room(deployment_id: str) -> str:
+    return f"deployment:{deployment_id}"
+
+
+def user_room(user_id: Any) -> str:
+    return f"user:{user_id}"
+
+
+class RedisReplayStore:
+    """Replay buffers in Redis, readable from every worker process"""
+
+    def __init__(self, client, replay_size: int = 500, ttl: int = 86400, prefix: str = 'deployment_events'):
+        self.client = client
+        self.replay_size = replay_size
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def append(self, deployment_id: str, envelopes: List[Dict[str, Any]]) -> None:
+        key = f"{self.prefix}:{deployment_id}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, *[json.dumps(envelope) for envelope in envelopes])
+        pipe.ltrim(key, -self.replay_size, -1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def events(self, deployment_id: str) -> List[Dict[str, Any]]:
+        return [json.loads(item) for item in self.client.lrange(f"{self.prefix}:{deployment_id}", 0, -1)]
+
+
+class _DeploymentLog:
+    def __init__(self, replay_size: int):
+        self.events: deque = deque(maxlen=replay_size)
+        self.seq = 0
+        self.pending: List[Dict[str, Any]] = []
+        self.outbox: List[Dict[str, Any]] = []
+
+
+class DeploymentEventBus:
+    """Publishes deployment events to per-deployment rooms through emit(event, data, room)"""
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any], str], None], replay_size: int = 500,
+                 flush_interval: float = 0.1, max_batch_lines: int = 200,
+                 max_deployments: int = 200, replay_store: Optional[RedisReplayStore] = None,
+                 clock: Callable[[], float] = time.time):
+        self.emit = emit
+        self.replay_size = replay_size
+        self.flush_interval = flush_interval
+        self.max_batch_lines = max_batch_lines
+        self.max_deployments = max_deployments
+        self.replay_store = replay_store
+        self.clock = clock
+        self._logs: 'OrderedDict[str, _DeploymentLog]' = OrderedDict()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        # Held while sending, so batches of one deployment never overtake each other
+        self._flush_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _log(self, deployment_id: str) -> _DeploymentLog:
+        log = self._logs.get(deployment_id)
+        if log is None:
+            log = self._logs[deployment_id] = _DeploymentLog(self.replay_size)
+            # Forget the deployments that were least recently active
+            while len(self._logs) > self.max_deployments:
+                self._logs.popitem(last=False)
+        self._logs.move_to_end(deployment_id)
+        return log
+
+    def _append(self, deployment_id: str, log: _DeploymentLog, event: str, data: Dict[str, Any]) -> None:
+        log.seq += 1
+        envelope = {'deployment_id': deployment_id, 'seq': log.seq, 'event': event,
+                    'data': data, 'timestamp': self.clock()}
+        log.events.append(envelope)
+        log.outbox.append(envelope)
+        EVENTS_PUBLISHED.labels(event).inc()
+
+    def _drain(self, deployment_id: str, log: _DeploymentLog) -> None:
+        lines = log.pending
+        log.pending = []
+        for i in range(0, len(lines), self.max_batch_lines):
+            self._append(deployment_id, log, 'output', {'lines': lines[i:i + self.max_batch_lines]})
+
+    def _schedule(self) -> None:
+        if self.flush_interval <= 0:
+            return
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def publish(self, deployment_id: str, event: str, data: Dict[str, Any]) -> None:
+        """Queue an event; it is sent with the deployment's next batch, after earlier output"""
+        with self._lock:
+            log = self._log(deployment_id)
+            self._drain(deployment_id, log)
+            self._append(deployment_id, log, event, data)
+            self._schedule()
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def publish_output(self, deployment_id: str, step: str, line: str) -> None:
+        """Queue an output line; lines of one flush interval become one output event"""
+        with self._lock:
+            self._log(deployment_id).pending.append({'step': step, 'line': line})
+            self._schedule()
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send everything queued now, one message per deployment"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                batches = []
+                for deployment_id, log in self._logs.items():
+                    self._drain(deployment_id, log)
+                    if log.outbox:
+                        batches.append((deployment_id, log.outbox))
+                        log.outbox = []
+            for deployment_id, envelopes in batches:
+                if self.replay_store is not None:
+                    try:
+                        self.replay_store.append(deployment_id, envelopes)
+                    except Exception as e:
+                        self.logger.error(f"Failed to store events of {deployment_id}: {str(e)}")
+                try:
+                    self.emit(DEPLOYMENT_EVENTS, {'deployment_id': deployment_id, 'events': envelopes},
+                              deployment_room(deployment_id))
+                    EVENT_BATCHES.inc()
+                except Exception as e:
+                    self.logger.error(f"Failed to emit events of {deployment_id}: {str(e)}")
+
+    def replay(self, deployment_id: str, after_seq: int = 0) -> Dict[str, Any]:
+        """Buffered events after after_seq; truncated when older ones were already dropped"""
+        self.flush()
+        events = None
+        if self.replay_store is not None:
+            try:
+                events = self.replay_store.events(deployment_id)
+            except Exception as e:
+                self.logger.error(f"Failed to read events of {deployment_id}: {str(e)}")
+        if events is None:
+            with self._lock:
+                log = self._logs.get(deployment_id)
+                events = list(log.events) if log is not None else []
+        seq = events[-1]['seq'] if events else 0
+        truncated = bool(events) and events[0]['seq'] > after_seq + 1
+        return {'deployment_id': deployment_id, 'events': [e for e in events if e['seq'] > after_seq],
+                'truncated': truncated, 'seq': seq}
+
+    def publish_user(self, user_id: Any, status: str, message: str) -> None:
+        """Status message for one user's browsers, outside of any deployment"""
+        try:
+            self.emit(STATUS_UPDATE, {'status': status, 'message': message}, user_room(user_id))
+        except Exception as e:
+            self.logger.error(f"Failed to emit status update: {str(e)}")
+
+
+def parse_last_seq(value: Any) -> int:
+    """The last sequence number a client has seen; 0 (replay everything) when missing or malformed"""
+    if isinstance(value, bool):
+        return 0
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def register_socketio_handlers(socketio, bus: DeploymentEventBus,
+                               authorize: Optional[Callable[[Any, str], bool]] = None) -> None:
+    """Let signed-in clients join deployment rooms and catch up on missed events.
+
+    authorize(user, deployment_id) decides who may follow a deployment; without
+    it every signed-in user may.
+    """
+    from flask import request
+    from flask_login import current_user
+    from flask_socketio import emit, join_room, leave_room
+
+    @socketio.on('connect')
+    def on_connect(auth=None):
+        if not current_user.is_authenticated:
+            return False
+        join_room(user_room(current_user.id))
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        deployment_id = data.get('deployment_id') if isinstance(data, dict) else None
+        if not current_user.is_authenticated or not isinstance(deployment_id, str):
+            return
+        if authorize is not None and not authorize(current_user, deployment_id):
+            emit(DEPLOYMENT_REPLAY, {'deployment_id': deployment_id, 'error': 'Deployment not found'},
+                 to=request.sid)
+            return
+        # Join first: events published meanwhile arrive live and in the replay; clients drop repeats by seq
+        join_room(deployment_room(deployment_id))
+        emit(DEPLOYMENT_REPLAY, bus.replay(deployment_id, parse_last_seq(data.get('last_seq'))), to=request.sid)
+
+    @socketio.on('unsubscribe')
+    def on_unsubscribe(data):
+        deployment_id = (data or {}).get('deployment_id')
+        if isinstance(deployment_id, str):
+            leave_room(deployment_room(deployment_id))
+
+
+def _socketio_config() -> Dict[str, Any]:
+    try:
+        return container.get_config('app_config')['socketio']
+    except KeyError:
+        return {'message_queue': None, 'channel': 'flask-socketio', 'async_mode': None}
+
+
+def message_queue_url(config: Dict[str, Any]) -> Optional[str]:
+    """The configured message queue, or None (local, in-process) when it is unset or unreachable"""
+    url = config.get('message_queue')
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            logging.getLogger(__name__).warning(
+                "redis package not installed, SocketIO events stay in this process")
+            return None
+        try:
+            redis.Redis.from_url(url, socket_connect_timeout=2).ping()
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                f"SocketIO message queue unreachable ({str(e)}), events stay in this process")
+            return None
+    return url
+
+
+def create_socketio(app=None, config: Optional[Dict[str, Any]] = None):
+    """SocketIO server for app, or a write-only emitter when app is None (deployment workers)"""
+    from flask_socketio import SocketIO
+    config = config or _socketio_config()
+    url = message_queue_url(config)
+    kwargs = {'message_queue': url, 'channel': config.get('channel') or 'flask-socketio'}
+    if config.get('async_mode'):
+        kwargs['async_mode'] = config['async_mode']
+    if app is None:
+        return SocketIO(**kwargs)
+    socketio = SocketIO(app, cors_allowed_origins="*", **kwargs)
+    logging.getLogger(__name__).info(f"SocketIO events fan out through {url.split('@')[-1]}" if url
+                                     else "SocketIO events stay in this process")
+    return socketio
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> DeploymentEventBus:
+    """Get the process-wide bus, emitting through the registered SocketIO server"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                try:
+                    config = container.get_config('app_config')['events']
+                except KeyError:
+                    config = {'replay_size': 500, 'flush_interval': 0.1, 'max_deployments': 200}
+                replay_store = None
+                url = message_queue_url(_socketio_config())
+                if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+                    replay_store = RedisReplayStore(redis.Redis.from_url(url), config['replay_size'])
+
+                def emit(event, data, room):
+                    container.get_service('socketio').emit(event, data, to=room)
+
+                _bus = DeploymentEventBus(emit, replay_size=config['replay_size'],
+                                          flush_interval=config['flush_interval'],
+                                          max_deployments=config['max_deployments'],
+                                          replay_store=replay_store)
+    return _bus
@@ -0,0 +1,153 @@
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+# vCPUs and memory (GiB) of the VM sizes offered for nodes
+VM_SIZE_SPECS = {
+    'Standard_B1s': (1, 1),
+    'Standard_B2s': (2, 4),
+    'Standard_B2ms': (2, 8),
+    'Standard_DS1_v2': (1, 3.5),
+    'Standard_DS2_v2': (2, 7),
+    'Standard_D2s_v3': (2, 8),
+    'Standard_D4s_v3': (4, 16),
+    'Standard_D8s_v3': (8, 32),
+    'Standard_D16s_v3': (16, 64),
+    'Standard_E2s_v3': (2, 16),
+    'Standard_E4s_v3': (4, 32),
+    'Standard_F2s_v2': (2, 4),
+    'Standard_F4s_v2': (4, 8)
+}
+
+# Memory per vCPU of a series, for sizes missing from VM_SIZE_SPECS
+_SERIES_MEMORY_PER_VCPU = {'B': 2.0, 'D': 4.0, 'E': 8.0, 'F': 2.0}
+_VM_SIZE_RE = re.compile(r'Standard_([A-Z]+)(\d+)')
+
+# Encoded fields; each lists the config keys it can be read from
+CATEGORICAL_FIELDS = {
+    'location': ('location',),
+    'image': ('image',),
+    'vm_size': ('vm_size', 'vmSize'),
+    'node_type': ('node_type', 'nodeType')
+}
+NUMERIC_FIELDS = ('vcpus', 'memory_gb', 'node_count')
+
+ENCODER_VERSION = 1
+
+
+def vm_size_spec(vm_size: Optional[str]) -> tuple:
+    """(vCPUs, memory GiB) of a VM size, estimated from its name when unknown; (0, 0) if unparsable"""
+    if vm_size in VM_SIZE_SPECS:
+        return VM_SIZE_SPECS[vm_size]
+    match = _VM_SIZE_RE.match(vm_size or '')
+    if not match:
+        return 0, 0
+    vcpus = int(match.group(2))
+    return vcpus, vcpus * _SERIES_MEMORY_PER_VCPU.get(match.group(1)[0], 4.0)
+
+
+def _field(config: Dict[str, Any], keys: Sequence[str]) -> Any:
+    for key in keys:
+        value = config.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def field_value(config: Dict[str, Any], field: str) -> Any:
+    """Value of a categorical field in a config, whichever key it is stored under"""
+    return _field(config, CATEGORICAL_FIELDS[field])
+
+
+class FeatureEncoder:
+    """Turns deployment configs into the numeric feature matrix of the model.
+
+    Categorical fields are one-hot encoded against the vocabulary seen in
+    fit(), with an extra column per field for unseen values. VM sizes also
+    contribute their vCPU count and memory. Free-form names (VM, user,
+    resource group) carry no signal and are left out.
+    """
+
+    def __init__(self, vocabularies: Optional[Dict[str, List[str]]] = None):
+        self.vocabularies = vocabularies or {}
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self._lookup = {}
+        self._offsets = {}
+        offset = 0
+        for field in CATEGORICAL_FIELDS:
+            vocabulary = self.vocabularies.get(field, [])
+            self._lookup[field] = {value: i for i, value in enumerate(vocabulary)}
+            self._offsets[field] = offset
+            offset += len(vocabulary) + 1  # Last column of the field marks unseen values
+        self._numeric_offset = offset
+        self.n_features = offset + len(NUMERIC_FIELDS)
+
+    @property
+    def feature_names(self) -> List[str]:
+        names = []
+        for field in CATEGORICAL_FIELDS:
+            names.extend(f"{field}={value}" for value in self.vocabularies.get(field, []))
+            names.append(f"{field}=<unknown>")
+        return names + list(NUMERIC_FIELDS)
+
+    def fit(self, configs: Iterable[Dict[str, Any]]) -> 'FeatureEncoder':
+        configs = list(configs)
+        self.vocabularies = {
+            field: sorted({str(v) for v in (_field(c, keys) for c in configs) if v is not None})
+            for field, keys in CATEGORICAL_FIELDS.items()
+        }
+        self._build_index()
+        return self
+
+    def transform(self, configs: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Encode a batch of configs into an (n_configs, n_features) float32 matrix"""
+        n = len(configs)
+        X = np.zeros((n, self.n_features), dtype=np.float32)
+        if not n:
+            return X
+        rows = np.arange(n)
+
+        for field, keys in CATEGORICAL_FIELDS.items():
+            lookup = self._lookup[field]
+            unknown = len(lookup)
+            columns = np.fromiter(
+                (lookup.get(str(_field(c, keys)), unknown) for c in configs), dtype=np.int64, count=n)
+            X[rows, self._offsets[field] + columns] = 1.0
+
+        specs = np.array([vm_size_spec(_field(c, CATEGORICAL_FIELDS['vm_size'])) for c in configs],
+                         dtype=np.float32)
+        X[:, self._numeric_offset] = specs[:, 0]
+        X[:, self._numeric_offset + 1] = specs[:, 1]
+        X[:, self._numeric_offset + 2] = np.fromiter(
+            (_node_count(c) for c in configs), dtype=np.float32, count=n)
+        return X
+
+    def fit_transform(self, configs: Sequence[Dict[str, Any]]) -> np.ndarray:
+        return self.fit(configs).transform(configs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': ENCODER_VERSION, 'vocabularies': self.vocabularies}
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureEncoder':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != ENCODER_VERSION:
+            raise ValueError(f"Unsupported feature encoder version: {data.get('version')}")
+        return cls(data['vocabularies'])
+
+
+def _node_count(config: Dict[str, Any]) -> float:
+    nodes = config.get('nodes')
+    value = nodes.get('count') if isinstance(nodes, dict) else config.get('node_count', 1)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 1.0
@@ -0,0 +1,228 @@
+"""Compile a trained RandomForestClassifier into flat NumPy arrays.
+
+The nodes of every tree are concatenated into contiguous arrays (feature,
+threshold, left, right, value) that are saved as .npy files and loaded with
+np.load(mmap_mode='r'), so every worker process maps the same pages.
+Prediction walks all trees for all rows at once, one tree level per step;
+leaves point to themselves, so a path that ends early needs no special case.
+That wins on small batches but loses to scikit-learn's per-tree traversal on
+large ones, so ForestPredictor hands batches of max_rows or more to the
+scikit-learn model.
+
+Usage: python forest_compiler.py [--model ml_model.pkl] [--encoder feature_encoder.json] [--output compiled_model]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Optional
+import numpy as np
+
+FORMAT_VERSION = 1
+# Batch size from which scikit-learn predicts faster than the compiled forest
+# (benchmarks/bench_forest.py, 100 trees: 10.6 vs 11.8 ms at 500 rows, 23.4 vs 15.5 ms at 1000)
+DEFAULT_MAX_ROWS = 500
+_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes')
+
+
+class ForestCompilationError(Exception):
+    pass
+
+
+class CompiledForest:
+    """Array-based predictor equivalent to RandomForestClassifier.predict / predict_proba"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features
+        # (right, left) child pairs, indexed by node * 2 + went_left
+        self._children = np.stack([right, left], axis=1).ravel()
+        self._is_leaf = left == np.arange(len(left))
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """Flatten the trees of a fitted single-output forest classifier"""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ForestCompilationError("Only single-output forests can be compiled")
+        n_classes = len(model.classes_)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.int32) + offset
+            is_leaf = tree.children_left == -1
+            # Leaves point to themselves and never split
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32))
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            n_features=model.n_features_in_
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index of every row in every tree, shape (n_rows, n_trees)"""
+        # Trees split on float32 values, as scikit-learn casts its input
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}")
+        n_rows, n_trees = X.shape[0], len(self.roots)
+        values = X.ravel()
+        # One (row, tree) path per entry; paths that reach a leaf drop out of the active set
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * X.shape[1], n_trees)
+        nodes = np.tile(self.roots.astype(np.int64), n_rows)
+        leaves = nodes.copy()
+        active = np.arange(nodes.size)
+        for _ in range(self.max_depth):
+            go_left = values.take(row_offsets.take(active) + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self._children.take(nodes * 2 + go_left)
+            leaves[active] = nodes
+            running = ~self._is_leaf.take(nodes)
+            if not running.all():
+                active = active[running]
+                nodes = nodes[running]
+                if not active.size:
+                    break
+        return leaves.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        # cumsum adds the trees strictly in order, like scikit-learn, so rounding is identical
+        proba = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, 'classes_' if name == 'classes' else name))
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'max_depth': int(self.max_depth),
+                'n_features': int(self.n_features_in_),
+                'n_trees': len(self.roots),
+                'n_nodes': len(self.feature)
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'CompiledForest':
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ForestCompilationError(f"Unsupported compiled forest version: {meta.get('version')}")
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in _ARRAYS}
+        # classes_ may hold strings; keep it as a regular in-memory array
+        arrays['classes'] = np.array(arrays['classes'])
+        return cls(max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+
+
+class ForestPredictor:
+    """Predicts batches below max_rows with the compiled forest and larger ones with scikit-learn.
+
+    load_estimator returns the scikit-learn model and is only called for the
+    first large batch; without it (or when it fails) every batch is compiled.
+    """
+
+    def __init__(self, compiled: CompiledForest, load_estimator: Optional[Callable[[], Any]] = None,
+                 max_rows: int = DEFAULT_MAX_ROWS):
+        self.compiled = compiled
+        self.classes_ = compiled.classes_
+        self.n_features_in_ = compiled.n_features_in_
+        self.max_rows = max_rows
+        self._load_estimator = load_estimator
+        self._estimator = None
+        self._lock = threading.Lock()
+
+    def _model_for(self, X):
+        if self._load_estimator is None or len(X) < self.max_rows:
+            return self.compiled
+        if self._estimator is None:
+            with self._lock:
+                if self._estimator is None and self._load_estimator is not None:
+                    try:
+                        self._estimator = self._load_estimator()
+                    except Exception as e:
+                        logging.error(f"Failed to load the scikit-learn model, large batches stay compiled: {str(e)}")
+                        self._load_estimator = None
+                        return self.compiled
+        return self._estimator
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self._model_for(X).predict_proba(X)
+
+    def predict(self, X) -> np.ndarray:
+        return self._model_for(X).predict(X)
+
+
+def verify(model, compiled: CompiledForest, X) -> None:
+    """Raise ForestCompilationError unless compiled predictions equal scikit-learn's exactly"""
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    if not np.array_equal(expected, actual):
+        raise ForestCompilationError(
+            f"Probabilities differ from scikit-learn (max difference {np.abs(expected - actual).max()})")
+    if not np.array_equal(model.predict(X), compiled.predict(X)):
+        raise ForestCompilationError("Predicted classes differ from scikit-learn")
+
+
+def compile_forest(model, X_check, output_dir: str) -> CompiledForest:
+    """Compile a model, check it against scikit-learn on X_check and save it"""
+    compiled = CompiledForest.from_sklearn(model)
+    verify(model, compiled, X_check)
+    compiled.save(output_dir)
+    # Verify what workers will actually load
+    verify(model, CompiledForest.load(output_dir), X_check)
+    logging.info(f"Compiled {len(compiled.roots)} trees ({len(compiled.feature)} nodes) into {output_dir}")
+    return compiled
+
+
+def main():
+    import joblib
+    from feature_encoder import FeatureEncoder
+    from train_model import generate_configs
+
+    parser = argparse.ArgumentParser(description='Compile the trained model into flat arrays')
+    parser.add_argument('--model', default='ml_model.pkl')
+    parser.add_argument('--encoder', default='feature_encoder.json')
+    parser.add_argument('--output', default='compiled_model')
+    parser.add_argument('--check-samples', type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model = joblib.load(args.model)
+    encoder = FeatureEncoder.load(args.encoder)
+    configs, _ = generate_configs(args.check_samples, random_state=0)
+    compile_forest(model, encoder.transform(configs), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,80 +1,105 @@
 #!/usr/bin/env python3
 
 import os
+import re
+import sys
 import json
+import hashlib
 import argparse
-from collections import defaultdict
+import itertools
+import tempfile
+
+# JSON-RPC port of Besu inside the containers
+RPC_PORT = 8545
+_PORT_RE = re.compile(r'(?:[\d.]+|\[[^\]]*\]):(\d+)(?:-(\d+))?->(\d+)(?:-(\d+))?/tcp')
+_NODE_PATTERNS = (
+    (re.compile(r'(?:^|-)validator(\d+)(?:-|$)'), 'validator'),
+    (re.compile(r'(?:^|-)member(\d+)besu(?:-|$)'), 'member'),
+)
+
+def published_port(ports, container_port=RPC_PORT):
+    """Host port that a docker ps PORTS field maps to container_port, or None"""
+    for match in _PORT_RE.finditer(ports or ''):
+        host_start, _, start, end = match.groups()
+        start = int(start)
+        end = int(end) if end else start
+        if start <= container_port <= end:
+            return str(int(host_start) + container_port - start)
+    return None
+
+def classify_container(name, ports):
+    """Node description of a Besu container, or None for anything else"""
+    if name == "rpcnode":
+        node_type, node_name = "rpc", "rpcnode"
+    else:
+        for pattern, candidate in _NODE_PATTERNS:
+            match = pattern.search(name)
+            if match:
+                node_type, node_name = candidate, match.group(1)
+                break
+        else:
+            return None
+
+    node_port = published_port(ports)
+    if node_port is None:
+        return None
+    return {
+        "type": node_type,
+        "name": node_name,
+        "port": node_port,
+        "container_name": name
+    }
+
+def iter_docker_ps_json(lines):
+    """Stream nodes from `docker ps --format '{{json .}}'` output, one JSON object per line"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            container = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON ({e.msg})")
+        node = classify_container(container.get("Names", ""), container.get("Ports", ""))
+        if node:
+            yield node
+
+def iter_docker_ps_table(lines):
+    """Stream nodes from the default docker ps table, cutting columns at the header offsets"""
+    lines = iter(lines)
+    header = next(lines, "")
+    columns = [(m.group(), m.start()) for m in re.finditer(r'\S+(?: \S+)*', header)]
+    offsets = {name: start for name, start in columns}
+    if "PORTS" not in offsets or "NAMES" not in offsets:
+        raise ValueError("Unrecognized docker ps header")
+    ports_end = min((start for start in offsets.values() if start > offsets["PORTS"]),
+                    default=None)
+    for line in lines:
+        if not line.strip():
+            continue
+        node = classify_container(line[offsets["NAMES"]:].strip(),
+                                  line[offsets["PORTS"]:ports_end])
+        if node:
+            yield node
+
+def iter_docker_ps(lines):
+    """Stream nodes from docker ps output in either JSON-lines or table format"""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return iter(())
+    lines = itertools.chain([first], lines)
+    return iter_docker_ps_json(lines) if first.lstrip().startswith("{") else iter_docker_ps_table(lines)
 
 def parse_docker_ps_output(file_path):
-    """Parse docker ps output file to extract container information"""
-    nodes = []
-    
+    """Parse docker ps output file ('-' for stdin) to extract container information"""
+    if file_path == "-":
+        return list(iter_docker_ps(sys.stdin))
     with open(file_path, 'r') as f:
-        lines = f.readlines()
-    
-    # Skip the header line
-    for line in lines[1:]:
-        parts = line.strip().split()
-        if len(parts) < 2:
-            continue
-            
-        container_id = parts[0]
-        image = parts[1]
-        
-        # Extract ports - this is simplified and might need adjustment
-        ports_section = ' '.join(parts)
-        ports = []
-        
-        # Extract name (last column)
-        name = parts[-1]
-        
-        # Identify node type and extract ports
-        node_type = None
-        node_name = None
-        node_port = None
-        
-        if "validator" in name:
-            node_type = "validator"
-            node_name = name.split('-')[-1]
-            
-            # Find port mapping like "0.0.0.0:21001->8545/tcp"
-            port_mappings = [p for p in ports_section.split() if "->8545/tcp" in p]
-            if port_mappings:
-                port_mapping = port_mappings[0]
-                node_port = port_mapping.split(':')[1].split('->')[0]
-        
-        elif "member" in name and "besu" in name:
-            node_type = "member"
-            node_name = name.split('-')[-1]
-            
-            # Find port mapping like "0.0.0.0:20000->8545/tcp"
-            port_mappings = [p for p in ports_section.split() if "->8545/tcp" in p]
-            if port_mappings:
-                port_mapping = port_mappings[0]
-                node_port = port_mapping.split(':')[1].split('->')[0]
-        
-        elif name == "rpcnode":
-            node_type = "rpc"
-            node_name = "rpcnode"
-            
-            # For RPC node, look for "0.0.0.0:8545-8546->8545-8546/tcp"
-            port_mappings = [p for p in ports_section.split() if "8545" in p]
-            if port_mappings:
-                port_mapping = port_mappings[0]
-                node_port = "8545"  # RPC node typically exposes 8545
-        
-        if node_type and node_name and node_port:
-            nodes.append({
-                "type": node_type,
-                "name": node_name,
-                "port": node_port,
-                "container_name": name
-            })
-            
-    return nodes
+        return list(iter_docker_ps(f))
 
-def generate_nginx_config(node, domain="deployer.defi-oracle.io", output_dir="nginx_configs"):
-    """Generate nginx config file for a node"""
+def render_nginx_config(node, domain="deployer.defi-oracle.io"):
+    """Render the nginx config of a node; returns the config text and the node's hostnames"""
     node_subdomain = f"{node['type']}-{node['name']}"
     server_name = f"{node_subdomain}.{domain}"
     
@@ -144,28 +169,181 @@ http {{
 }}
 """
     
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Write config to file
-    with open(f"{output_dir}/nginx_{node_subdomain}.conf", "w") as f:
-        f.write(config)
-    
-    return {
+    return config, {
         "subdomain": node_subdomain,
         "domain": domain,
         "server_name": server_name,
         "port": node['port']
     }
 
-def generate_cloudflare_dns_config(node_configs, domain="deployer.defi-oracle.io", server_ip="SERVER_IP_ADDRESS"):
+def generate_nginx_config(node, domain="deployer.defi-oracle.io", output_dir="nginx_configs"):
+    """Generate nginx config file for a node"""
+    config, node_config = render_nginx_config(node, domain)
+    write_if_changed(os.path.join(output_dir, f"nginx_{node_config['subdomain']}.conf"), config)
+    return node_config
+
+# Upstream tuning for Besu JSON-RPC: reuse connections instead of opening one per call
+UPSTREAM_KEEPALIVE = 32
+UPSTREAM_KEEPALIVE_REQUESTS = 1000
+UPSTREAM_KEEPALIVE_TIMEOUT = "60s"
+
+_CORS_HEADERS = """add_header 'Access-Control-Allow-Origin' '*' always;
+            add_header 'Access-Control-Allow-Methods' 'GET, POST, OPTIONS' always;
+            add_header 'Access-Control-Allow-Headers' 'DNT,X-CustomHeader,Keep-Alive,User-Agent,X-Requested-With,If-Modified-Since,Cache-Control,Content-Type' always;"""
+
+def _upstream_block(name, ports, upstream_host, balanced=False):
+    servers = "\n".join(f"        server {upstream_host}:{port} max_fails=3 fail_timeout=10s;" for port in ports)
+    balancing = "        least_conn;\n" if balanced else ""
+    return f"""    upstream {name} {{
+{balancing}{servers}
+        keepalive {UPSTREAM_KEEPALIVE};
+        keepalive_requests {UPSTREAM_KEEPALIVE_REQUESTS};
+        keepalive_timeout {UPSTREAM_KEEPALIVE_TIMEOUT};
+    }}
+"""
+
+def _server_block(server_name, upstream):
+    return f"""    server {{
+        listen 80;
+        server_name {server_name};
+
+        location / {{
+            proxy_pass http://{upstream};
+        }}
+
+        # JSON-RPC specific settings
+        location /json-rpc {{
+            proxy_pass http://{upstream};
+            {_CORS_HEADERS}
+
+            # Handle OPTIONS requests
+            if ($request_method = 'OPTIONS') {{
+                {_CORS_HEADERS.replace(chr(10) + '            ', chr(10) + '                ')}
+                add_header 'Access-Control-Max-Age' 1728000;
+                add_header 'Content-Type' 'text/plain charset=UTF-8';
+                add_header 'Content-Length' 0;
+                return 204;
+            }}
+        }}
+    }}
+"""
+
+def render_consolidated_nginx_config(nodes, domain="deployer.defi-oracle.io", rpc_hostname="rpc",
+                                     upstream_host="127.0.0.1"):
+    """Render one nginx.conf for all nodes.
+
+    Every node gets its own upstream, with keepalive connections to Besu;
+    member nodes are also pooled and load-balanced behind the shared
+    {rpc_hostname}.{domain} hostname. Returns the config,
+    the nodes' hostnames and the part of the config specific to each node.
+    """
+    node_configs = []
+    fragments = {}
+    member_ports = []
+    upstreams = []
+    servers = []
+    for node in nodes:
+        node_subdomain = f"{node['type']}-{node['name']}"
+        server_name = f"{node_subdomain}.{domain}"
+        upstream = f"besu_{node_subdomain}".replace('-', '_')
+        if any(c["subdomain"] == node_subdomain for c in node_configs):
+            raise ValueError(f"Two nodes map to the same hostname {server_name}")
+        if node['type'] == "member":
+            member_ports.append(node['port'])
+        upstreams.append(_upstream_block(upstream, [node['port']], upstream_host))
+        servers.append(_server_block(server_name, upstream))
+        fragments[node_subdomain] = upstreams[-1] + servers[-1]
+        node_configs.append({
+            "subdomain": node_subdomain,
+            "domain": domain,
+            "server_name": server_name,
+            "port": node['port']
+        })
+
+    pools = []
+    if member_ports:
+        pools.append(_upstream_block("besu_member_pool", member_ports, upstream_host, balanced=True))
+        servers.insert(0, _server_block(f"{rpc_hostname}.{domain}", "besu_member_pool"))
+
+    config = f"""user nginx;
+worker_processes auto;
+worker_rlimit_nofile 65535;
+error_log /var/log/nginx/error.log warn;
+pid /var/run/nginx.pid;
+
+events {{
+    worker_connections 4096;
+    multi_accept on;
+}}
+
+http {{
+    include       mime.types;
+    default_type  application/octet-stream;
+
+    sendfile on;
+    tcp_nopush on;
+    tcp_nodelay on;
+    keepalive_timeout 65;
+    keepalive_requests 1000;
+    server_tokens off;
+
+    # Logging
+    access_log /var/log/nginx/access.log;
+
+    # Shared proxy settings: HTTP/1.1 without "Connection: close" keeps upstream connections open
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_connect_timeout 5s;
+    proxy_send_timeout 60s;
+    proxy_read_timeout 60s;
+    proxy_buffering on;
+    proxy_buffer_size 16k;
+    proxy_buffers 16 16k;
+    proxy_busy_buffers_size 32k;
+    proxy_next_upstream error timeout http_502 http_503;
+    proxy_next_upstream_tries 2;
+
+    # Security headers
+    add_header X-Content-Type-Options nosniff;
+    add_header X-Frame-Options DENY;
+    add_header X-XSS-Protection "1; mode=block";
+    add_header Strict-Transport-Security "max-age=31536000; includeSubDomains" always;
+    add_header Content-Security-Policy "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'; img-src 'self' data:; font-src 'self'; frame-ancestors 'none';";
+    add_header Referrer-Policy "no-referrer-when-downgrade";
+    add_header Permissions-Policy "geolocation=(), microphone=(), camera=()";
+
+    # Member nodes behind the shared RPC hostname
+{chr(10).join(pools)}
+    # Individual nodes
+{chr(10).join(upstreams)}
+{chr(10).join(servers)}}}
+"""
+
+    return config, node_configs, fragments
+
+def generate_consolidated_nginx_config(nodes, domain="deployer.defi-oracle.io", output_dir="nginx_configs",
+                                       rpc_hostname="rpc", upstream_host="127.0.0.1"):
+    """Generate one nginx.conf for all nodes (see render_consolidated_nginx_config)"""
+    config, node_configs, _ = render_consolidated_nginx_config(nodes, domain, rpc_hostname, upstream_host)
+    write_if_changed(os.path.join(output_dir, "nginx.conf"), config)
+    return node_configs
+
+def generate_cloudflare_dns_config(node_configs, domain="deployer.defi-oracle.io", server_ip="SERVER_IP_ADDRESS",
+                                   rpc_hostname=None):
     """Generate Cloudflare DNS configuration JSON"""
     dns_records = []
+    subdomains = [node_config["subdomain"] for node_config in node_configs]
+    if rpc_hostname:
+        subdomains.insert(0, rpc_hostname)
     
-    for node_config in node_configs:
+    for subdomain in subdomains:
         dns_records.append({
             "type": "A",
-            "name": node_config["subdomain"],
+            "name": subdomain,
             "content": server_ip,
             "ttl": 120,
             "proxied": True
@@ -173,38 +351,179 @@ def generate_cloudflare_dns_config(node_configs, domain="deployer.defi-oracle.io
     
     return dns_records
 
+MANIFEST_FILE = ".manifest.json"
+CHANGES_FILE = "changes.json"
+DNS_RECORDS_FILE = "cloudflare_dns_records.json"
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def write_file_atomic(path, content):
+    """Write through a temp file and rename, so readers (nginx reloads) never see a partial file"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def write_if_changed(path, content):
+    """Write a file unless it already has exactly this content; returns whether it was written"""
+    try:
+        with open(path, "r") as f:
+            if content_hash(f.read()) == content_hash(content):
+                return False
+    except FileNotFoundError:
+        pass
+    write_file_atomic(path, content)
+    return True
+
+class ConfigChanges:
+    """Nodes added, changed and removed since the previous run, and the files written"""
+
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.files_written = []
+        self.files_removed = []
+
+    @property
+    def has_changes(self):
+        return bool(self.added or self.changed or self.removed or self.files_written or self.files_removed)
+
+    def to_dict(self):
+        return {
+            "added": self.added,
+            "changed": self.changed,
+            "removed": self.removed,
+            "files_written": self.files_written,
+            "files_removed": self.files_removed
+        }
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed; "
+                f"{len(self.files_written)} files written, {len(self.files_removed)} removed")
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"nodes": {}}
+
+def sync_configs(nodes, output_dir="nginx_configs", domain="deployer.defi-oracle.io", server_ip="127.0.0.1",
+                 consolidated=False, rpc_hostname="rpc"):
+    """Regenerate nginx and DNS files for nodes, writing only what changed.
+
+    Every node's config is hashed and compared with the manifest of the
+    previous run; the delta is returned and saved to changes.json so that
+    nginx reloads and DNS syncs can skip runs where nothing changed.
+    """
+    manifest = _load_manifest(output_dir)
+    previous = manifest["nodes"]
+    previous_consolidated = manifest.get("consolidated", False)
+    changes = ConfigChanges()
+    hashes = {}
+
+    def write(name, content):
+        if write_if_changed(os.path.join(output_dir, name), content):
+            changes.files_written.append(name)
+
+    def remove(name):
+        os.remove(os.path.join(output_dir, name))
+        changes.files_removed.append(name)
+
+    if consolidated:
+        config, node_configs, fragments = render_consolidated_nginx_config(nodes, domain, rpc_hostname)
+        hashes = {subdomain: content_hash(fragment) for subdomain, fragment in fragments.items()}
+        write("nginx.conf", config)
+        # Per-node files of earlier runs would make nginx load every server block twice
+        for name in sorted(os.listdir(output_dir)):
+            if name.startswith("nginx_") and name.endswith(".conf"):
+                remove(name)
+    else:
+        if previous_consolidated and os.path.exists(os.path.join(output_dir, "nginx.conf")):
+            remove("nginx.conf")
+        node_configs = []
+        for node in nodes:
+            config, node_config = render_nginx_config(node, domain)
+            if node_config["subdomain"] in hashes:
+                raise ValueError(f"Two nodes map to the same hostname {node_config['server_name']}")
+            hashes[node_config["subdomain"]] = content_hash(config)
+            node_configs.append(node_config)
+            write(f"nginx_{node_config['subdomain']}.conf", config)
+
+    for subdomain, digest in hashes.items():
+        if subdomain not in previous:
+            changes.added.append(subdomain)
+        elif previous[subdomain] != digest:
+            changes.changed.append(subdomain)
+    changes.removed = sorted(set(previous) - set(hashes))
+    for subdomain in changes.removed:
+        name = f"nginx_{subdomain}.conf"
+        if os.path.exists(os.path.join(output_dir, name)):
+            remove(name)
+
+    members = any(node["type"] == "member" for node in nodes)
+    dns_records = generate_cloudflare_dns_config(node_configs, domain=domain, server_ip=server_ip,
+                                                 rpc_hostname=rpc_hostname if consolidated and members else None)
+    write(DNS_RECORDS_FILE, json.dumps(dns_records, indent=2))
+
+    manifest = {"nodes": hashes, "consolidated": consolidated}
+    write_file_atomic(os.path.join(output_dir, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True))
+    write_file_atomic(os.path.join(output_dir, CHANGES_FILE), json.dumps(changes.to_dict(), indent=2))
+    return changes, node_configs
+
 def main():
     parser = argparse.ArgumentParser(description='Generate nginx configurations for Besu nodes')
     parser.add_argument('--docker-ps-file', default='docker_ps_output.txt', 
-                        help='Path to docker ps output file')
+                        help="Path to docker ps output file, as a table or from --format '{{json .}}' "
+                             "('-' reads standard input)")
     parser.add_argument('--domain', default='deployer.defi-oracle.io',
                         help='Base domain name')
     parser.add_argument('--server-ip', default='127.0.0.1',
                         help='Server IP address')
     parser.add_argument('--output-dir', default='nginx_configs',
                         help='Output directory for nginx configuration files')
+    parser.add_argument('--consolidated', action='store_true',
+                        help='Write a single nginx.conf with upstream pools instead of one file per node')
+    parser.add_argument('--rpc-hostname', default='rpc',
+                        help='Subdomain that load-balances the member nodes (with --consolidated)')
+    parser.add_argument('--health-snapshot',
+                        help='Node health snapshot written by the prober (node_health.py); '
+                             'nodes it marks unhealthy get no config or DNS record')
     
     args = parser.parse_args()
     
     # Parse docker ps output to extract node information
     nodes = parse_docker_ps_output(args.docker_ps_file)
+    if args.health_snapshot:
+        from node_health import filter_healthy, load_snapshot
+        healthy_nodes = filter_healthy(nodes, load_snapshot(args.health_snapshot))
+        skipped = [node["container_name"] for node in nodes if node not in healthy_nodes]
+        if skipped:
+            print(f"Skipping unhealthy nodes: {', '.join(skipped)}")
+        nodes = healthy_nodes
     
-    # Generate nginx configuration for each node
-    node_configs = []
-    for node in nodes:
-        node_config = generate_nginx_config(node, domain=args.domain, output_dir=args.output_dir)
-        node_configs.append(node_config)
-    
-    print(f"Generated {len(node_configs)} nginx configuration files in '{args.output_dir}' directory")
-    
-    # Generate Cloudflare DNS configuration
-    dns_records = generate_cloudflare_dns_config(node_configs, domain=args.domain, server_ip=args.server_ip)
+    changes, node_configs = sync_configs(nodes, output_dir=args.output_dir, domain=args.domain,
+                                         server_ip=args.server_ip, consolidated=args.consolidated,
+                                         rpc_hostname=args.rpc_hostname)
     
-    # Write Cloudflare DNS configuration to file
-    with open(f"{args.output_dir}/cloudflare_dns_records.json", "w") as f:
-        json.dump(dns_records, f, indent=2)
+    target = f"'{args.output_dir}/nginx.conf'" if args.consolidated else f"'{args.output_dir}' directory"
+    print(f"Generated nginx configuration for {len(node_configs)} nodes in {target}: {changes.summary()}")
+    for label, subdomains in (("Added", changes.added), ("Changed", changes.changed), ("Removed", changes.removed)):
+        if subdomains:
+            print(f"{label}: {', '.join(subdomains)}")
+    if DNS_RECORDS_FILE in changes.files_written:
+        print(f"Updated Cloudflare DNS configuration in '{args.output_dir}/{DNS_RECORDS_FILE}'")
     
-    print(f"Generated Cloudflare DNS configuration in '{args.output_dir}/cloudflare_dns_records.json'")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
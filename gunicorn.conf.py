@@ -0,0 +1,43 @@
+"""gunicorn settings for the web application.
+
+Usage: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+Workers run eventlet so Flask-SocketIO can hold long-polling and websocket
+connections; the default sync worker serves one request at a time and cannot.
+gunicorn hands requests to workers without regard to the client, so with more
+than one worker a long-polling client only stays on its worker if it upgrades
+to a websocket; see "SocketIO Message Queue" in docs/setup.md.
+
+The app is loaded in every worker and never preloaded in the master (do not
+pass --preload either). create_app starts the deployment workers, node
+prober, metrics aggregator and event bus timer, and threads started before
+the fork would not run in the workers. The model's arrays are memory-mapped
+(ML_MODEL_MMAP_MODE), so workers share them through the page cache without
+preloading.
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics there and
+/metrics serves the sum over all of them. The directory is emptied when the
+server starts, so samples of a previous run are not counted again.
+"""
+import glob
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'eventlet')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+preload_app = False
+
+_multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if _multiproc_dir:
+    # Runs before any worker imports the app, so no metric file is open yet
+    os.makedirs(_multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(_multiproc_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited"""
+    if _multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid, _multiproc_dir)
@@ -0,0 +1,122 @@
+"""Prometheus metrics of the web application's HTTP requests.
+
+Requests are labelled by route template ('/docs/<page>', not every page's
+URL), method and status class ('2xx', '5xx'), so the number of series stays
+bounded however many URLs are requested. Under gunicorn each worker writes
+its samples to PROMETHEUS_MULTIPROC_DIR and /metrics aggregates the files of
+every worker, so a scrape sees the whole server rather than the one worker
+that answered it.
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional, Sequence, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from dependency_container import container
+
+UNMATCHED = '<unmatched>'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+DEFAULT_BUCKETS = Histogram.DEFAULT_BUCKETS
+
+
+def parse_buckets(value: str) -> Tuple[float, ...]:
+    """Histogram buckets from a comma-separated list of seconds, the defaults when empty"""
+    if not value or not value.strip():
+        return DEFAULT_BUCKETS
+    buckets = sorted(float(item) for item in value.split(',') if item.strip())
+    if not buckets:
+        return DEFAULT_BUCKETS
+    return tuple(buckets)
+
+
+def endpoint_label(url_rule) -> str:
+    """The matched route template; every unrouted URL (404s) shares one label"""
+    return url_rule.rule if url_rule is not None else UNMATCHED
+
+
+def method_label(method: str) -> str:
+    return method if method in METHODS else 'OTHER'
+
+
+def status_label(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class HttpMetrics:
+    """Request counter and latency histogram, labelled by endpoint, method and status"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Optional[CollectorRegistry] = REGISTRY):
+        labels = ['endpoint', 'method', 'status']
+        self.requests = Counter('web_requests_total', 'Total web requests', labels, registry=registry)
+        self.latency = Histogram('web_request_latency_seconds', 'Request latency', labels,
+                                 buckets=buckets, registry=registry)
+
+    def observe(self, url_rule, method: str, status_code: int, seconds: float) -> None:
+        labels = (endpoint_label(url_rule), method_label(method), status_label(status_code))
+        self.requests.labels(*labels).inc()
+        self.latency.labels(*labels).observe(seconds)
+
+
+def exposition(multiproc_dir: Optional[str] = None) -> bytes:
+    """Text exposition of every metric, aggregated over all workers in multiprocess mode"""
+    if multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def _monitoring_config():
+    try:
+        return container.get_config('app_config')['monitoring']
+    except KeyError:
+        return {'latency_buckets': '', 'multiproc_dir': os.getenv('PROMETHEUS_MULTIPROC_DIR') or None}
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_http_metrics() -> HttpMetrics:
+    """Get the process-wide HTTP metrics, created with the configured buckets"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = HttpMetrics(parse_buckets(_monitoring_config()['latency_buckets']))
+    return _metrics
+
+
+def init_app(app, on_latency: Optional[Callable[[float], None]] = None) -> None:
+    """Record every request of app and serve the metrics at /metrics"""
+    from flask import Response, g, request
+
+    metrics = get_http_metrics()
+    multiproc_dir = _monitoring_config()['multiproc_dir']
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            latency = time.perf_counter() - started
+            try:
+                metrics.observe(request.url_rule, request.method, response.status_code, latency)
+                if on_latency is not None:
+                    on_latency(latency)
+            except Exception as e:
+                app.logger.error(f"Failed to record request metrics: {str(e)}")
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(exposition(multiproc_dir), content_type=CONTENT_TYPE_LATEST)
+
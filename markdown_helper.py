@@ -1,37 +1,156 @@
 import markdown
 import os
-from flask import Markup
+import glob
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from markupsafe import Markup
+from markdown_include.include import INC_SYNTAX
+
+EXTENSIONS = [
+    'fenced_code',
+    'codehilite',
+    'tables',
+    'toc',
+    'mdx_math',
+    'markdown_include.include'
+]
+
+class RenderedDocument:
+    """HTML of a documentation page and the files it was rendered from"""
+
+    def __init__(self, html, toc, dependencies):
+        self.html = Markup(html)  # Mark as safe for Jinja2
+        self.toc = Markup(toc)
+        self.etag = hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+        # (path, mtime_ns) of the page and every included file; None for missing files
+        self.dependencies = dependencies
+
+    def is_fresh(self):
+        return all(_mtime(path) == mtime for path, mtime in self.dependencies)
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+DEFAULT_MAX_CACHED_PAGES = 256
 
 class MarkdownConverter:
-    def __init__(self, docs_dir='docs'):
+    """Renders documentation pages, caching the HTML until a source file changes.
+
+    markdown.Markdown instances keep state between conversions, so each
+    thread gets its own parser. Pages are cached by the real path of their
+    file, so aliases such as './setup' share one entry, and the least
+    recently used pages are dropped beyond max_cached_pages.
+    """
+
+    def __init__(self, docs_dir='docs', include_base_path='.', max_cached_pages=DEFAULT_MAX_CACHED_PAGES):
         self.docs_dir = docs_dir
-        self.md = markdown.Markdown(extensions=[
-            'fenced_code',
-            'codehilite',
-            'tables',
-            'toc',
-            'mdx_math',
-            'markdown_include.include'
-        ])
-    
-    def convert_file(self, filename):
-        """Convert a markdown file to HTML"""
+        self.include_base_path = include_base_path
+        self.max_cached_pages = max_cached_pages
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def md(self):
+        """Markdown parser of the current thread"""
+        parser = getattr(self._local, 'md', None)
+        if parser is None:
+            parser = markdown.Markdown(
+                extensions=EXTENSIONS,
+                extension_configs={'markdown_include.include': {'base_path': self.include_base_path}}
+            )
+            self._local.md = parser
+        return parser
+
+    def resolve(self, filename):
+        """Real path of a page's file, None when it would lie outside the docs directory"""
+        docs_dir = os.path.realpath(self.docs_dir)
+        file_path = os.path.realpath(os.path.join(docs_dir, os.path.normpath(f'{filename}.md')))
+        if os.path.commonpath([docs_dir, file_path]) != docs_dir:
+            return None
+        return file_path
+
+    def render_file(self, filename):
+        """Get the rendered page, from the cache unless the page or an included file changed"""
+        file_path = self.resolve(filename)
+        if file_path is None:
+            return None
+        with self._lock:
+            cached = self._cache.get(file_path)
+            if cached is not None:
+                self._cache.move_to_end(file_path)
+        if cached is not None and cached.is_fresh():
+            return cached
+
+        # Take the modification times before reading, so a concurrent edit invalidates the entry
+        mtime = _mtime(file_path)
         try:
-            file_path = os.path.join(self.docs_dir, f'{filename}.md')
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-            return self.convert_text(content)
         except FileNotFoundError:
             return None
-    
+        dependencies = [(file_path, mtime)] + self._include_dependencies(content, set())
+
+        html = self.convert_text(content)
+        document = RenderedDocument(html, self.get_toc(), dependencies)
+        with self._lock:
+            self._cache[file_path] = document
+            self._cache.move_to_end(file_path)
+            while len(self._cache) > self.max_cached_pages:
+                self._cache.popitem(last=False)
+        return document
+
+    def _include_dependencies(self, content, seen):
+        """(path, mtime_ns) of the files pulled in by markdown_include, recursively"""
+        dependencies = []
+        for match in INC_SYNTAX.finditer(content):
+            path = os.path.join(self.include_base_path, os.path.expanduser(match.group(1)))
+            if path in seen:
+                continue
+            seen.add(path)
+            mtime = _mtime(path)
+            dependencies.append((path, mtime))
+            if mtime is not None:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        dependencies.extend(self._include_dependencies(f.read(), seen))
+                except OSError:
+                    pass
+        return dependencies
+
+    def warm_up(self):
+        """Render every page in the docs directory so first requests are served from the cache"""
+        count = 0
+        for file_path in sorted(glob.glob(os.path.join(self.docs_dir, '*.md'))):
+            filename = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                if self.render_file(filename) is not None:
+                    count += 1
+            except Exception as e:
+                self.logger.error(f"Failed to pre-render {file_path}: {str(e)}")
+        self.logger.info(f"Pre-rendered {count} documentation pages")
+        return count
+
+    def convert_file(self, filename):
+        """Convert a markdown file to HTML"""
+        document = self.render_file(filename)
+        return document.html if document is not None else None
+
     def convert_text(self, text):
         """Convert markdown text to HTML"""
-        self.md.reset()  # Reset markdown parser state
-        html = self.md.convert(text)
+        md = self.md
+        md.reset()  # Reset markdown parser state
+        html = md.convert(text)
         return Markup(html)  # Mark as safe for Jinja2
-    
+
     def get_toc(self):
         """Get table of contents from last conversion"""
         if hasattr(self.md, 'toc'):
             return Markup(self.md.toc)
-        return ''
\ No newline at end of file
+        return ''
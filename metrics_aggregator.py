@@ -0,0 +1,213 @@
+"""Scheduled sampling of the dashboard's real-time figures.
+
+A background APScheduler job reads deployment counts, queue depth, node
+health and recent API latency every interval, appends them to fixed-size
+numpy ring buffers and precomputes the snapshot and chart series, so page
+renders only return a reference and never query SQLite or Azure.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from dependency_container import container
+from deployment_jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED
+
+# Series sampled on every tick, in chart order
+SERIES = ('deployments', 'running', 'queue_depth', 'succeeded', 'failed',
+          'nodes_healthy', 'nodes_total', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms')
+
+
+class RingSeries:
+    """Fixed-size time series; once full, each sample overwrites the oldest"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._values = np.full(capacity, np.nan, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+
+    def append(self, timestamp: float, value: Optional[float]) -> None:
+        self._timestamps[self._next] = timestamp
+        self._values[self._next] = np.nan if value is None else value
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def arrays(self):
+        """Timestamps and values, oldest first"""
+        if self._size < self.capacity:
+            return self._timestamps[:self._size].copy(), self._values[:self._size].copy()
+        order = np.roll(np.arange(self.capacity), -self._next)
+        return self._timestamps[order], self._values[order]
+
+
+class LatencyWindow:
+    """The most recent request latencies, for percentiles"""
+
+    def __init__(self, capacity: int = 4096):
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._values[self._next] = seconds
+            self._next = (self._next + 1) % len(self._values)
+            self._size = min(self._size + 1, len(self._values))
+
+    def percentiles(self, qs=(50, 95, 99)) -> Dict[int, Optional[float]]:
+        with self._lock:
+            values = self._values[:self._size].copy()
+        if not len(values):
+            return {q: None for q in qs}
+        return dict(zip(qs, np.percentile(values, qs).tolist()))
+
+
+def _format_uptime(seconds: float) -> str:
+    minutes, _ = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h {minutes}m" if days else f"{hours}h {minutes}m"
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class MetricsAggregator:
+    """Samples the dashboard figures on a schedule and serves precomputed results"""
+
+    def __init__(self, job_store=None, node_snapshot: Optional[Callable[[], Dict[str, Any]]] = None,
+                 interval: float = 15.0, history: int = 240, latency_window: int = 4096,
+                 clock: Callable[[], float] = time.time):
+        self.job_store = job_store
+        self.node_snapshot = node_snapshot
+        self.interval = interval
+        self.clock = clock
+        self.started_at = clock()
+        self.latencies = LatencyWindow(latency_window)
+        self.series = {name: RingSeries(history) for name in SERIES}
+        self._snapshot = self._build_snapshot({}, {'total': 0, 'healthy': 0, 'unhealthy': 0, 'unknown': 0},
+                                              {50: None, 95: None, 99: None}, None)
+        self._chart = {'timestamps': [], 'series': {name: [] for name in SERIES}}
+        self._lock = threading.Lock()
+        self._scheduler = None
+        self.logger = logging.getLogger(__name__)
+
+    def observe_latency(self, seconds: float) -> None:
+        self.latencies.observe(seconds)
+
+    def _build_snapshot(self, counts, nodes, latency, updated_at) -> Dict[str, Any]:
+        return {
+            'deployments': sum(counts.values()),
+            'running': counts.get(RUNNING, 0),
+            'queue_depth': counts.get(QUEUED, 0),
+            'succeeded': counts.get(SUCCEEDED, 0),
+            'failed': counts.get(FAILED, 0),
+            'cancelled': counts.get(CANCELLED, 0),
+            'nodes': nodes,
+            'latency_ms': {f"p{q}": _ms(value) for q, value in latency.items()},
+            'uptime': _format_uptime((updated_at or self.started_at) - self.started_at),
+            'updated_at': updated_at
+        }
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one sample of every figure and rebuild the snapshot"""
+        now = self.clock()
+        counts = {}
+        if self.job_store is not None:
+            try:
+                counts = self.job_store.status_counts()
+            except Exception as e:
+                self.logger.error(f"Failed to read deployment counts: {str(e)}")
+        nodes = {'total': 0, 'healthy': 0, 'unhealthy': 0, 'unknown': 0}
+        if self.node_snapshot is not None:
+            from node_health import summarize
+            try:
+                nodes = summarize(self.node_snapshot())
+            except Exception as e:
+                self.logger.error(f"Failed to read node health: {str(e)}")
+        latency = self.latencies.percentiles()
+        snapshot = self._build_snapshot(counts, nodes, latency, now)
+
+        values = {
+            'deployments': snapshot['deployments'],
+            'running': snapshot['running'],
+            'queue_depth': snapshot['queue_depth'],
+            'succeeded': snapshot['succeeded'],
+            'failed': snapshot['failed'],
+            'nodes_healthy': nodes['healthy'],
+            'nodes_total': nodes['total'],
+            'latency_p50_ms': snapshot['latency_ms']['p50'],
+            'latency_p95_ms': snapshot['latency_ms']['p95'],
+            'latency_p99_ms': snapshot['latency_ms']['p99']
+        }
+        with self._lock:
+            for name, value in values.items():
+                self.series[name].append(now, value)
+            timestamps, _ = self.series[SERIES[0]].arrays()
+            chart = {
+                'timestamps': timestamps.tolist(),
+                # NaN (no data) becomes null in JSON
+                'series': {name: [None if np.isnan(v) else v for v in self.series[name].arrays()[1].tolist()]
+                           for name in SERIES}
+            }
+            self._snapshot, self._chart = snapshot, chart
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest figures, as of the last sample"""
+        return self._snapshot
+
+    def chart_data(self) -> Dict[str, Any]:
+        """Sampled history of every series, oldest first"""
+        return self._chart
+
+    def start(self) -> None:
+        if self._scheduler is not None:
+            return
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from datetime import datetime
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(self.sample, 'interval', seconds=self.interval, next_run_time=datetime.now(),
+                                id='metrics_aggregator', max_instances=1, coalesce=True)
+        self._scheduler.start()
+        self.logger.info(f"Sampling dashboard metrics every {self.interval}s")
+
+    def stop(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_metrics_aggregator() -> MetricsAggregator:
+    """Get the process-wide aggregator, reading the job store and node health from the container"""
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                try:
+                    config = container.get_config('app_config')['metrics']
+                except KeyError:
+                    config = {'sample_interval': 15.0, 'history': 240, 'latency_window': 4096}
+                try:
+                    job_store = container.get_service('job_store')
+                except KeyError:
+                    job_store = None
+                from node_health import current_snapshot
+                _aggregator = MetricsAggregator(job_store, current_snapshot,
+                                                interval=config['sample_interval'],
+                                                history=config['history'],
+                                                latency_window=config['latency_window'])
+    return _aggregator
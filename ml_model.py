@@ -1,15 +1,163 @@
 import joblib
 import logging
+import os
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+import numpy as np
+from prometheus_client import Gauge, Histogram
+from dependency_container import container
+from feature_encoder import FeatureEncoder
+from forest_compiler import DEFAULT_MAX_ROWS, CompiledForest, ForestPredictor
+from model_registry import ModelRegistry, version_number
 
-# Load pre-trained machine learning model
-model = joblib.load('ml_model.pkl')
+PREDICTION_LATENCY = Histogram('model_prediction_latency_seconds',
+                               'Time to encode and score a batch of configs')
+MODEL_VERSION = Gauge('model_version', 'Registry version number of the model being served (0 = unversioned)')
+
+class ModelUnavailableError(Exception):
+    pass
+
+class ModelBundle(NamedTuple):
+    model: Any
+    encoder: FeatureEncoder
+    version: Optional[str]
+
+class ModelLoader:
+    """Loads the pre-trained model and its feature encoder on first use, once per process.
+
+    When the model registry has a current version it is served, and the
+    CURRENT pointer is re-read every reload_interval seconds: a new version
+    is loaded and swapped in as one (model, encoder) bundle, while requests
+    already running finish with the bundle they started with. Without a
+    registry the compiled forest (see forest_compiler) is preferred when it
+    exists, and the pickled model is loaded otherwise. Batches of
+    compiled_max_rows or more are scored by the pickled model, which is
+    faster on them; it is loaded on the first such batch.
+
+    Compiled arrays are memory-mapped, so forked workers share one copy
+    through the page cache; for pickles mmap_mode applies to the numpy
+    arrays they store.
+    """
+
+    def __init__(self, path='ml_model.pkl', mmap_mode='r', encoder_path='feature_encoder.json',
+                 compiled_dir=None, registry=None, reload_interval=30.0, clock=time.monotonic,
+                 compiled_max_rows=DEFAULT_MAX_ROWS):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.encoder_path = encoder_path
+        self.compiled_dir = compiled_dir
+        self.registry = registry
+        self.reload_interval = reload_interval
+        self.compiled_max_rows = compiled_max_rows
+        self.clock = clock
+        self._loaded = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _load_unversioned(self):
+        if self.compiled_dir and os.path.isdir(self.compiled_dir):
+            source = self.compiled_dir
+            load_estimator = None
+            if os.path.exists(self.path):
+                def load_estimator():
+                    return joblib.load(self.path, mmap_mode=self.mmap_mode)
+            model = ForestPredictor(CompiledForest.load(self.compiled_dir, mmap_mode=self.mmap_mode),
+                                    load_estimator, self.compiled_max_rows)
+        else:
+            source = self.path
+            model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+        logging.info(f"Loaded model from {source} (mmap_mode={self.mmap_mode})")
+        return ModelBundle(model, FeatureEncoder.load(self.encoder_path), None)
+
+    def _load(self, version):
+        try:
+            if version is None:
+                return self._load_unversioned()
+            model, encoder = self.registry.load(version, mmap_mode=self.mmap_mode,
+                                                compiled_max_rows=self.compiled_max_rows)
+            logging.info(f"Loaded model {version} from {self.registry.root}")
+            return ModelBundle(model, encoder, version)
+        except FileNotFoundError as e:
+            raise ModelUnavailableError(f"Model file {e.filename} not found")
+
+    def bundle(self) -> ModelBundle:
+        """The (model, encoder, version) to serve, switching to a newly activated version if due"""
+        loaded = self._loaded
+        if loaded is not None and self.clock() < self._next_check:
+            return loaded
+        with self._lock:
+            if self._loaded is not None and self.clock() < self._next_check:
+                return self._loaded
+            self._next_check = self.clock() + self.reload_interval if self.registry else float('inf')
+            version = self.registry.current_version() if self.registry else None
+            if self._loaded is not None and self._loaded.version == version:
+                return self._loaded
+            try:
+                bundle = self._load(version)
+            except Exception as e:
+                if self._loaded is None:
+                    raise
+                # Keep serving the previous model rather than failing requests
+                logging.error(f"Failed to load model {version}: {str(e)}")
+                return self._loaded
+            self._loaded = bundle
+            MODEL_VERSION.set(version_number(version))
+            return bundle
+
+    def get(self):
+        return self.bundle().model
+
+    def get_encoder(self):
+        return self.bundle().encoder
+
+_loader = None
+_loader_lock = threading.Lock()
+
+def get_model_loader():
+    """Get the process-wide model loader, configured from the ml config"""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                try:
+                    ml_config = container.get_config('app_config')['ml']
+                except KeyError:
+                    ml_config = {'model_path': 'ml_model.pkl', 'mmap_mode': 'r',
+                                 'encoder_path': 'feature_encoder.json',
+                                 'compiled_model_dir': 'compiled_model',
+                                 'registry_dir': 'models', 'reload_interval': 30.0,
+                                 'compiled_max_rows': 500}
+                _loader = ModelLoader(ml_config['model_path'], ml_config['mmap_mode'],
+                                      ml_config['encoder_path'], ml_config['compiled_model_dir'],
+                                      ModelRegistry(ml_config['registry_dir']),
+                                      ml_config['reload_interval'],
+                                      compiled_max_rows=ml_config['compiled_max_rows'])
+    return _loader
+
+def get_model():
+    return get_model_loader().get()
+
+def predict_batch(rows, model=None):
+    """Score many feature rows with a single model.predict call"""
+    if not len(rows):
+        return []
+    return (model if model is not None else get_model()).predict(np.asarray(rows)).tolist()
+
+def predict_configs(configs):
+    """Encode and score many configs with one vectorized transform and one model call"""
+    if not configs:
+        return []
+    # Take model and encoder from one bundle so a hot swap can't pair them wrongly
+    bundle = get_model_loader().bundle()
+    with PREDICTION_LATENCY.time():
+        return predict_batch(bundle.encoder.transform(configs), bundle.model)
 
 # Function to predict optimal configuration
 
-def predict_optimal_config(features):
+def predict_optimal_config(config):
     try:
-        prediction = model.predict([features])
-        return prediction[0]
+        return predict_configs([config])[0]
     except Exception as e:
         logging.error(f'Error in predict_optimal_config: {str(e)}')
         return None
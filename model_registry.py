@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import joblib
+from feature_encoder import FeatureEncoder
+from forest_compiler import DEFAULT_MAX_ROWS, CompiledForest, ForestPredictor, compile_forest
+
+CURRENT_FILE = 'CURRENT'
+MODEL_FILE = 'model.pkl'
+ENCODER_FILE = 'feature_encoder.json'
+COMPILED_DIR = 'compiled_model'
+METADATA_FILE = 'metadata.json'
+
+_VERSION_RE = re.compile(r'v(\d+)$')
+
+
+def version_number(version: Optional[str]) -> int:
+    """Numeric part of a version name such as v0003 (0 when unknown)"""
+    match = _VERSION_RE.match(version or '')
+    return int(match.group(1)) if match else 0
+
+
+class ModelRegistry:
+    """Versioned model artifacts in a directory, with a CURRENT pointer.
+
+    Each version directory holds the pickled model, its feature encoder,
+    the compiled forest and metadata. A version is written under a temporary
+    name and renamed into place, and CURRENT is replaced atomically, so
+    readers never see a half-written model.
+    """
+
+    def __init__(self, root: str, keep_versions: int = 5):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.logger = logging.getLogger(__name__)
+
+    def list_versions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((name for name in os.listdir(self.root)
+                       if _VERSION_RE.match(name) and os.path.isdir(os.path.join(self.root, name))),
+                      key=version_number)
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    def metadata(self, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.version_dir(version), METADATA_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, version: str, mmap_mode: Optional[str] = 'r', compiled_max_rows: int = DEFAULT_MAX_ROWS):
+        """Load (model, encoder) of a version; the compiled forest serves batches below compiled_max_rows"""
+        directory = self.version_dir(version)
+        compiled_dir = os.path.join(directory, COMPILED_DIR)
+        model_path = os.path.join(directory, MODEL_FILE)
+        if os.path.isdir(compiled_dir):
+            model = ForestPredictor(CompiledForest.load(compiled_dir, mmap_mode=mmap_mode),
+                                    lambda: joblib.load(model_path, mmap_mode=mmap_mode), compiled_max_rows)
+        else:
+            model = joblib.load(model_path, mmap_mode=mmap_mode)
+        return model, FeatureEncoder.load(os.path.join(directory, ENCODER_FILE))
+
+    def publish(self, model, encoder: FeatureEncoder, X_check, metadata: Dict[str, Any],
+                activate: bool = True) -> str:
+        """Write a new version (compiled and verified against X_check) and optionally make it current"""
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            joblib.dump(model, os.path.join(staging, MODEL_FILE))
+            encoder.save(os.path.join(staging, ENCODER_FILE))
+            compile_forest(model, X_check, os.path.join(staging, COMPILED_DIR))
+
+            while True:
+                versions = self.list_versions()
+                version = f"v{version_number(versions[-1]) + 1 if versions else 1:04d}"
+                with open(os.path.join(staging, METADATA_FILE), 'w', encoding='utf-8') as f:
+                    json.dump(dict(metadata, version=version,
+                                   created_at=datetime.utcnow().isoformat() + 'Z'), f, indent=2)
+                try:
+                    os.rename(staging, self.version_dir(version))
+                    break
+                except OSError:
+                    # Another trainer published the same version number first
+                    if not os.path.exists(self.version_dir(version)):
+                        raise
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.logger.info(f"Published model {version}")
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version: str) -> None:
+        """Point CURRENT at a version; running workers pick it up on their next check"""
+        if not os.path.isdir(self.version_dir(version)):
+            raise ValueError(f"Unknown model version: {version}")
+        fd, tmp_path = tempfile.mkstemp(prefix='.current-', dir=self.root)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(version + '\n')
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+        self.logger.info(f"Activated model {version}")
+        self.prune()
+
+    def prune(self) -> None:
+        """Delete the oldest versions beyond keep_versions, never the current one"""
+        current = self.current_version()
+        versions = self.list_versions()
+        for version in versions[:max(0, len(versions) - self.keep_versions)]:
+            if version != current:
+                shutil.rmtree(self.version_dir(version), ignore_errors=True)
@@ -0,0 +1,300 @@
+"""Background health probing of the Besu nodes.
+
+Every interval, each node gets one JSON-RPC batch of eth_syncing,
+eth_blockNumber and net_peerCount; nodes are probed concurrently. Latency
+and block lag (behind the highest block seen in the round) go into a ring
+buffer per node. A node turns unhealthy after `fall` bad probes in a row and
+healthy again after `rise` good ones, so one slow answer does not flap it.
+
+Readers (config generation, the RPC gateway, the dashboard) use the
+in-memory snapshot, which is also written to a JSON file for other processes.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import requests
+from prometheus_client import Gauge, Histogram
+
+from dependency_container import container
+
+NODE_HEALTHY = Gauge('besu_node_healthy', 'Whether a Besu node passes its health checks', ['node'])
+NODE_BLOCK_LAG = Gauge('besu_node_block_lag', 'Blocks a Besu node is behind the highest one', ['node'])
+NODE_PROBE_LATENCY = Histogram('besu_node_probe_latency_seconds', 'Latency of Besu node health probes',
+                               ['node'])
+
+_PROBE_METHODS = ('eth_syncing', 'eth_blockNumber', 'net_peerCount')
+
+
+class ProbeSample(NamedTuple):
+    timestamp: float
+    latency: Optional[float]
+    block: Optional[int]
+    lag: Optional[int]
+    peers: Optional[int]
+    syncing: bool
+    error: Optional[str]
+
+
+class NodeHealth:
+    """Probe history and health state of one node"""
+
+    def __init__(self, name: str, url: str, history: int = 60):
+        self.name = name
+        self.url = url
+        self.samples: deque = deque(maxlen=history)
+        self.healthy: Optional[bool] = None  # Unknown until rise or fall probes agree
+        self.streak = 0  # Consecutive probes agreeing with the last one; negative when bad
+        self.changed_at: Optional[float] = None
+
+    def record(self, sample: ProbeSample, good: bool, rise: int, fall: int) -> bool:
+        """Add a probe result; returns whether the health state changed"""
+        self.samples.append(sample)
+        if good:
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+        else:
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+        state = self.healthy
+        if self.streak >= rise:
+            state = True
+        elif -self.streak >= fall:
+            state = False
+        if state == self.healthy:
+            return False
+        self.healthy = state
+        self.changed_at = sample.timestamp
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        last = self.samples[-1] if self.samples else None
+        latencies = sorted(s.latency for s in self.samples if s.latency is not None)
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'changed_at': self.changed_at,
+            'checked_at': last.timestamp if last else None,
+            'block': last.block if last else None,
+            'lag': last.lag if last else None,
+            'peers': last.peers if last else None,
+            'syncing': last.syncing if last else None,
+            'error': last.error if last else None,
+            'latency_ms': round(last.latency * 1000, 1) if last and last.latency is not None else None,
+            'latency_p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+            'max_lag': max((s.lag for s in self.samples if s.lag is not None), default=None),
+            'samples': len(self.samples)
+        }
+
+
+def _quantity(value: Any) -> Optional[int]:
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+class NodeHealthMonitor:
+    """Probes a set of nodes (name -> JSON-RPC URL) in the background"""
+
+    def __init__(self, targets: Dict[str, str], interval: float = 10.0, timeout: float = 3.0,
+                 history: int = 60, rise: int = 2, fall: int = 3, max_block_lag: int = 5,
+                 min_peers: int = 1, snapshot_path: Optional[str] = None,
+                 on_change: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 session: Optional[requests.Session] = None, clock: Callable[[], float] = time.time):
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.max_block_lag = max_block_lag
+        self.min_peers = min_peers
+        self.snapshot_path = snapshot_path
+        self.on_change = on_change
+        self.session = session or requests.Session()
+        self.clock = clock
+        self.nodes = {name: NodeHealth(name, url, history) for name, url in targets.items()}
+        self._snapshot: Dict[str, Any] = self._build_snapshot(None)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(32, len(self.nodes))),
+                                            thread_name_prefix='node-probe')
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def _probe(self, node: NodeHealth) -> Dict[str, Any]:
+        payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': []}
+                   for i, method in enumerate(_PROBE_METHODS)]
+        started = time.monotonic()
+        try:
+            response = self.session.post(node.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            latency = time.monotonic() - started
+            if not isinstance(body, list):
+                raise ValueError('batch requests are not supported')
+            results = {item.get('id'): item for item in body if isinstance(item, dict)}
+            errors = [f"{method}: {results.get(i, {}).get('error', 'no response')}"
+                      for i, method in enumerate(_PROBE_METHODS) if 'result' not in results.get(i, {})]
+            if errors:
+                raise ValueError('; '.join(errors))
+        except (requests.RequestException, ValueError) as e:
+            return {'latency': None, 'error': str(e)}
+        NODE_PROBE_LATENCY.labels(node.name).observe(latency)
+        syncing = results[0]['result']
+        return {
+            'latency': latency,
+            'block': _quantity(results[1]['result']),
+            'peers': _quantity(results[2]['result']),
+            'syncing': bool(syncing),
+            'highest': _quantity(syncing.get('highestBlock')) if isinstance(syncing, dict) else None,
+            'error': None
+        }
+
+    def probe_once(self) -> Dict[str, Any]:
+        """Probe every node once and return the new snapshot"""
+        nodes = list(self.nodes.values())
+        results = list(self._executor.map(self._probe, nodes))
+        now = self.clock()
+        best = max([r['block'] for r in results if r.get('block') is not None] +
+                   [r['highest'] for r in results if r.get('highest') is not None], default=None)
+        changed = []
+        with self._lock:
+            for node, result in zip(nodes, results):
+                block = result.get('block')
+                lag = best - block if best is not None and block is not None else None
+                sample = ProbeSample(now, result['latency'], block, lag, result.get('peers'),
+                                     result.get('syncing', False), result['error'])
+                if node.record(sample, self._is_good(sample), self.rise, self.fall):
+                    changed.append(node)
+                NODE_HEALTHY.labels(node.name).set(1 if node.healthy else 0)
+                if lag is not None:
+                    NODE_BLOCK_LAG.labels(node.name).set(lag)
+            self._snapshot = self._build_snapshot(now)
+            snapshot = self._snapshot
+        for node in changed:
+            last = node.samples[-1]
+            self.logger.warning(f"Node {node.name} is now {'healthy' if node.healthy else 'unhealthy'}"
+                                + (f": {last.error}" if last.error else f" (lag {last.lag}, {last.peers} peers)"))
+        if self.snapshot_path:
+            from generate_nginx_configs import write_file_atomic
+            try:
+                write_file_atomic(self.snapshot_path, json.dumps(snapshot, indent=2))
+            except OSError as e:
+                self.logger.error(f"Failed to write node health snapshot: {str(e)}")
+        if changed and self.on_change:
+            try:
+                self.on_change(snapshot)
+            except Exception as e:
+                self.logger.error(f"Node health change handler failed: {str(e)}")
+        return snapshot
+
+    def _is_good(self, sample: ProbeSample) -> bool:
+        return (sample.error is None and not sample.syncing
+                and sample.lag is not None and sample.lag <= self.max_block_lag
+                and sample.peers is not None and sample.peers >= self.min_peers)
+
+    def _build_snapshot(self, updated_at: Optional[float]) -> Dict[str, Any]:
+        return {'updated_at': updated_at, 'nodes': {name: node.to_dict() for name, node in self.nodes.items()}}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest health of every node, without probing"""
+        with self._lock:
+            return self._snapshot
+
+    def summary(self) -> Dict[str, int]:
+        return summarize(self.snapshot())
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.probe_once()
+            except Exception as e:
+                self.logger.error(f"Node health probe failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None and self.nodes:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='node-health', daemon=True)
+            self._thread.start()
+            self.logger.info(f"Probing {len(self.nodes)} nodes every {self.interval}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def summarize(snapshot: Dict[str, Any]) -> Dict[str, int]:
+    states = [node['healthy'] for node in snapshot.get('nodes', {}).values()]
+    return {'total': len(states), 'healthy': states.count(True), 'unhealthy': states.count(False),
+            'unknown': states.count(None)}
+
+
+def node_targets(nodes: Iterable[Dict[str, Any]], host: str = '127.0.0.1') -> Dict[str, str]:
+    """Probe targets of nodes parsed from docker ps output, by container name"""
+    return {node['container_name']: f"http://{host}:{node['port']}" for node in nodes}
+
+
+def load_snapshot(path: str) -> Dict[str, Any]:
+    """Snapshot written by a running monitor; empty when there is none yet"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'updated_at': None, 'nodes': {}}
+
+
+def filter_healthy(nodes: List[Dict[str, Any]], snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Drop nodes the snapshot marks unhealthy; nodes it does not know yet are kept"""
+    states = snapshot.get('nodes', {})
+    return [node for node in nodes if states.get(node['container_name'], {}).get('healthy') is not False]
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_node_health_monitor() -> NodeHealthMonitor:
+    """Get the process-wide monitor of the nodes in the configured docker ps output"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                try:
+                    config = container.get_config('app_config')['nodes']
+                except KeyError:
+                    config = {'docker_ps_file': 'docker_ps_output.txt', 'rpc_host': '127.0.0.1',
+                              'probe_in_app': True, 'probe_interval': 10.0, 'probe_timeout': 3.0, 'max_block_lag': 5,
+                              'min_peers': 1, 'rise': 2, 'fall': 3,
+                              'snapshot_path': 'data/node_health.json'}
+                from generate_nginx_configs import parse_docker_ps_output
+                try:
+                    nodes = parse_docker_ps_output(config['docker_ps_file'])
+                except (OSError, ValueError) as e:
+                    logging.getLogger(__name__).warning(f"No nodes to probe: {str(e)}")
+                    nodes = []
+                _monitor = NodeHealthMonitor(node_targets(nodes, config['rpc_host']),
+                                             interval=config['probe_interval'],
+                                             timeout=config['probe_timeout'],
+                                             max_block_lag=config['max_block_lag'],
+                                             min_peers=config['min_peers'],
+                                             rise=config['rise'], fall=config['fall'],
+                                             snapshot_path=config['snapshot_path'])
+    return _monitor
+
+
+def current_snapshot() -> Dict[str, Any]:
+    """Snapshot of the monitor running in this process, else the one last written to disk"""
+    try:
+        return container.get_service('node_health').snapshot()
+    except KeyError:
+        pass
+    try:
+        path = container.get_config('app_config')['nodes']['snapshot_path']
+    except KeyError:
+        path = 'data/node_health.json'
+    return load_snapshot(path)
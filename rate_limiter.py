@@ -0,0 +1,188 @@
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from prometheus_client import Counter
+from dependency_container import container
+
+try:
+    import redis
+except ImportError:  # Only needed for the redis backend
+    redis = None
+
+RATE_LIMIT_REJECTIONS = Counter(
+    'rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['endpoint']
+)
+
+RATE_LIMIT_BACKENDS = ('memory', 'redis')
+
+# Check-and-increment of one sliding window, atomic on the Redis server.
+# KEYS: current window, previous window. ARGV: weight of the previous window,
+# limit, key expiry in milliseconds. Returns {allowed, current, previous}.
+_REDIS_HIT_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[1]) + current + 1 > tonumber(ARGV[2]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return {1, current, previous}
+"""
+
+
+class RateLimitResult:
+    """Outcome of a rate limit check and the headers describing it"""
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset_after: float,
+                 retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class MemoryRateLimitBackend:
+    """Window counters kept in this process; for development and single-process setups"""
+
+    # Stale keys are dropped once this many hits have been counted since the last sweep
+    SWEEP_INTERVAL = 10000
+
+    def __init__(self):
+        self._windows: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._hits_since_sweep = 0
+
+    def hit(self, key: str, limit: int, window: int, window_index: int,
+            previous_weight: float) -> Tuple[bool, int, int]:
+        with self._lock:
+            self._hits_since_sweep += 1
+            if self._hits_since_sweep >= self.SWEEP_INTERVAL:
+                self._sweep(window_index * window)
+
+            # [window index, previous count, current count, expiry]
+            state = self._windows.get(key)
+            if state is None or state[0] < window_index - 1:
+                state = self._windows[key] = [window_index, 0, 0, 0]
+            elif state[0] == window_index - 1:
+                state[:] = [window_index, state[2], 0, 0]
+            state[3] = (window_index + 2) * window
+            _, previous, current, _ = state
+
+            if previous * previous_weight + current + 1 > limit:
+                return False, current, previous
+            state[2] = current + 1
+            return True, current + 1, previous
+
+    def _sweep(self, now: float) -> None:
+        """Drop keys whose counters no longer affect any estimate"""
+        self._hits_since_sweep = 0
+        self._windows = {key: state for key, state in self._windows.items() if state[3] > now}
+
+
+class RedisRateLimitBackend:
+    """Window counters in Redis, shared by every worker process"""
+
+    def __init__(self, client, prefix: str = 'ratelimit'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_HIT_SCRIPT)
+
+    def hit(self, key: str, limit: int, window: int, window_index: int,
+            previous_weight: float) -> Tuple[bool, int, int]:
+        keys = [f"{self.prefix}:{key}:{window}:{window_index}",
+                f"{self.prefix}:{key}:{window}:{window_index - 1}"]
+        allowed, current, previous = self._script(
+            keys=keys, args=[repr(previous_weight), limit, window * 2000])
+        return bool(allowed), int(current), int(previous)
+
+
+class RateLimiter:
+    """Sliding window counter rate limiter.
+
+    Each key keeps a counter for the current fixed window and the previous
+    one; the request rate is estimated as the current count plus the
+    previous count weighted by how much of the previous window still
+    overlaps the sliding window. A check costs O(1) time and memory per key.
+    """
+
+    def __init__(self, backend, clock=time.time):
+        self.backend = backend
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """Count a request for key and report whether it is within limit per window seconds"""
+        now = self.clock()
+        window_index = int(now // window)
+        elapsed = now - window_index * window
+        previous_weight = 1.0 - elapsed / window
+        try:
+            allowed, current, previous = self.backend.hit(key, limit, window, window_index, previous_weight)
+        except Exception as e:
+            # Fail open: an unavailable backend must not take the API down
+            self.logger.error(f"Rate limiter backend error: {str(e)}")
+            return RateLimitResult(True, limit, limit, window - elapsed)
+
+        estimate = previous * previous_weight + current
+        remaining = max(0, int(limit - estimate))
+        retry_after = 0.0 if allowed else self._retry_after(limit, window, elapsed, current, previous)
+        return RateLimitResult(allowed, limit, remaining, window - elapsed, retry_after)
+
+    @staticmethod
+    def _retry_after(limit: int, window: int, elapsed: float, current: int, previous: int) -> float:
+        """Seconds until one more request fits in the sliding window"""
+        target = limit - 1
+        if previous:
+            # The previous window keeps sliding out during the current one
+            wait = (previous * (1 - elapsed / window) + current - target) * window / previous
+            if wait <= window - elapsed:
+                return wait
+        if current <= target:
+            return window - elapsed
+        # In the next window the current count becomes the sliding-out one
+        return window - elapsed + (current - target) * window / current
+
+
+def create_rate_limiter(backend: str = 'memory', redis_url: Optional[str] = None) -> RateLimiter:
+    """Create a rate limiter with the named backend"""
+    if backend not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+    if backend == 'redis':
+        if redis is None:
+            logging.getLogger(__name__).warning(
+                "redis package not installed, rate limits are counted per process")
+        else:
+            return RateLimiter(RedisRateLimitBackend(redis.Redis.from_url(redis_url)))
+    return RateLimiter(MemoryRateLimitBackend())
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide rate limiter, configured from the security config"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                try:
+                    security_config = container.get_config('app_config')['security']
+                except KeyError:
+                    security_config = {'rate_limit_backend': 'memory', 'redis_url': None}
+                _rate_limiter = create_rate_limiter(security_config['rate_limit_backend'],
+                                                    security_config['redis_url'])
+    return _rate_limiter
@@ -1,33 +1,27 @@
 import os
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session, current_app as app, abort
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session, current_app as app, abort, Response, stream_with_context, make_response
+from werkzeug.exceptions import HTTPException
 from flask_login import login_required, current_user
-import time
 import traceback
-import re
-from azure_operations import create_resource_group, deploy_vm, deploy_via_rest_api, create_network, create_storage_account, setup_monitoring_and_alerts, initialize_azure_integration
-from ml_model import model, predict_optimal_config
+import json
+from azure_operations import validate_config_data, deploy_via_rest_api, create_network, create_storage_account, setup_monitoring_and_alerts, initialize_azure_integration
+from ml_model import predict_optimal_config, predict_configs, ModelUnavailableError
 import pyotp
 from markdown_helper import MarkdownConverter
-from auth import requires_roles, rate_limit, token_required
+from auth import can_access_deployment, requires_roles, rate_limit, token_required
+from dependency_container import container
+from deployment_jobs import new_deployment_id
+from validation_schema import SIMPLE_SCHEMA, EXPERT_SCHEMA, validation_result
+from validation_helpers import parse_ndjson, validate_config_batch
+from node_health import current_snapshot
+from metrics_aggregator import get_metrics_aggregator
+from event_bus import get_event_bus
 import logging
-from datetime import datetime
 
 routes_bp = Blueprint('routes', __name__)
 markdown_converter = MarkdownConverter()
 logger = logging.getLogger(__name__)
 
-class ValidationError(Exception):
-    pass
-
-def validate_resource_name(name):
-    if not re.match(r'^[a-zA-Z0-9-_]{3,64}$', name):
-        raise ValidationError('Resource name must be 3-64 characters long and contain only letters, numbers, hyphens, and underscores')
-
-def validate_location(location):
-    valid_locations = ['eastus', 'westus', 'northeurope', 'westeurope']
-    if location not in valid_locations:
-        raise ValidationError(f'Invalid location. Must be one of: {", ".join(valid_locations)}')
-
 @routes_bp.route('/', methods=['GET'])
 def index():
     app.logger.info('Index page accessed')
@@ -60,6 +54,10 @@ def deploy():
 def terms():
     return render_template('terms.html')
 
+def emit_status(status, message):
+    """Send a status message to the current user's browsers"""
+    get_event_bus().publish_user(current_user.id, status, message)
+
 @routes_bp.route('/execute', methods=['POST'])
 @login_required
 def execute_action():
@@ -103,22 +101,36 @@ def chat():
 @routes_bp.route('/predict', methods=['POST'])
 @login_required
 def predict():
-    config = request.form.get('config')
+    config = request.form.get('config') or (request.get_json(silent=True) or {}).get('config')
     app.logger.info(f'Prediction requested for config: {config}')
-    config_data, error = validate_config(config)
+    config_data, error = validate_config_data(config)
     if error:
         app.logger.error(f'Prediction error: {error}')
         return jsonify({'error': error})
-    features = [
-        config_data.get('vm_name', ''),
-        config_data.get('admin_username', ''),
-        config_data.get('resource_group', ''),
-        config_data.get('location', ''),
-        config_data.get('image', '')
-    ]
-    prediction = model.predict([features])
-    app.logger.info(f'Prediction result: {prediction[0]}')
-    return jsonify({'prediction': prediction[0]})
+    try:
+        prediction = predict_configs([config_data])[0]
+    except ModelUnavailableError as e:
+        return jsonify({'error': str(e)}), 503
+    app.logger.info(f'Prediction result: {prediction}')
+    return jsonify({'prediction': prediction})
+
+@routes_bp.route('/predict/batch', methods=['POST'])
+@login_required
+def predict_batch_route():
+    """Score a list of configs with one model call"""
+    data = request.get_json(silent=True)
+    configs = data.get('configs') if isinstance(data, dict) else data
+    if not isinstance(configs, list) or not all(isinstance(c, dict) for c in configs):
+        return jsonify({'error': 'Expected a list of configs'}), 400
+    try:
+        predictions = predict_configs(configs)
+    except ModelUnavailableError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        app.logger.error(f'Batch prediction error: {str(e)}')
+        return jsonify({'error': 'Prediction failed'}), 500
+    app.logger.info(f'Scored {len(predictions)} configs')
+    return jsonify({'predictions': predictions})
 
 @routes_bp.route('/create_network', methods=['POST'])
 @login_required
@@ -173,15 +185,10 @@ def setup_monitoring_route():
 def predict_optimal_config_route():
     config = request.json
     app.logger.info(f'Optimal config prediction requested: {config}')
-    features = [
-        config.get('vm_name', ''),
-        config.get('admin_username', ''),
-        config.get('resource_group', ''),
-        config.get('location', ''),
-        config.get('image', '')
-    ]
-    prediction = predict_optimal_config(features)
-    if prediction:
+    if not isinstance(config, dict):
+        return jsonify({'error': 'Expected a config object'}), 400
+    prediction = predict_optimal_config(config)
+    if prediction is not None:
         return jsonify({'prediction': prediction})
     else:
         return jsonify({'error': 'Prediction failed'}), 500
@@ -236,264 +243,127 @@ def deploy():
             return jsonify({'error': 'No data provided'}), 400
 
         # Validate the configuration
-        if data.get('mode') == 'expert':
-            validation_result = validate_expert_config()
-        else:
-            validation_result = validate_simple_config()
-
-        if not validation_result.json['valid']:
-            return validation_result
+        mode = 'expert' if data.get('mode') == 'expert' else 'simple'
+        errors = (EXPERT_SCHEMA if mode == 'expert' else SIMPLE_SCHEMA).validate(data)
+        if errors:
+            return jsonify(validation_result(errors)), 400
 
         # Log deployment attempt
         app.logger.info(f'Deployment requested by user {current_user.id}')
-        
-        # Additional security checks
-        try:
-            validate_resource_name(data.get('resourceGroup', ''))
-            validate_location(data.get('location', ''))
-        except ValidationError as e:
-            return jsonify({'error': str(e)}), 400
 
-        # Start deployment process
-        deployment_id = f"dep-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
-        
-        # Emit initial status
-        app.logger.info(f'Starting deployment {deployment_id}')
-        app.emit_status_update('info', f'Starting deployment {deployment_id}')
+        # Queue the deployment; a worker from the deployment pool runs it
+        deployment_id = new_deployment_id()
+        container.get_service('job_store').enqueue(
+            deployment_id, mode, data, requested_by=str(current_user.id)
+        )
+        try:
+            container.get_service('worker_pool').notify()
+        except KeyError:
+            pass  # Workers run in a separate deployment_worker.py process
 
-        # TODO: Implement actual deployment logic here
-        # This would typically be handled by a background task
+        app.logger.info(f'Queued deployment {deployment_id}')
 
         return jsonify({
-            'status': 'initiated',
+            'status': 'queued',
             'deployment_id': deployment_id,
-            'message': 'Deployment process started'
-        })
+            'status_url': url_for('routes.get_deployment', deployment_id=deployment_id),
+            'message': 'Deployment queued'
+        }), 202
 
     except Exception as e:
         app.logger.error(f'Deployment error: {str(e)}')
-        app.emit_status_update('error', f'Deployment failed: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
-def handle_simple_deployment(data):
-    """Process simple mode deployment"""
-    required_fields = ['resourceGroup', 'location', 'nodeType', 'vmSize']
-    for field in required_fields:
-        if not data.get(field):
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    
-    try:
-        # Create resource group
-        resource_group = create_resource_group(data['resourceGroup'], data['location'])
-        
-        # Deploy VM with oracle node
-        deployment_config = {
-            'resource_group': data['resourceGroup'],
-            'vm_name': f"{data['nodeType']}-{int(time.time())}",
-            'location': data['location'],
-            'vm_size': data['vmSize'],
-            'node_type': data['nodeType']
-        }
-        
-        result = deploy_vm(deployment_config)
-        return jsonify({'result': result})
-        
-    except Exception as e:
-        app.logger.error(f'Simple deployment error: {str(e)}')
-        return jsonify({'error': str(e)}), 500
-
-def handle_expert_deployment(data):
-    """Process expert mode deployment"""
-    # Validate network configuration
-    network = data.get('network', {})
-    if not network.get('vnetName') or not network.get('subnetPrefix'):
-        return jsonify({'error': 'Invalid network configuration'}), 400
-        
-    # Validate node configuration
-    nodes = data.get('nodes', {})
-    if not nodes.get('count') or not nodes.get('consensusProtocol'):
-        return jsonify({'error': 'Invalid node configuration'}), 400
-    
-    try:
-        # Create network infrastructure
-        network_config = {
-            'vnet_name': network['vnetName'],
-            'subnet_prefix': network['subnetPrefix']
-        }
-        network_result = create_network(network_config)
-        
-        # Deploy nodes
-        node_results = []
-        for i in range(int(nodes['count'])):
-            node_config = {
-                'resource_group': f"{network['vnetName']}-rg",
-                'vm_name': f"node-{i+1}",
-                'consensus_protocol': nodes['consensusProtocol']
-            }
-            node_result = deploy_vm(node_config)
-            node_results.append(node_result)
-        
-        # Setup monitoring if enabled
-        monitoring = data.get('monitoring', {})
-        if monitoring.get('enabled'):
-            monitoring_config = {
-                'retention_days': monitoring.get('retention', 30),
-                'alert_email': monitoring.get('alertEmail')
-            }
-            setup_monitoring_and_alerts(monitoring_config)
-        
-        return jsonify({
-            'network': network_result,
-            'nodes': node_results,
-            'monitoring': monitoring.get('enabled', False)
-        })
-        
-    except Exception as e:
-        app.logger.error(f'Expert deployment error: {str(e)}')
-        return jsonify({'error': str(e)}), 500
+@routes_bp.route('/api/deployments/<deployment_id>', methods=['GET'])
+@login_required
+def get_deployment(deployment_id):
+    """Get the state of a deployment and each of its steps"""
+    job = container.get_service('job_store').get_job(deployment_id)
+    # Other users' deployments are reported as missing rather than revealing they exist
+    if not can_access_deployment(current_user, job):
+        return jsonify({'error': 'Deployment not found'}), 404
+    return jsonify(job)
+
+@routes_bp.route('/api/deployments/<deployment_id>/cancel', methods=['POST'])
+@login_required
+@requires_roles('admin', 'deployer')
+def cancel_deployment(deployment_id):
+    """Cancel a queued deployment or stop the commands of a running one"""
+    store = container.get_service('job_store')
+    if not can_access_deployment(current_user, store.get_job(deployment_id)):
+        return jsonify({'error': 'Deployment not found'}), 404
+    job = store.request_cancel(deployment_id)
+    app.logger.info(f'Cancellation of deployment {deployment_id} requested by user {current_user.id}')
+    return jsonify(job), 202
+
+def _validate_request(schema, mode):
+    """Validate the JSON body of the request against a compiled schema"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data:
+        return jsonify({'valid': False, 'errors': ['No data provided']}), 400
+    errors = schema.validate(data)
+    app.logger.info(f'{mode.capitalize()} config validation completed with {len(errors)} errors')
+    return jsonify(validation_result(errors))
 
 @routes_bp.route('/api/validate/simple', methods=['POST'])
 @login_required
 def validate_simple_config():
     """Validate simple mode configuration"""
-    try:
-        data = request.get_json()
-        errors = []
-        
-        # Resource group validation
-        rg_name = data.get('resourceGroup', '')
-        if not re.match(r'^[a-zA-Z0-9-_]{3,64}$', rg_name):
-            errors.append('Invalid resource group name')
-            
-        # Location validation
-        location = data.get('location', '')
-        valid_locations = ['eastus', 'westus', 'northeurope']  # Add more as needed
-        if location not in valid_locations:
-            errors.append('Invalid location')
-            
-        # Node type validation
-        node_type = data.get('nodeType', '')
-        valid_types = ['validator', 'observer', 'bootnode']
-        if node_type not in valid_types:
-            errors.append('Invalid node type')
-            
-        # VM size validation
-        vm_size = data.get('vmSize', '')
-        valid_sizes = ['Standard_D2s_v3', 'Standard_D4s_v3', 'Standard_D8s_v3']
-        if vm_size not in valid_sizes:
-            errors.append('Invalid VM size')
-            
-        return jsonify({
-            'valid': len(errors) == 0,
-            'errors': errors
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'valid': False,
-            'errors': [str(e)]
-        }), 500
+    return _validate_request(SIMPLE_SCHEMA, 'simple')
 
 @routes_bp.route('/api/validate/expert', methods=['POST'])
 @login_required
 @rate_limit(max_requests=100, window=60)
 def validate_expert_config():
     """Validate expert mode configuration with enhanced security"""
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'valid': False, 'errors': ['No data provided']}), 400
-
-        errors = []
-        
-        # Network validation with detailed error messages
-        network = data.get('network', {})
-        if not isinstance(network, dict):
-            errors.append('Network configuration must be an object')
-        else:
-            vnet_name = network.get('vnetName')
-            if not vnet_name or not re.match(r'^[a-zA-Z0-9-_]{2,64}$', vnet_name):
-                errors.append('Invalid virtual network name (2-64 chars, alphanumeric, hyphens, underscores)')
-            
-            subnet_prefix = network.get('subnetPrefix')
-            if subnet_prefix:
-                if not re.match(r'^([0-9]{1,3}\.){3}[0-9]{1,3}\/[0-9]{1,2}$', subnet_prefix):
-                    errors.append('Invalid subnet prefix format (e.g., 10.0.0.0/24)')
-                else:
-                    # Validate subnet range
-                    try:
-                        prefix = int(subnet_prefix.split('/')[-1])
-                        if not 16 <= prefix <= 29:
-                            errors.append('Subnet prefix must be between /16 and /29')
-                    except ValueError:
-                        errors.append('Invalid subnet prefix number')
-
-        # Node configuration validation
-        nodes = data.get('nodes', {})
-        if not isinstance(nodes, dict):
-            errors.append('Node configuration must be an object')
-        else:
-            try:
-                node_count = int(nodes.get('count', 0))
-                if not 1 <= node_count <= 10:
-                    errors.append('Node count must be between 1 and 10')
-            except ValueError:
-                errors.append('Invalid node count')
-
-            # Validate consensus protocol
-            valid_protocols = ['ibft2', 'qbft', 'clique']
-            protocol = nodes.get('consensusProtocol')
-            if not protocol or protocol not in valid_protocols:
-                errors.append(f'Invalid consensus protocol. Must be one of: {", ".join(valid_protocols)}')
-
-        # Monitoring configuration validation
-        monitoring = data.get('monitoring', {})
-        if monitoring.get('enabled'):
-            try:
-                retention = int(monitoring.get('retention', 0))
-                if not 1 <= retention <= 90:
-                    errors.append('Retention period must be between 1 and 90 days')
-            except ValueError:
-                errors.append('Invalid retention period')
-
-            if monitoring.get('alertEmail'):
-                email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-                if not re.match(email_pattern, monitoring['alertEmail']):
-                    errors.append('Invalid email address format')
-
-        # Security configuration validation
-        security = data.get('security', {})
-        if security:
-            firewall_rules = security.get('firewall_rules', [])
-            for rule in firewall_rules:
-                try:
-                    port = int(rule.get('port', -1))
-                    if not 1 <= port <= 65535:
-                        errors.append(f'Invalid port number: {port}. Must be between 1 and 65535')
-                except ValueError:
-                    errors.append(f'Invalid port value: {rule.get("port")}')
-
-                if rule.get('protocol', '').upper() not in ['TCP', 'UDP']:
-                    errors.append(f'Invalid protocol: {rule.get("protocol")}. Must be TCP or UDP')
-
-        app.logger.info(f'Expert config validation completed with {len(errors)} errors')
-        return jsonify({
-            'valid': len(errors) == 0,
-            'errors': errors
-        })
+    return _validate_request(EXPERT_SCHEMA, 'expert')
 
-    except Exception as e:
-        app.logger.error(f'Validation error: {str(e)}')
-        return jsonify({
-            'valid': False,
-            'errors': [str(e)]
-        }), 500
+@routes_bp.route('/api/validate/batch', methods=['POST'])
+@login_required
+@rate_limit(max_requests=30, window=60)
+def validate_batch_config():
+    """Validate a JSON array or NDJSON stream of configurations, streaming NDJSON results"""
+    if request.mimetype == 'application/x-ndjson':
+        configs = parse_ndjson(request.stream)
+    else:
+        configs = request.get_json(silent=True)
+        if not isinstance(configs, list):
+            return jsonify({'valid': False, 'errors': ['Expected a JSON array or NDJSON stream of configurations']}), 400
+    max_items = container.get_config('app_config')['validation']['batch_max_items']
+
+    def generate():
+        summary = {'total': 0, 'valid': 0, 'invalid': 0, 'truncated': False}
+        for result in validate_config_batch(configs):
+            if result['index'] >= max_items:
+                summary['truncated'] = True
+                break
+            summary['total'] += 1
+            summary['valid' if result['valid'] else 'invalid'] += 1
+            yield json.dumps(result) + '\n'
+        app.logger.info(f"Batch validation of {summary['total']} configs found {summary['invalid']} invalid")
+        yield json.dumps({'summary': summary}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 def get_realtime_data():
-    return {
-        'deployments': 5,  # Example metric
-        'uptime': '99.9%'  # Example metric
-    }
+    """Dashboard figures as of the aggregator's last sample"""
+    return get_metrics_aggregator().snapshot()
+
+@routes_bp.route('/realtime-data', methods=['GET'])
+def realtime_data():
+    return jsonify(get_realtime_data())
+
+@routes_bp.route('/api/metrics/realtime', methods=['GET'])
+@login_required
+def realtime_chart_data():
+    """Sampled history of the dashboard figures for charts"""
+    return jsonify(get_metrics_aggregator().chart_data())
+
+@routes_bp.route('/api/nodes/health', methods=['GET'])
+@login_required
+def nodes_health():
+    """Latest probe results of the Besu nodes"""
+    return jsonify(current_snapshot())
 
 # Get secret key from environment variable
 SECRET_KEY = os.getenv('TOTP_SECRET_KEY', 'base32secret3232')
@@ -510,10 +380,18 @@ def validate_2fa_code(code):
 def docs_page(page):
     """Render markdown documentation pages with proper HTML conversion"""
     try:
-        content = markdown_converter.convert_file(page)
-        if content is None:
+        document = markdown_converter.render_file(page)
+        if document is None:
             abort(404)
-        return render_template('markdown.html', content=content)
+        if request.if_none_match.contains(document.etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(render_template('markdown.html', content=document.html))
+        response.set_etag(document.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         app.logger.error(f'Error rendering documentation: {str(e)}')
         abort(500)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""Caching JSON-RPC gateway in front of the Besu nodes.
+
+Read-only calls are cached per method: chain constants forever, calls
+that depend on the chain head for as long as the head stays the same, and
+data of finalized blocks (blocks, transactions, state at an explicit
+block) forever. Batches are split so each call is cached and forwarded on
+its own, identical concurrent calls share one upstream request, and misses
+are spread over the member nodes.
+
+Usage: python rpc_gateway.py [--docker-ps-file docker_ps_output.txt] [--upstream URL ...] [--port 8600]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Histogram
+
+RPC_GATEWAY_CALLS = Counter('rpc_gateway_calls_total', 'JSON-RPC calls handled by the gateway',
+                            ['method', 'result'])
+RPC_UPSTREAM_LATENCY = Histogram('rpc_gateway_upstream_latency_seconds', 'Latency of calls to Besu nodes',
+                                 ['upstream'])
+
+PERMANENT = 'permanent'
+BLOCK = 'block'
+
+# Constant for the lifetime of a chain
+_STATIC_METHODS = frozenset({'eth_chainId', 'net_version'})
+# Change at most once per block
+_HEAD_METHODS = frozenset({'eth_gasPrice', 'eth_syncing', 'net_peerCount', 'web3_clientVersion',
+                           'eth_maxPriorityFeePerGas', 'eth_feeHistory'})
+# Position of the block parameter, which defaults to latest
+_BLOCK_PARAM = {
+    'eth_getBalance': 1,
+    'eth_getCode': 1,
+    'eth_getTransactionCount': 1,
+    'eth_getStorageAt': 2,
+    'eth_call': 1,
+    'eth_getBlockByNumber': 0,
+    'eth_getBlockTransactionCountByNumber': 0,
+    'eth_getTransactionByBlockNumberAndIndex': 0
+}
+# Addressed by hash; immutable once found
+_HASH_METHODS = frozenset({'eth_getBlockByHash', 'eth_getBlockTransactionCountByHash',
+                           'eth_getTransactionByBlockHashAndIndex'})
+# Immutable once mined into a finalized block
+_TRANSACTION_METHODS = frozenset({'eth_getTransactionByHash', 'eth_getTransactionReceipt'})
+
+
+def _block_number(tag: Any) -> Optional[int]:
+    """Number of an explicit block parameter, None for latest/pending/safe/finalized"""
+    if tag == 'earliest':
+        return 0
+    if isinstance(tag, str) and tag.startswith('0x'):
+        try:
+            return int(tag, 16)
+        except ValueError:
+            return None
+    if isinstance(tag, dict) and 'blockNumber' in tag:  # EIP-1898
+        return _block_number(tag['blockNumber'])
+    return None
+
+
+def request_scope(method: str, params: List[Any], finalized: int) -> Optional[str]:
+    """How long the result of a call may be cached: PERMANENT, BLOCK or None (not at all)"""
+    if method in _STATIC_METHODS or method in _HASH_METHODS:
+        return PERMANENT
+    if method in _HEAD_METHODS or method in _TRANSACTION_METHODS:
+        return BLOCK
+    if method in _BLOCK_PARAM:
+        index = _BLOCK_PARAM[method]
+        tag = params[index] if len(params) > index else 'latest'
+        if tag == 'pending':
+            return None
+        number = _block_number(tag)
+        if number is not None and number <= finalized:
+            return PERMANENT
+        return BLOCK
+    return None
+
+
+def result_scope(method: str, scope: str, result: Any, finalized: int) -> Optional[str]:
+    """Adjust the scope of a call once its result is known"""
+    if result is None:
+        # Not found (yet): a block or transaction may still appear
+        return BLOCK if scope else None
+    if method in _TRANSACTION_METHODS:
+        number = _block_number(result.get('blockNumber')) if isinstance(result, dict) else None
+        return PERMANENT if number is not None and number <= finalized else BLOCK
+    return scope
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after their own TTL (None for never)"""
+
+    def __init__(self, max_size: int = 50000, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: 'OrderedDict[Any, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any, ttl: Optional[float]) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl if ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._calls: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns the result and whether it was shared with a call already in flight"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result(), True
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamPool:
+    """Besu nodes behind the gateway, chosen by fewest calls in flight.
+
+    A node that fails is skipped for cooldown seconds, and the call is
+    retried on another one.
+    """
+
+    def __init__(self, urls: Iterable[str], cooldown: float = 10.0, timeout: tuple = (2, 15),
+                 session: Optional[requests.Session] = None, clock: Callable[[], float] = time.monotonic):
+        self.urls = list(urls)
+        if not self.urls:
+            raise ValueError("No upstream nodes configured")
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.clock = clock
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=32))
+            session.mount('https://', HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=32))
+        self.session = session
+        self._in_flight = {url: 0 for url in self.urls}
+        self._down_until = {url: 0.0 for url in self.urls}
+        self._unhealthy = set()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def set_unhealthy(self, urls: Iterable[str]) -> None:
+        """Exclude nodes reported unhealthy by an external check"""
+        with self._lock:
+            self._unhealthy = set(urls)
+
+    def _choose(self, tried: set) -> Optional[str]:
+        with self._lock:
+            now = self.clock()
+            candidates = [url for url in self.urls if url not in tried]
+            available = [url for url in candidates
+                         if self._down_until[url] <= now and url not in self._unhealthy]
+            # When every node looks down, try them anyway rather than fail outright
+            pool = available or candidates
+            if not pool:
+                return None
+            url = min(pool, key=lambda u: self._in_flight[u])
+            self._in_flight[url] += 1
+            return url
+
+    def call(self, payload: Any) -> Any:
+        """POST a JSON-RPC payload to a node and return the decoded response"""
+        tried = set()
+        while True:
+            url = self._choose(tried)
+            if url is None:
+                raise UpstreamError(f"All {len(self.urls)} upstream nodes failed")
+            tried.add(url)
+            started = time.monotonic()
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise UpstreamError(f"{url} returned {response.status_code}")
+                return response.json()
+            except (requests.RequestException, ValueError, UpstreamError) as e:
+                self.logger.warning(f"Upstream {url} failed: {str(e)}")
+                with self._lock:
+                    self._down_until[url] = self.clock() + self.cooldown
+            finally:
+                RPC_UPSTREAM_LATENCY.labels(url).observe(time.monotonic() - started)
+                with self._lock:
+                    self._in_flight[url] -= 1
+
+
+def _error(code: int, message: str) -> Dict[str, Any]:
+    return {'error': {'code': code, 'message': message}}
+
+
+class RpcGateway:
+    """JSON-RPC request handling: batching, caching, deduplication and forwarding"""
+
+    def __init__(self, upstreams: UpstreamPool, head_ttl: float = 1.0, block_ttl: float = 30.0,
+                 finality_depth: int = 0, cache_size: int = 50000, max_workers: int = 16,
+                 max_head_age: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.upstreams = upstreams
+        self.head_ttl = head_ttl
+        # How long the last head read is used while the nodes cannot be reached
+        self.max_head_age = max_head_age if max_head_age is not None else 5 * head_ttl
+        self.block_ttl = block_ttl
+        self.finality_depth = finality_depth
+        self.cache = TTLCache(cache_size, clock)
+        self.clock = clock
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rpc-gateway')
+        self._head: Optional[int] = None
+        self._head_read = float('-inf')
+        self._head_checked = float('-inf')
+        self._head_error = 'Cannot read the chain head'
+        self._request_id = 0
+        self._id_lock = threading.Lock()
+
+    def _forward(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        with self._id_lock:
+            self._request_id += 1
+            request_id = self._request_id
+        try:
+            response = self.upstreams.call({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+        except UpstreamError as e:
+            return _error(-32603, str(e))
+        if not isinstance(response, dict):
+            return _error(-32603, 'Invalid response from upstream node')
+        if 'error' in response:
+            return {'error': response['error']}
+        return {'result': response.get('result')}
+
+    def head(self) -> int:
+        """Latest block number, re-read from the nodes at most every head_ttl seconds.
+
+        Failed reads are not retried within head_ttl either; the last head is
+        used until it is max_head_age old, then UpstreamError is raised.
+        """
+        if self.clock() - self._head_checked >= self.head_ttl:
+            self._flight.do(('eth_blockNumber',), self._read_head)
+        if self._head is None or self.clock() - self._head_read > self.max_head_age:
+            raise UpstreamError(self._head_error)
+        return self._head
+
+    def _read_head(self) -> None:
+        value = self._forward('eth_blockNumber', [])
+        now = self.clock()
+        try:
+            self._head = max(int(value['result'], 16), self._head or 0)
+            self._head_read = now
+        except (KeyError, TypeError, ValueError):
+            error = value.get('error')
+            self._head_error = (error.get('message') if isinstance(error, dict) else None) \
+                or 'Cannot read the chain head'
+        self._head_checked = now
+
+    def call(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        """Result or error of a single call, from the cache when possible"""
+        try:
+            if method == 'eth_blockNumber':
+                RPC_GATEWAY_CALLS.labels(method, 'hit').inc()
+                return {'result': hex(self.head())}
+            head = self.head()
+        except UpstreamError as e:
+            RPC_GATEWAY_CALLS.labels(method, 'error').inc()
+            return _error(-32603, str(e))
+        finalized = head - self.finality_depth
+        scope = request_scope(method, params, finalized)
+        if scope is None:
+            RPC_GATEWAY_CALLS.labels(method, 'uncached').inc()
+            return self._forward(method, params)
+
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        permanent_key = (method, canonical)
+        block_key = (method, canonical, head)
+        for key in (permanent_key, block_key):
+            cached = self.cache.get(key)
+            if cached is not None:
+                RPC_GATEWAY_CALLS.labels(method, 'hit').inc()
+                return cached
+
+        value, shared = self._flight.do(block_key, lambda: self._forward(method, params))
+        if 'result' in value and not shared:
+            final_scope = result_scope(method, scope, value['result'], finalized)
+            if final_scope == PERMANENT:
+                self.cache.put(permanent_key, value, None)
+            elif final_scope == BLOCK:
+                self.cache.put(block_key, value, self.block_ttl)
+        RPC_GATEWAY_CALLS.labels(method, 'shared' if shared else 'miss').inc()
+        return value
+
+    def _handle_one(self, request: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' \
+                or not isinstance(request.get('method'), str):
+            return dict(jsonrpc='2.0', id=None, **_error(-32600, 'Invalid Request'))
+        params = request.get('params', [])
+        if not isinstance(params, (list, dict)):
+            return dict(jsonrpc='2.0', id=request.get('id'), **_error(-32602, 'Invalid params'))
+        # Named parameters are forwarded as is, without caching
+        value = self.call(request['method'], params) if isinstance(params, list) \
+            else self._forward(request['method'], params)
+        if 'id' not in request:
+            return None  # Notification
+        return dict(jsonrpc='2.0', id=request['id'], **value)
+
+    def handle(self, payload: Any) -> Optional[Any]:
+        """Response to a JSON-RPC request or batch (None when there is nothing to answer)"""
+        if isinstance(payload, list):
+            if not payload:
+                return dict(jsonrpc='2.0', id=None, **_error(-32600, 'Invalid Request'))
+            # Calls of a batch are served and forwarded independently, in parallel
+            responses = [r for r in self._executor.map(self._handle_one, payload) if r is not None]
+            return responses or None
+        return self._handle_one(payload)
+
+
+def create_gateway_app(gateway: RpcGateway):
+    """Flask app exposing the gateway at / and /json-rpc"""
+    from flask import Flask, Response, request
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    app = Flask(__name__)
+
+    @app.route('/', methods=['POST'])
+    @app.route('/json-rpc', methods=['POST'])
+    def json_rpc():
+        try:
+            payload = json.loads(request.get_data())
+        except ValueError:
+            return Response(json.dumps(dict(jsonrpc='2.0', id=None, **_error(-32700, 'Parse error'))),
+                            mimetype='application/json')
+        response = gateway.handle(payload)
+        if response is None:
+            return Response(status=204)
+        return Response(json.dumps(response), mimetype='application/json')
+
+    @app.route('/health')
+    def health():
+        return {'status': 'ok', 'cache_entries': len(gateway.cache)}
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+    return app
+
+
+def discover_upstreams(docker_ps_file: str, host: str = '127.0.0.1', node_types=('member',)) -> List[str]:
+    """JSON-RPC URLs of the nodes of the given types in docker ps output"""
+    from generate_nginx_configs import parse_docker_ps_output
+    return [f"http://{host}:{node['port']}" for node in parse_docker_ps_output(docker_ps_file)
+            if node['type'] in node_types]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caching JSON-RPC gateway for the Besu nodes')
+    parser.add_argument('--docker-ps-file', default='docker_ps_output.txt',
+                        help='docker ps output to discover the member nodes from')
+    parser.add_argument('--upstream-host', default='127.0.0.1')
+    parser.add_argument('--upstream', action='append', default=[],
+                        help='Node URL; replaces discovery, may be repeated')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('RPC_GATEWAY_PORT', '8600')))
+    parser.add_argument('--finality-depth', type=int, default=int(os.getenv('RPC_FINALITY_DEPTH', '0')),
+                        help='Blocks behind the head after which data is cached forever (0 for QBFT/IBFT)')
+    parser.add_argument('--head-ttl', type=float, default=float(os.getenv('RPC_HEAD_TTL', '1.0')),
+                        help='Seconds between reads of the chain head')
+    parser.add_argument('--max-head-age', type=float,
+                        default=float(os.getenv('RPC_MAX_HEAD_AGE', '0')) or None,
+                        help='Seconds the last chain head is used while no node answers (default 5 head TTLs)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    urls = args.upstream or discover_upstreams(args.docker_ps_file, args.upstream_host)
+    logging.info(f"Forwarding to {', '.join(urls)}")
+    pool = UpstreamPool(urls)
+    gateway = RpcGateway(pool, head_ttl=args.head_ttl, finality_depth=args.finality_depth,
+                         max_head_age=args.max_head_age)
+
+    # Route around nodes the health prober marks unhealthy
+    from node_health import NodeHealthMonitor
+    monitor = NodeHealthMonitor({url: url for url in urls}, on_change=lambda snapshot: pool.set_unhealthy(
+        node['url'] for node in snapshot['nodes'].values() if node['healthy'] is False))
+    monitor.start()
+    create_gateway_app(gateway).run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -543,22 +543,73 @@ function showNotification(message, type = 'info', duration = 3000) {
   return notification;
 }
 
-// Initialize Socket.IO connection
-const socket = io();
-
-// Status update handler
-socket.on('status_update', function(data) {
-    const statusDiv = document.getElementById('status-updates') || createStatusDiv();
-    const statusMessage = document.createElement('div');
-    statusMessage.className = `alert alert-${data.status}`;
-    statusMessage.textContent = data.message;
-    statusDiv.appendChild(statusMessage);
-    
-    // Auto-remove success/error messages after 5 seconds
-    if (data.status !== 'processing') {
-        removeElementAfterDelay(statusMessage, 5000);
+// Initialize Socket.IO connection (signed-in pages only load the client library)
+const socket = typeof io !== 'undefined' ? io() : null;
+
+// Deployments this page follows: deployment ID -> {lastSeq, onEvent}
+const deploymentSubscriptions = {};
+
+function handleDeploymentEvent(envelope) {
+    const subscription = deploymentSubscriptions[envelope.deployment_id];
+    // Replayed and live events can overlap; each sequence number is handled once
+    if (!subscription || envelope.seq <= subscription.lastSeq) {
+        return;
     }
-});
+    subscription.lastSeq = envelope.seq;
+    subscription.onEvent(envelope.event, envelope.data);
+}
+
+function subscribeToDeployment(deploymentId, onEvent) {
+    deploymentSubscriptions[deploymentId] = deploymentSubscriptions[deploymentId] || {lastSeq: 0};
+    deploymentSubscriptions[deploymentId].onEvent = onEvent;
+    if (socket && socket.connected) {
+        socket.emit('subscribe', {deployment_id: deploymentId, last_seq: deploymentSubscriptions[deploymentId].lastSeq});
+    }
+}
+
+function unsubscribeFromDeployment(deploymentId) {
+    delete deploymentSubscriptions[deploymentId];
+    if (socket) {
+        socket.emit('unsubscribe', {deployment_id: deploymentId});
+    }
+}
+
+if (socket) {
+    // Rooms are lost on reconnect: rejoin and catch up from the last event seen
+    socket.on('connect', function() {
+        Object.keys(deploymentSubscriptions).forEach(function(deploymentId) {
+            socket.emit('subscribe', {deployment_id: deploymentId, last_seq: deploymentSubscriptions[deploymentId].lastSeq});
+        });
+    });
+
+    // Replays and live batches both carry a list of numbered events
+    socket.on('deployment_replay', function(batch) {
+        if (batch.error) {
+            // Not ours to follow (or unknown); stop resubscribing on reconnect
+            delete deploymentSubscriptions[batch.deployment_id];
+            return;
+        }
+        batch.events.forEach(handleDeploymentEvent);
+    });
+
+    socket.on('deployment_events', function(batch) {
+        batch.events.forEach(handleDeploymentEvent);
+    });
+
+    // Status messages sent to this user only
+    socket.on('status_update', function(data) {
+        const statusDiv = document.getElementById('status-updates') || createStatusDiv();
+        const statusMessage = document.createElement('div');
+        statusMessage.className = `alert alert-${data.status}`;
+        statusMessage.textContent = data.message;
+        statusDiv.appendChild(statusMessage);
+        
+        // Auto-remove success/error messages after 5 seconds
+        if (data.status !== 'processing') {
+            removeElementAfterDelay(statusMessage, 5000);
+        }
+    });
+}
 
 function createStatusDiv() {
     const statusDiv = document.createElement('div');
@@ -840,24 +891,36 @@ async function submitDeployment(formData) {
         }
 
         const result = await response.json();
-        
-        // Update progress and status message based on deployment stages
-        const deploymentStages = ['Validating', 'ResourceCreation', 'NodeDeployment', 'Configuration'];
-        let currentStage = 0;
-
-        const updateProgress = setInterval(() => {
-            if (currentStage < deploymentStages.length) {
-                const progress = (currentStage + 1) / deploymentStages.length * 100;
-                progressBar.style.width = `${progress}%`;
-                statusMessage.textContent = `${deploymentStages[currentStage]} in progress...`;
-                currentStage++;
-            } else {
-                clearInterval(updateProgress);
+        statusMessage.textContent = 'Deployment queued...';
+
+        // Follow the deployment's own room; progress is the share of planned steps finished
+        let plannedSteps = 0;
+        let finishedSteps = 0;
+        subscribeToDeployment(result.deployment_id, (event, data) => {
+            if (event === 'plan') {
+                plannedSteps = data.steps.length;
+            } else if (event === 'step') {
+                if (data.status === 'running') {
+                    statusMessage.textContent = `${data.step} in progress...`;
+                } else {
+                    finishedSteps++;
+                }
+                if (plannedSteps) {
+                    progressBar.style.width = `${Math.min(100, finishedSteps / plannedSteps * 100)}%`;
+                }
+            } else if (event === 'status' && data.status !== 'running') {
+                unsubscribeFromDeployment(result.deployment_id);
                 progressBar.style.width = '100%';
-                statusMessage.textContent = 'Deployment completed successfully!';
-                showNotification('Deployment completed successfully', 'success');
+                if (data.status === 'succeeded') {
+                    statusMessage.textContent = 'Deployment completed successfully!';
+                    showNotification('Deployment completed successfully', 'success');
+                } else {
+                    progressBar.classList.add('bg-danger');
+                    statusMessage.textContent = `Deployment ${data.status}: ${data.error || ''}`;
+                    showNotification(`Deployment ${data.status}`, 'error');
+                }
             }
-        }, 2000);
+        });
 
     } catch (error) {
         progressBar.style.width = '100%';
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from azure.core.exceptions import AzureError
+import azure_operations
+from azure_operations import CliBackend, SdkBackend, create_backend
+
+CONFIG = {
+    'name': 'test-rg',
+    'resource_group': 'test-rg',
+    'location': 'eastus',
+    'vm_name': 'node-1',
+    'admin_username': 'azureuser',
+    'vnet_name': 'test-vnet',
+    'address_prefix': '10.1.0.0/16',
+    'storage_account_name': 'teststorage'
+}
+
+
+def _sdk_backend():
+    result = MagicMock()
+    result.as_dict.return_value = {'id': 'resource-id'}
+    resource_client = MagicMock()
+    resource_client.resource_groups.create_or_update.return_value = result
+    network_client = MagicMock()
+    network_client.virtual_networks.begin_create_or_update.return_value.result.return_value = result
+    storage_client = MagicMock()
+    storage_client.storage_accounts.begin_create.return_value.result.return_value = result
+    fallback = MagicMock()
+    return SdkBackend(resource_client, network_client, storage_client, fallback)
+
+
+def test_sdk_backend_uses_shared_clients():
+    backend = _sdk_backend()
+
+    assert json.loads(backend.create_resource_group(CONFIG)) == {'id': 'resource-id'}
+    backend.resource_client.resource_groups.create_or_update.assert_called_once_with(
+        'test-rg', {'location': 'eastus'})
+
+    backend.create_network(CONFIG)
+    args = backend.network_client.virtual_networks.begin_create_or_update.call_args[0]
+    assert args[:2] == ('test-rg', 'test-vnet')
+    assert args[2]['address_space'] == {'address_prefixes': ['10.1.0.0/16']}
+
+    backend.create_storage_account(CONFIG)
+    args = backend.storage_client.storage_accounts.begin_create.call_args[0]
+    assert args[:2] == ('test-rg', 'teststorage')
+    assert args[2]['sku'] == {'name': 'Standard_LRS'}
+
+
+def test_sdk_backend_falls_back_to_cli_for_vms():
+    backend = _sdk_backend()
+    backend.fallback.deploy_vm.return_value = 'created'
+    assert backend.deploy_vm(CONFIG) == 'created'
+    backend.fallback.deploy_vm.assert_called_once_with(CONFIG)
+
+
+def test_sdk_errors_are_reported_like_cli_errors():
+    backend = _sdk_backend()
+    backend.resource_client.resource_groups.create_or_update.side_effect = AzureError('quota exceeded')
+    assert backend.create_resource_group(CONFIG).startswith('Error: quota exceeded')
+
+
+def test_cli_backend_builds_az_commands():
+    with patch.object(azure_operations, 'run_command', return_value='{}') as run:
+        CliBackend().create_resource_group(CONFIG)
+    run.assert_called_once_with(['az', 'group', 'create', '--name', 'test-rg', '--location', 'eastus'])
+
+
+def test_create_backend_selection():
+    assert isinstance(create_backend('cli'), CliBackend)
+    with patch.object(azure_operations.container, 'get_service', side_effect=KeyError('resource_client')):
+        assert isinstance(create_backend('sdk'), CliBackend)
+    with pytest.raises(ValueError):
+        create_backend('powershell')
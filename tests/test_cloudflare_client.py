@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+import requests
+from cloudflare_client import CloudflareClient, CloudflareAPIError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body if body is not None else {'success': status_code == 200, 'result': {}}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.headers = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.requests.append((method, url, kwargs))
+            response = self.responses.pop(0) if self.responses else FakeResponse(200)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(responses, sleeps=None, **kwargs):
+    session = FakeSession(responses)
+    sleeps = sleeps if sleeps is not None else []
+    client = CloudflareClient('key', 'me@example.com', session=session, sleep=sleeps.append,
+                              rate=1000, burst=1000, **kwargs)
+    return client, session, sleeps
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits[:2] == [0.0, 0.0]
+    # After the burst, tokens come every 1 / rate seconds
+    assert waits[2:] == pytest.approx([0.5] * 4)
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_retry_after_is_honored():
+    client, session, sleeps = make_client([
+        FakeResponse(429, {'success': False}, {'Retry-After': '7'}),
+        FakeResponse(503, {'success': False}),
+        FakeResponse(200, {'success': True, 'result': {'id': 'a'}})
+    ])
+    assert client.get('zones/z/dns_records')['result'] == {'id': 'a'}
+    assert len(session.requests) == 3
+    assert sleeps[0] == 7.0
+    assert 0 < sleeps[1] <= 1.0  # Exponential backoff with jitter for the 503
+
+
+def test_connection_errors_are_retried_then_raised():
+    client, session, sleeps = make_client([requests.ConnectionError('reset')] * 3, max_retries=2)
+    with pytest.raises(CloudflareAPIError):
+        client.get('zones/z/dns_records')
+    assert len(session.requests) == 3
+
+
+def test_api_errors_are_not_retried():
+    client, session, _ = make_client([FakeResponse(400, {'success': False, 'errors': [{'code': 1004}]})])
+    with pytest.raises(CloudflareAPIError) as excinfo:
+        client.post('zones/z/dns_records', json={})
+    assert excinfo.value.status == 400
+    assert excinfo.value.body['errors'] == [{'code': 1004}]
+    assert len(session.requests) == 1
+
+
+def test_session_is_shared_and_authenticated():
+    client, session, _ = make_client([])
+    client.get('zones/z/pagerules')
+    assert session.headers['X-Auth-Key'] == 'key'
+    assert session.requests[0][1] == 'https://api.cloudflare.com/client/v4/zones/z/pagerules'
+    assert session.requests[0][2]['timeout'] == client.timeout
+
+
+def test_map_runs_concurrently_and_keeps_order():
+    client, _, _ = make_client([], max_workers=4)
+    barrier = threading.Barrier(4, timeout=5)
+
+    def work(i):
+        barrier.wait()  # Only passes if four calls run at the same time
+        return i * 2
+
+    assert client.map(work, range(4)) == [0, 2, 4, 6]
+    client.close()
@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+import cloudflare_integration
+from cloudflare_client import CloudflareClient
+from cloudflare_integration import MANAGED_COMMENT, deploy_dns_records
+
+
+class FakeResponse:
+    def __init__(self, result, result_info=None):
+        self.status_code = 200
+        self.headers = {}
+        self._body = {'success': True, 'result': result}
+        if result_info:
+            self._body['result_info'] = result_info
+
+    def json(self):
+        return self._body
+
+
+class FakeCloudflare:
+    """Stands in for the client's requests.Session, keeping DNS records in memory"""
+
+    def __init__(self, records):
+        self.records = {r['id']: r for r in records}
+        self.calls = []
+        self.headers = {}
+        self.lock = threading.Lock()
+
+    def request(self, method, url, timeout=None, **kwargs):
+        with self.lock:
+            return getattr(self, method.lower())(url, **kwargs)
+
+    def get(self, url, params=None):
+        self.calls.append(('GET', params.get('page')))
+        records = list(self.records.values())
+        per_page = params['per_page']
+        page = records[(params['page'] - 1) * per_page:params['page'] * per_page]
+        return FakeResponse(page, {'total_pages': max(1, -(-len(records) // per_page))})
+
+    def post(self, url, json=None):
+        self.calls.append(('POST', json['name']))
+        record = dict(json, id=f"id-{len(self.records) + 1}")
+        self.records[record['id']] = record
+        return FakeResponse(record)
+
+    def put(self, url, json=None):
+        record_id = url.rsplit('/', 1)[1]
+        self.calls.append(('PUT', record_id))
+        self.records[record_id] = dict(json, id=record_id)
+        return FakeResponse(self.records[record_id])
+
+    def delete(self, url):
+        record_id = url.rsplit('/', 1)[1]
+        self.calls.append(('DELETE', record_id))
+        del self.records[record_id]
+        return FakeResponse({'id': record_id})
+
+
+def node_record(name, content='10.0.0.1'):
+    return {'type': 'A', 'name': name, 'content': content, 'ttl': 120, 'proxied': True,
+            'zone_name': 'example.com'}
+
+
+def zone_record(record_id, name, content='10.0.0.1', comment=MANAGED_COMMENT, ttl=1):
+    return {'id': record_id, 'type': 'A', 'name': f'{name}.example.com', 'content': content,
+            'ttl': ttl, 'proxied': True, 'comment': comment}
+
+
+@pytest.fixture
+def cloudflare(monkeypatch):
+    def install(records):
+        fake = FakeCloudflare(records)
+        client = CloudflareClient('key', 'me@example.com', session=fake, rate=1000, burst=1000)
+        monkeypatch.setattr(cloudflare_integration, 'get_client', lambda api_key, email: client)
+        return fake
+    return install
+
+
+def test_only_changed_records_are_written(cloudflare):
+    fake = cloudflare([zone_record('a', 'node1'), zone_record('b', 'node2', content='10.0.0.9'),
+                       zone_record('c', 'www', comment=None)])
+    plan = deploy_dns_records('key', 'me@example.com', 'zone',
+                              [node_record('node1'), node_record('node2'), node_record('node3')])
+
+    assert [r['name'] for r in plan.creates] == ['node3.example.com']
+    assert [record_id for record_id, _ in plan.updates] == ['b']
+    assert len(plan.unchanged) == 1
+    assert fake.calls[0] == ('GET', 1)
+    assert sorted(fake.calls[1:]) == [('POST', 'node3.example.com'), ('PUT', 'b')]
+    assert 'zone_name' not in fake.records['b']
+
+
+def test_zone_listing_follows_pagination(cloudflare):
+    fake = cloudflare([zone_record(str(i), f'node{i}') for i in range(5)])
+    records, calls = cloudflare_integration.list_dns_records('key', 'me@example.com', 'zone', per_page=2)
+    assert len(records) == 5
+    assert calls == 3
+    assert [c for c in fake.calls if c[0] == 'GET'] == [('GET', 1), ('GET', 2), ('GET', 3)]
+
+
+def test_plan_only_makes_no_changes(cloudflare):
+    fake = cloudflare([zone_record('a', 'node1', content='10.0.0.9')])
+    plan = deploy_dns_records('key', 'me@example.com', 'zone', [node_record('node1')], plan_only=True)
+    assert len(plan.updates) == 1
+    assert fake.calls == [('GET', 1)]
+
+
+def test_prune_deletes_only_managed_records(cloudflare):
+    fake = cloudflare([zone_record('a', 'node1'), zone_record('b', 'old-node'),
+                       zone_record('c', 'www', comment='hand made'), zone_record('d', 'node1')])
+    plan = deploy_dns_records('key', 'me@example.com', 'zone', [node_record('node1')], prune=True)
+    # 'd' duplicates node1, 'b' is a managed record that is no longer wanted
+    assert sorted(r['id'] for r in plan.deletes) == ['b', 'd']
+    assert sorted(fake.records) == ['a', 'c']
+
+
+def test_names_with_several_records_are_left_alone(cloudflare):
+    fake = cloudflare([zone_record('a', 'node1'), zone_record('b', 'node1', content='10.0.0.2', comment=None),
+                       zone_record('c', 'node1', content='10.0.0.3')])
+    plan = deploy_dns_records('key', 'me@example.com', 'zone', [node_record('node1')])
+    assert plan.deletes == [] and plan.updates == []
+    assert sorted(fake.records) == ['a', 'b', 'c']
+
+
+def test_round_robin_records_are_matched_by_content(cloudflare):
+    fake = cloudflare([zone_record('a', 'rpc', content='10.0.0.2'), zone_record('b', 'rpc', content='10.0.0.9')])
+    plan = deploy_dns_records('key', 'me@example.com', 'zone',
+                              [node_record('rpc', '10.0.0.1'), node_record('rpc', '10.0.0.2')])
+    assert len(plan.unchanged) == 1
+    assert [record_id for record_id, _ in plan.updates] == ['b']
+    assert sorted(r['content'] for r in fake.records.values()) == ['10.0.0.1', '10.0.0.2']
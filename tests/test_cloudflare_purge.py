@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+from cloudflare_client import CloudflareAPIError
+from cloudflare_purge import PurgeQueue
+
+
+class FakeClient:
+    def __init__(self, fail_kind=None, error=None):
+        self.payloads = []
+        self.fail_kind = fail_kind
+        self.error = error or CloudflareAPIError('rejected', 400, {'success': False})
+        self.lock = threading.Lock()
+
+    def post(self, path, json=None):
+        with self.lock:
+            self.payloads.append(json)
+        if self.fail_kind in json:
+            raise self.error
+        return {'success': True, 'result': {}}
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+def test_purges_are_deduplicated_and_chunked():
+    client = FakeClient()
+    queue = PurgeQueue(client, 'zone', window=60, chunk_size=30)
+    urls = [f'https://cdn.example.com/file{i}.js' for i in range(70)]
+    first = queue.add(files=urls[:40])
+    second = queue.add(files=urls[20:])
+
+    result = queue.flush()
+    assert first.result(timeout=1) is result
+    assert second.result(timeout=1) is result
+    assert [len(p['files']) for p in client.payloads] == [30, 30, 10]
+    assert sorted(f for p in client.payloads for f in p['files']) == sorted(urls)
+    assert result.requests == 3
+    assert result.purged['files'] == 70
+    assert result.success
+
+
+def test_hosts_and_prefixes_cover_files():
+    client = FakeClient()
+    queue = PurgeQueue(client, 'zone', window=60)
+    queue.add(hosts=['Node1.Example.com'], files=['https://node1.example.com/index.html',
+                                                  'https://node2.example.com/app/main.js',
+                                                  'https://node2.example.com/other.js'])
+    queue.add(prefixes=['node2.example.com/app', 'node2.example.com/app/v2', 'node1.example.com/x'])
+    queue.flush()
+    assert client.payloads == [
+        {'files': ['https://node2.example.com/other.js']},
+        {'hosts': ['node1.example.com']},
+        {'prefixes': ['node2.example.com/app']}
+    ]
+
+
+def test_window_coalesces_concurrent_purges():
+    client = FakeClient()
+    queue = PurgeQueue(client, 'zone', window=0.05)
+    futures = [queue.add(hosts=[f'node{i % 3}.example.com']) for i in range(10)]
+    results = {id(f.result(timeout=5)) for f in futures}
+    assert len(results) == 1
+    assert client.payloads == [{'hosts': ['node0.example.com', 'node1.example.com', 'node2.example.com']}]
+
+
+def test_failed_chunks_are_reported():
+    client = FakeClient(fail_kind='hosts')
+    queue = PurgeQueue(client, 'zone', window=60)
+    future = queue.add(files=['https://a.example.com/x'], hosts=['b.example.com'])
+    queue.flush()
+    result = future.result(timeout=1)
+    assert not result.success
+    assert len(result.errors) == 1
+    assert result.errors[0].startswith('hosts')
+
+
+def test_purge_everything_replaces_targeted_purges():
+    client = FakeClient()
+    queue = PurgeQueue(client, 'zone', window=60)
+    queue.add(files=['https://a.example.com/x'])
+    queue.add(everything=True)
+    queue.flush()
+    assert client.payloads == [{'purge_everything': True}]
+
+
+def test_other_errors_resolve_every_waiter():
+    client = FakeClient(fail_kind='files', error=ValueError('Expecting value'))
+    queue = PurgeQueue(client, 'zone', window=60)
+    futures = [queue.add(files=['https://a.example.com/x']), queue.add(hosts=['b.example.com'])]
+    queue.flush()
+    result = futures[0].result(timeout=1)
+    assert result.errors == ['files: ValueError: Expecting value']
+    assert futures[1].result(timeout=1) is result
+
+
+def test_waiters_get_the_exception_when_the_batch_fails():
+    class BrokenClient(FakeClient):
+        def map(self, fn, items):
+            raise RuntimeError('executor shut down')
+
+    queue = PurgeQueue(BrokenClient(), 'zone', window=60)
+    future = queue.add(hosts=['b.example.com'])
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    with pytest.raises(RuntimeError, match='executor shut down'):
+        future.result(timeout=1)
@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import copy
+import threading
+import cloudflare_integration
+from cloudflare_rules import sync_firewall_rules, sync_page_rules
+
+
+class FakeClient:
+    """Records API calls and serves rule listings"""
+
+    def __init__(self, page_rules=(), firewall_rules=()):
+        self.page_rules = list(page_rules)
+        self.firewall_rules = list(firewall_rules)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def request(self, method, path, **kwargs):
+        with self.lock:
+            self.calls.append((method, path, kwargs.get('json'), kwargs.get('params')))
+        if method == 'GET' and path.endswith('pagerules'):
+            return {'success': True, 'result': copy.deepcopy(self.page_rules)}
+        if method == 'GET' and path.endswith('firewall/rules'):
+            return {'success': True, 'result': copy.deepcopy(self.firewall_rules),
+                    'result_info': {'total_pages': 1}}
+        return {'success': True, 'result': {}}
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+    def writes(self):
+        return [call for call in self.calls if call[0] != 'GET']
+
+
+def page_rule(host, suffix='/*', action=('security_level', 'high'), rule_id=None, status='active'):
+    rule = {'targets': [{'target': 'url', 'constraint': {'operator': 'matches', 'value': f'*{host}{suffix}'}}],
+            'actions': [{'id': action[0], 'value': action[1]}], 'priority': 2, 'status': status}
+    if rule_id:
+        rule['id'] = rule_id
+    return rule
+
+
+def test_page_rule_sync_is_idempotent():
+    desired = [page_rule('node1.example.com'), page_rule('node2.example.com')]
+    client = FakeClient(page_rules=[dict(page_rule('node1.example.com', rule_id='a'), priority=7)])
+    plan = sync_page_rules(client, 'zone', 'example.com', desired)
+    assert len(plan.unchanged) == 1  # Priority is not compared
+    assert client.writes() == [('POST', 'zones/zone/pagerules', desired[1], None)]
+
+
+def test_page_rule_sync_updates_dedupes_and_prunes():
+    client = FakeClient(page_rules=[
+        page_rule('node1.example.com', rule_id='a', status='disabled'),
+        page_rule('node1.example.com', rule_id='b', status='disabled'),
+        page_rule('old.example.com', rule_id='c'),
+        page_rule('old.example.com', rule_id='d', action=('cache_level', 'aggressive')),
+        page_rule('other.org', rule_id='e')
+    ])
+    plan = sync_page_rules(client, 'zone', 'example.com', [page_rule('node1.example.com')], prune=True)
+    assert [current['id'] for current, _ in plan.updates] == ['a']
+    assert sorted(rule['id'] for rule in plan.deletes) == ['b', 'c']
+    assert sorted((method, path) for method, path, _, _ in client.writes()) == [
+        ('DELETE', 'zones/zone/pagerules/b'), ('DELETE', 'zones/zone/pagerules/c'),
+        ('PUT', 'zones/zone/pagerules/a')]
+
+
+def test_rules_are_only_deleted_when_pruning():
+    client = FakeClient(page_rules=[
+        page_rule('node1.example.com', rule_id='a'),
+        page_rule('node1.example.com', rule_id='b'),
+        page_rule('old.example.com', rule_id='c')
+    ])
+    plan = sync_page_rules(client, 'zone', 'example.com', [page_rule('node1.example.com')])
+    assert plan.deletes == []
+    assert client.writes() == []
+
+
+def test_plan_only_does_not_write():
+    client = FakeClient(page_rules=[page_rule('old.example.com', rule_id='c')])
+    plan = sync_page_rules(client, 'zone', 'example.com', [page_rule('node1.example.com')],
+                           prune=True, plan_only=True)
+    assert plan.changes == 2
+    assert client.writes() == []
+
+
+def firewall_rule(ref, expression='(http.request.uri.path contains "/x")', rule_id=None, description=None):
+    rule = {'filter': {'expression': expression, 'paused': False}, 'action': 'block',
+            'description': description or ref, 'ref': ref, 'paused': False}
+    if rule_id:
+        rule['id'] = rule_id
+        rule['filter']['id'] = f'filter-{rule_id}'
+    return rule
+
+
+def test_firewall_sync_batches_each_kind():
+    desired = [firewall_rule('deployer-a'), firewall_rule('deployer-b', expression='(ip.src eq 1.1.1.1)'),
+               firewall_rule('deployer-c')]
+    legacy = dict(firewall_rule('deployer-c', rule_id='3'), ref=None)
+    client = FakeClient(firewall_rules=[
+        firewall_rule('deployer-a', rule_id='1'),
+        firewall_rule('deployer-b', rule_id='2'),
+        legacy,
+        firewall_rule('deployer-stale', rule_id='4'),
+        firewall_rule('someone-else', rule_id='5')
+    ])
+    plan = sync_firewall_rules(client, 'zone', desired + [firewall_rule('deployer-d')], prune=True)
+    assert len(plan.unchanged) == 1
+    # The rule created without a ref is adopted by its description and gets the ref
+    assert sorted(current['id'] for current, _ in plan.updates) == ['2', '3']
+    assert [rule['id'] for rule in plan.deletes] == ['4']
+
+    writes = client.writes()
+    assert [(method, path) for method, path, _, _ in writes] == [
+        ('DELETE', 'zones/zone/firewall/rules'), ('DELETE', 'zones/zone/filters'),
+        ('PUT', 'zones/zone/filters'), ('PUT', 'zones/zone/firewall/rules'),
+        ('POST', 'zones/zone/firewall/rules')]
+    assert writes[0][3] == {'id': ['4']}
+    assert {f['id'] for f in writes[2][2]} == {'filter-2', 'filter-3'}
+    assert [r['ref'] for r in writes[4][2]] == ['deployer-d']
+
+
+def test_setup_firewall_rules_is_a_no_op_when_in_sync(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(cloudflare_integration, 'get_client', lambda api_key, email: client)
+    cloudflare_integration.setup_firewall_rules('key', 'me@example.com', 'zone')
+    created = client.writes()[0][2]
+    for i, rule in enumerate(created):
+        rule['id'] = str(i)
+        rule['filter'] = dict(rule['filter'], id=f'filter-{i}')
+    client.firewall_rules = created
+    client.calls = []
+
+    plan = cloudflare_integration.setup_firewall_rules('key', 'me@example.com', 'zone')
+    assert plan.changes == 0
+    assert client.writes() == []
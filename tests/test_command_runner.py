@@ -0,0 +1,74 @@
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from command_runner import AsyncCommandRunner, command_context, current_command_context
+
+
+def _python(code):
+    return [sys.executable, '-c', code]
+
+
+@pytest.fixture
+def runner():
+    return AsyncCommandRunner(max_concurrency=2, default_timeout=30, max_output_lines=5)
+
+
+def test_output_is_streamed_and_capped(runner):
+    seen = []
+    result = runner.run(_python('for i in range(20): print(i, flush=True)'), on_line=seen.append)
+    assert result.succeeded
+    assert seen == [str(i) for i in range(20)]
+    assert result.lines == ['15', '16', '17', '18', '19']
+    assert result.dropped_lines == 15
+
+
+def test_nonzero_exit(runner):
+    result = runner.run(_python('import sys; print("boom"); sys.exit(3)'))
+    assert result.returncode == 3
+    assert not result.succeeded
+    assert result.output == 'boom'
+
+
+def test_timeout_kills_command(runner):
+    started = time.monotonic()
+    result = runner.run(_python('import time; time.sleep(30)'), timeout=0.5)
+    assert result.timed_out
+    assert time.monotonic() - started < 10
+
+
+def test_cancel_event_stops_command(runner):
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    result = runner.run(_python('import time; time.sleep(30)'), cancel_event=cancel)
+    assert result.cancelled
+    assert not result.succeeded
+
+
+def test_concurrency_limit(runner):
+    code = 'import time; print(time.time(), flush=True); time.sleep(0.5)'
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(runner.run(_python(code))))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    starts = sorted(float(r.lines[0]) for r in results)
+    # With two slots, the third command only starts after one of the first two exits
+    assert starts[2] - starts[0] >= 0.4
+
+
+def test_missing_executable_raises(runner):
+    with pytest.raises(OSError):
+        runner.run(['definitely-not-a-real-command-xyz'])
+
+
+def test_command_context():
+    assert current_command_context() is None
+    cancel = threading.Event()
+    with command_context(cancel, print):
+        assert current_command_context().cancel_event is cancel
+    assert current_command_context() is None
@@ -0,0 +1,212 @@
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from deployment_jobs import (
+    DeploymentJobStore, DeploymentWorkerPool, new_deployment_id,
+    QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, SKIPPED
+)
+from command_runner import current_command_context
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DeploymentJobStore(str(tmp_path / 'jobs.db'))
+
+
+def test_enqueue_and_claim(store):
+    job = store.enqueue('dep-1', 'simple', {'resourceGroup': 'rg-1'}, requested_by='user-1')
+    assert job['status'] == QUEUED
+    assert job['payload'] == {'resourceGroup': 'rg-1'}
+    assert store.queue_depth() == 1
+
+    claimed = store.claim_next('worker-1')
+    assert claimed['id'] == 'dep-1'
+    assert claimed['status'] == RUNNING
+    assert claimed['attempts'] == 1
+    assert store.claim_next('worker-2') is None
+    assert store.queue_depth() == 0
+
+
+def test_jobs_are_claimed_in_order(store):
+    store.enqueue('dep-a', 'simple', {})
+    store.enqueue('dep-b', 'simple', {})
+    assert store.claim_next('w')['id'] == 'dep-a'
+    assert store.claim_next('w')['id'] == 'dep-b'
+
+
+def test_recover_interrupted(store):
+    store.enqueue('dep-1', 'simple', {})
+    store.claim_next('dead-worker', lease_seconds=60)
+    assert store.recover_interrupted(now=time.time() + 61) == 1
+    assert store.get_job('dep-1')['status'] == QUEUED
+
+    store.claim_next('dead-worker', lease_seconds=60)
+    store.recover_interrupted(max_attempts=2, now=time.time() + 61)
+    assert store.get_job('dep-1')['status'] == FAILED
+
+
+def test_jobs_of_live_workers_are_not_recovered(store):
+    store.enqueue('dep-1', 'simple', {})
+    store.claim_next('live-worker', lease_seconds=60)
+    assert store.recover_interrupted() == 0
+    store.renew_leases(['dep-1'], lease_seconds=120)
+    assert store.recover_interrupted(now=time.time() + 90) == 0
+    assert store.get_job('dep-1')['status'] == RUNNING
+
+
+def test_worker_pool_renews_leases_and_recovers_expired_jobs(store):
+    release = threading.Event()
+    store.enqueue('dep-dead', 'simple', {})
+    store.claim_next('dead-worker', lease_seconds=0)
+    pool = DeploymentWorkerPool(store, {'simple': lambda ctx: release.wait(5)},
+                                workers=1, poll_interval=0.05, lease_seconds=0.3)
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while store.get_job('dep-dead')['status'] != RUNNING or store.get_job('dep-dead')['worker'] == 'dead-worker':
+            assert time.time() < deadline
+            time.sleep(0.02)
+        time.sleep(0.6)
+        # Still leased by the live pool, so a second recovery leaves it alone
+        assert store.recover_interrupted() == 0
+    finally:
+        release.set()
+        pool.stop(5)
+    assert store.get_job('dep-dead')['status'] == SUCCEEDED
+
+
+def test_worker_pool_records_steps(store):
+    def handler(ctx):
+        with ctx.step('resource_group') as step:
+            step.output = 'created'
+        with ctx.step('vm:node-1'):
+            raise RuntimeError('quota exceeded')
+
+    store.enqueue('dep-1', 'simple', {})
+    pool = DeploymentWorkerPool(store, {'simple': handler}, workers=1)
+    pool.run_job(store.claim_next('w'))
+
+    job = store.get_job('dep-1')
+    assert job['status'] == FAILED
+    assert job['error'] == 'quota exceeded'
+    assert [(s['name'], s['status']) for s in job['steps']] == [
+        ('resource_group', SUCCEEDED),
+        ('vm:node-1', FAILED)
+    ]
+    assert job['steps'][0]['output'] == 'created'
+    assert job['steps'][1]['error'] == 'quota exceeded'
+
+
+def test_worker_pool_runs_queued_jobs(store):
+    store.enqueue('dep-1', 'simple', {'value': 2})
+    pool = DeploymentWorkerPool(store, {'simple': lambda ctx: ctx.payload['value'] * 2},
+                                workers=2, poll_interval=0.05)
+    pool.start()
+    try:
+        for _ in range(100):
+            if store.get_job('dep-1')['status'] == SUCCEEDED:
+                break
+            pool._stop.wait(0.05)
+    finally:
+        pool.stop(timeout=5)
+    job = store.get_job('dep-1')
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == 4
+
+
+def test_unknown_mode_fails(store):
+    store.enqueue('dep-1', 'bogus', {})
+    pool = DeploymentWorkerPool(store, {}, workers=1)
+    pool.run_job(store.claim_next('w'))
+    assert store.get_job('dep-1')['status'] == FAILED
+
+
+def test_deployment_ids_are_unique():
+    assert new_deployment_id() != new_deployment_id()
+
+
+def test_cancel_queued_job(store):
+    store.enqueue('dep-1', 'simple', {})
+    assert store.request_cancel('dep-1')['status'] == CANCELLED
+    assert store.claim_next('w') is None
+    assert store.request_cancel('missing') is None
+
+
+def test_cancel_running_job(store):
+    store.enqueue('dep-1', 'simple', {})
+    started = threading.Event()
+
+    def handler(ctx):
+        with ctx.step('vm:node-1'):
+            started.set()
+            ctx.cancel_event.wait(5)
+        with ctx.step('monitoring:node-1'):
+            pass
+
+    pool = DeploymentWorkerPool(store, {'simple': handler}, workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        assert started.wait(5)
+        store.request_cancel('dep-1')
+        for _ in range(100):
+            if store.get_job('dep-1')['status'] == CANCELLED:
+                break
+            time.sleep(0.05)
+    finally:
+        pool.stop(timeout=5)
+    job = store.get_job('dep-1')
+    assert job['status'] == CANCELLED
+    assert [s['name'] for s in job['steps']] == ['vm:node-1']
+
+
+def test_step_output_is_streamed(store):
+    lines = []
+    store.enqueue('dep-1', 'simple', {})
+
+    def handler(ctx):
+        with ctx.step('vm:node-1'):
+            current_command_context().on_line('Running ..')
+
+    pool = DeploymentWorkerPool(store, {'simple': handler}, workers=1,
+                                on_output=lambda *args: lines.append(args))
+    pool.run_job(store.claim_next('w'))
+    assert lines == [('dep-1', 'vm:node-1', 'Running ..')]
+
+
+def test_outcomes_are_reported_on_completion(store):
+    outcomes = []
+    store.enqueue('dep-1', 'simple', {'value': 1})
+    store.enqueue('dep-2', 'simple', {'value': 0})
+    pool = DeploymentWorkerPool(store, {'simple': lambda ctx: 1 / ctx.payload['value']}, workers=1,
+                                on_complete=lambda job, status, duration, error: outcomes.append(
+                                    (job['id'], status, duration >= 0, error)))
+    pool.run_job(store.claim_next('w'))
+    pool.run_job(store.claim_next('w'))
+    assert outcomes == [('dep-1', SUCCEEDED, True, None),
+                        ('dep-2', FAILED, True, 'division by zero')]
+
+
+def test_progress_events(store):
+    events = []
+    store.enqueue('dep-1', 'simple', {})
+
+    def handler(ctx):
+        ctx.plan(['vm:node-1', 'vm:node-2'])
+        with ctx.step('vm:node-1'):
+            pass
+        ctx.skip('vm:node-2', 'not needed')
+
+    pool = DeploymentWorkerPool(store, {'simple': handler}, workers=1,
+                                on_event=lambda *args: events.append(args))
+    pool.run_job(store.claim_next('w'))
+    assert events == [
+        ('dep-1', 'status', {'status': RUNNING}),
+        ('dep-1', 'plan', {'steps': ['vm:node-1', 'vm:node-2']}),
+        ('dep-1', 'step', {'step': 'vm:node-1', 'status': RUNNING}),
+        ('dep-1', 'step', {'step': 'vm:node-1', 'status': SUCCEEDED}),
+        ('dep-1', 'step', {'step': 'vm:node-2', 'status': SKIPPED, 'error': 'not needed'}),
+        ('dep-1', 'status', {'status': SUCCEEDED, 'error': None})
+    ]
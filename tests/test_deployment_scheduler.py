@@ -0,0 +1,112 @@
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from deployment_scheduler import DeploymentScheduler, SchedulerError, FAIL_FAST, CONTINUE_ON_ERROR
+from deployment_jobs import SUCCEEDED, FAILED, SKIPPED
+
+
+def _fail():
+    raise RuntimeError('boom')
+
+
+def test_steps_run_after_dependencies():
+    order = []
+    lock = threading.Lock()
+
+    def record(name):
+        def run():
+            with lock:
+                order.append(name)
+            return name
+        return run
+
+    scheduler = DeploymentScheduler(max_concurrency=4)
+    scheduler.add_step('vm:node-1', record('vm:node-1'), depends_on=['network'])
+    scheduler.add_step('network', record('network'), depends_on=['resource_group'])
+    scheduler.add_step('resource_group', record('resource_group'))
+    results = scheduler.run()
+
+    assert order[:2] == ['resource_group', 'network']
+    assert all(r.status == SUCCEEDED for r in results.values())
+    assert results['network'].output == 'network'
+    assert results['network'].duration is not None
+
+
+def test_independent_steps_run_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+    scheduler = DeploymentScheduler(max_concurrency=3)
+    for i in range(3):
+        scheduler.add_step(f'vm:node-{i}', barrier.wait)
+    results = scheduler.run()
+    assert all(r.status == SUCCEEDED for r in results.values())
+
+
+def test_concurrency_cap():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+
+    scheduler = DeploymentScheduler(max_concurrency=2)
+    for i in range(6):
+        scheduler.add_step(f'vm:node-{i}', step)
+    scheduler.run()
+    assert max(peak) <= 2
+
+
+def test_fail_fast_skips_remaining_steps():
+    skipped = []
+    scheduler = DeploymentScheduler(max_concurrency=1, policy=FAIL_FAST,
+                                    on_skip=lambda name, reason: skipped.append(name))
+    scheduler.add_step('resource_group', lambda: 'ok')
+    scheduler.add_step('network', _fail, depends_on=['resource_group'])
+    scheduler.add_step('storage', lambda: 'ok', depends_on=['resource_group'])
+    scheduler.add_step('vm:node-1', lambda: 'ok', depends_on=['network'])
+    results = scheduler.run()
+
+    assert results['network'].status == FAILED
+    assert results['network'].error == 'boom'
+    assert results['vm:node-1'].status == SKIPPED
+    assert results['storage'].status == SKIPPED
+    assert sorted(skipped) == ['storage', 'vm:node-1']
+
+
+def test_continue_on_error_runs_unaffected_steps():
+    scheduler = DeploymentScheduler(max_concurrency=1, policy=CONTINUE_ON_ERROR)
+    scheduler.add_step('network', lambda: 'ok')
+    scheduler.add_step('vm:node-1', _fail, depends_on=['network'])
+    scheduler.add_step('monitoring:node-1', lambda: 'ok', depends_on=['vm:node-1'])
+    scheduler.add_step('vm:node-2', lambda: 'ok', depends_on=['network'])
+    scheduler.add_step('monitoring:node-2', lambda: 'ok', depends_on=['vm:node-2'])
+    results = scheduler.run()
+
+    assert results['vm:node-1'].status == FAILED
+    assert results['monitoring:node-1'].status == SKIPPED
+    assert results['vm:node-2'].status == SUCCEEDED
+    assert results['monitoring:node-2'].status == SUCCEEDED
+
+
+def test_invalid_graphs_are_rejected():
+    scheduler = DeploymentScheduler()
+    scheduler.add_step('a', lambda: None, depends_on=['b'])
+    scheduler.add_step('b', lambda: None, depends_on=['a'])
+    with pytest.raises(SchedulerError):
+        scheduler.run()
+
+    scheduler = DeploymentScheduler()
+    scheduler.add_step('a', lambda: None, depends_on=['missing'])
+    with pytest.raises(SchedulerError):
+        scheduler.run()
+
+    with pytest.raises(SchedulerError):
+        DeploymentScheduler(policy='sometimes')
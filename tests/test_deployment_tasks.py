@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import deployment_tasks
+from deployment_jobs import DeploymentJobStore, JobContext
+from deployment_tasks import DEFAULT_SUBNET_PREFIX, run_expert_deployment
+from validation_schema import EXPERT_SCHEMA
+
+
+@pytest.fixture
+def operations(monkeypatch):
+    calls = {}
+    for name in ('create_resource_group', 'create_network', 'create_storage_account',
+                 'deploy_vm', 'setup_monitoring_and_alerts'):
+        monkeypatch.setattr(deployment_tasks, name,
+                            lambda config, name=name: calls.setdefault(name, []).append(config) or 'ok')
+    return calls
+
+
+def test_expert_deployment_without_subnet_prefix(tmp_path, operations):
+    payload = {'mode': 'expert', 'network': {'vnetName': 'vnet1'},
+               'nodes': {'count': 2, 'consensusProtocol': 'qbft'}}
+    assert EXPERT_SCHEMA.validate(payload) == []
+
+    store = DeploymentJobStore(str(tmp_path / 'jobs.db'))
+    store.enqueue('dep-1', 'expert', payload)
+    result = run_expert_deployment(JobContext(store, store.claim_next('worker')))
+
+    assert result['nodes'] == ['node-1', 'node-2']
+    assert operations['create_network'][0]['vnet_name'] == 'vnet1'
+    assert operations['create_network'][0]['address_prefix'] == DEFAULT_SUBNET_PREFIX
+    assert len(operations['deploy_vm']) == 2
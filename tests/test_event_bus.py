@@ -0,0 +1,238 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from event_bus import DeploymentEventBus, RedisReplayStore, deployment_room, message_queue_url, parse_last_seq, user_room
+
+
+class Recorder:
+    def __init__(self):
+        self.emitted = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event, data, room):
+        with self.lock:
+            self.emitted.append((event, data, room))
+
+    def events(self):
+        return [envelope for event, data, _ in self.emitted if event == 'deployment_events'
+                for envelope in data['events']]
+
+
+def make_bus(**kwargs):
+    recorder = Recorder()
+    kwargs.setdefault('flush_interval', 60)
+    return DeploymentEventBus(recorder, clock=lambda: 0.0, **kwargs), recorder
+
+
+def test_events_are_batched_per_deployment_room():
+    bus, recorder = make_bus()
+    bus.publish('dep-1', 'status', {'status': 'running'})
+    bus.publish('dep-2', 'status', {'status': 'running'})
+    bus.publish('dep-1', 'status', {'status': 'succeeded'})
+    assert recorder.emitted == []
+    bus.flush()
+    assert sorted((event, room, [e['seq'] for e in data['events']]) for event, data, room in recorder.emitted) == [
+        ('deployment_events', deployment_room('dep-1'), [1, 2]),
+        ('deployment_events', deployment_room('dep-2'), [1])
+    ]
+
+
+def test_without_an_interval_events_are_sent_immediately():
+    bus, recorder = make_bus(flush_interval=0)
+    bus.publish('dep-1', 'status', {'status': 'running'})
+    assert [e['data'] for e in recorder.events()] == [{'status': 'running'}]
+
+
+def test_output_lines_are_coalesced():
+    bus, recorder = make_bus(max_batch_lines=3)
+    for i in range(5):
+        bus.publish_output('dep-1', 'vm', f'line {i}')
+    bus.flush()
+    assert len(recorder.emitted) == 1
+    batches = [e['data']['lines'] for e in recorder.events()]
+    assert [len(lines) for lines in batches] == [3, 2]
+    assert batches[1][-1] == {'step': 'vm', 'line': 'line 4'}
+
+
+def test_output_stays_ahead_of_later_events():
+    bus, recorder = make_bus()
+    bus.publish_output('dep-1', 'vm', 'done')
+    bus.publish('dep-1', 'status', {'status': 'succeeded'})
+    bus.flush()
+    assert [e['event'] for e in recorder.events()] == ['output', 'status']
+
+
+def test_batches_are_flushed_after_the_interval():
+    bus, recorder = make_bus(flush_interval=0.01)
+    sent = threading.Event()
+    bus.emit = lambda *args: (recorder(*args), sent.set())
+    bus.publish_output('dep-1', 'vm', 'hello')
+    assert sent.wait(5)
+    assert recorder.events()[0]['data']['lines'] == [{'step': 'vm', 'line': 'hello'}]
+
+
+def test_replay_after_last_seen_event():
+    bus, _ = make_bus(replay_size=3)
+    for i in range(5):
+        bus.publish('dep-1', 'step', {'step': f'step-{i}'})
+    replay = bus.replay('dep-1', after_seq=3)
+    assert [e['seq'] for e in replay['events']] == [4, 5]
+    assert not replay['truncated']
+    replay = bus.replay('dep-1')
+    assert [e['seq'] for e in replay['events']] == [3, 4, 5]
+    assert replay['truncated']
+    assert bus.replay('dep-unknown') == {'deployment_id': 'dep-unknown', 'events': [], 'truncated': False, 'seq': 0}
+
+
+def test_replay_includes_pending_output():
+    bus, _ = make_bus()
+    bus.publish_output('dep-1', 'vm', 'line')
+    assert [e['event'] for e in bus.replay('dep-1')['events']] == ['output']
+
+
+def test_least_recently_active_deployments_are_forgotten():
+    bus, _ = make_bus(max_deployments=2)
+    for deployment_id in ('dep-1', 'dep-2', 'dep-1', 'dep-3'):
+        bus.publish(deployment_id, 'status', {})
+    assert bus.replay('dep-2')['events'] == []
+    assert len(bus.replay('dep-1')['events']) == 2
+
+
+def test_emit_failures_do_not_propagate():
+    bus, _ = make_bus(flush_interval=0)
+
+    def fail(*args):
+        raise RuntimeError('disconnected')
+
+    bus.emit = fail
+    bus.publish('dep-1', 'status', {})
+    bus.publish_user(1, 'error', 'failed')
+    assert bus.replay('dep-1')['seq'] == 1
+
+
+def test_user_status_goes_to_the_user_room():
+    bus, recorder = make_bus()
+    bus.publish_user(7, 'success', 'done')
+    assert recorder.emitted == [('status_update', {'status': 'success', 'message': 'done'}, user_room(7))]
+
+
+class FakeRedis:
+    """The list commands the replay store uses"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def rpush(self, key, *values):
+        self.commands.append(lambda: self.client.lists.setdefault(key, []).extend(values))
+
+    def ltrim(self, key, start, end):
+        self.commands.append(lambda: self.client.lists.__setitem__(key, self.client.lists[key][start:]))
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        for command in self.commands:
+            command()
+
+
+def test_replay_from_a_shared_store():
+    client = FakeRedis()
+    publisher, _ = make_bus(replay_store=RedisReplayStore(client, replay_size=2))
+    subscriber, _ = make_bus(replay_store=RedisReplayStore(client, replay_size=2))
+    for status in ('queued', 'running', 'succeeded'):
+        publisher.publish('dep-1', 'status', {'status': status})
+    publisher.flush()
+    replay = subscriber.replay('dep-1', after_seq=1)
+    assert [e['data']['status'] for e in replay['events']] == ['running', 'succeeded']
+    assert not replay['truncated']
+
+
+def test_unreachable_message_queue_falls_back_to_local():
+    assert message_queue_url({'message_queue': None}) is None
+    assert message_queue_url({'message_queue': 'redis://127.0.0.1:1/0'}) is None
+
+
+def test_socketio_clients_get_their_rooms_and_a_replay():
+    from flask import Flask
+    from flask_login import AnonymousUserMixin, LoginManager
+    from event_bus import create_socketio, register_socketio_handlers
+
+    class SignedIn(AnonymousUserMixin):
+        id = '1'
+
+        @property
+        def is_authenticated(self):
+            return True
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+    login_manager.anonymous_user = SignedIn
+    socketio = create_socketio(app, {'message_queue': None})
+    bus = DeploymentEventBus(lambda event, data, room: socketio.emit(event, data, to=room), flush_interval=0)
+    register_socketio_handlers(socketio, bus)
+
+    client = socketio.test_client(app)
+    bus.publish('dep-1', 'status', {'status': 'running'})
+    client.emit('subscribe', {'deployment_id': 'dep-1', 'last_seq': 0})
+    bus.publish('dep-1', 'status', {'status': 'succeeded'})
+    bus.publish('dep-2', 'status', {'status': 'succeeded'})
+    bus.publish_user('1', 'success', 'done')
+    received = client.get_received()
+    assert [message['name'] for message in received] == ['deployment_replay', 'deployment_events', 'status_update']
+    assert [e['seq'] for e in received[0]['args'][0]['events']] == [1]
+    assert [e['seq'] for e in received[1]['args'][0]['events']] == [2]
+
+
+def test_subscriptions_are_authorized():
+    from flask import Flask
+    from flask_login import AnonymousUserMixin, LoginManager
+    from event_bus import create_socketio, register_socketio_handlers
+
+    class SignedIn(AnonymousUserMixin):
+        id = '1'
+
+        @property
+        def is_authenticated(self):
+            return True
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: None)
+    login_manager.anonymous_user = SignedIn
+    socketio = create_socketio(app, {'message_queue': None})
+    bus = DeploymentEventBus(lambda event, data, room: socketio.emit(event, data, to=room), flush_interval=0)
+    owners = {'dep-mine': '1', 'dep-other': '2'}
+    register_socketio_handlers(socketio, bus, authorize=lambda user, deployment_id: owners.get(deployment_id) == user.id)
+
+    client = socketio.test_client(app)
+    client.emit('subscribe', {'deployment_id': 'dep-other'})
+    client.emit('subscribe', {'deployment_id': 'dep-mine'})
+    bus.publish('dep-other', 'status', {'status': 'running'})
+    bus.publish('dep-mine', 'status', {'status': 'running'})
+    received = client.get_received()
+    assert received[0]['args'][0] == {'deployment_id': 'dep-other', 'error': 'Deployment not found'}
+    assert [m['args'][0]['deployment_id'] for m in received[1:]] == ['dep-mine', 'dep-mine']
+
+
+def test_malformed_last_seq_replays_everything():
+    assert parse_last_seq(7) == 7
+    assert parse_last_seq('7') == 7
+    for value in (None, '', 'abc', [], {}, -3, float('inf'), True):
+        assert parse_last_seq(value) == 0
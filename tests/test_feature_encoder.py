@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from feature_encoder import FeatureEncoder, vm_size_spec
+
+CONFIGS = [
+    {'location': 'eastus', 'image': 'UbuntuLTS', 'vm_size': 'Standard_D4s_v3', 'node_type': 'validator'},
+    {'location': 'westus', 'image': 'UbuntuLTS', 'vmSize': 'Standard_D2s_v3', 'nodeType': 'observer',
+     'nodes': {'count': 3}}
+]
+
+
+def test_transform_one_hot_and_numeric():
+    encoder = FeatureEncoder().fit(CONFIGS)
+    X = encoder.transform(CONFIGS)
+    assert X.dtype == np.float32
+    assert X.shape == (2, encoder.n_features) == (2, len(encoder.feature_names))
+    row = dict(zip(encoder.feature_names, X[1]))
+    assert row['location=westus'] == 1 and row['location=eastus'] == 0
+    assert row['vm_size=Standard_D2s_v3'] == 1
+    assert row['node_type=observer'] == 1
+    assert (row['vcpus'], row['memory_gb'], row['node_count']) == (2, 8, 3)
+
+
+def test_unseen_values_use_unknown_column():
+    encoder = FeatureEncoder().fit(CONFIGS)
+    row = dict(zip(encoder.feature_names, encoder.transform([{'location': 'mars'}])[0]))
+    assert row['location=<unknown>'] == 1
+    assert row['vm_size=<unknown>'] == 1
+    assert row['vcpus'] == 0
+
+
+def test_vm_size_spec_estimates_unknown_sizes():
+    assert vm_size_spec('Standard_D8s_v3') == (8, 32)
+    assert vm_size_spec('Standard_E16s_v5') == (16, 128)
+    assert vm_size_spec(None) == (0, 0)
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'encoder.json')
+    encoder = FeatureEncoder().fit(CONFIGS)
+    encoder.save(path)
+    loaded = FeatureEncoder.load(path)
+    np.testing.assert_array_equal(loaded.transform(CONFIGS), encoder.transform(CONFIGS))
+
+
+def test_empty_batch():
+    assert FeatureEncoder().fit(CONFIGS).transform([]).shape[0] == 0
+
+
+def test_load_rejects_other_versions(tmp_path):
+    path = tmp_path / 'encoder.json'
+    path.write_text('{"version": 99, "vocabularies": {}}')
+    with pytest.raises(ValueError):
+        FeatureEncoder.load(str(path))
@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from forest_compiler import CompiledForest, ForestCompilationError, ForestPredictor, compile_forest, verify
+
+
+@pytest.fixture(scope='module')
+def forest():
+    X, y = make_classification(n_samples=500, n_features=8, n_informative=5, n_classes=3, random_state=0)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_matches_sklearn_exactly(forest):
+    model, X = forest
+    compiled = CompiledForest.from_sklearn(model)
+    X_new = np.random.default_rng(1).normal(scale=3, size=(1000, X.shape[1]))
+    np.testing.assert_array_equal(compiled.predict_proba(X_new), model.predict_proba(X_new))
+    np.testing.assert_array_equal(compiled.predict(X_new), model.predict(X_new))
+    np.testing.assert_array_equal(compiled.predict(X[:1]), model.predict(X[:1]))
+
+
+def test_compile_saves_memory_mapped_arrays(forest, tmp_path):
+    model, X = forest
+    compile_forest(model, X, str(tmp_path / 'compiled'))
+    loaded = CompiledForest.load(str(tmp_path / 'compiled'))
+    assert isinstance(loaded.threshold, np.memmap)
+    assert loaded.feature.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
+
+
+def test_verify_detects_differences(forest):
+    model, X = forest
+    compiled = CompiledForest.from_sklearn(model)
+    compiled.value = compiled.value[:, ::-1].copy()
+    with pytest.raises(ForestCompilationError):
+        verify(model, compiled, X)
+
+
+def test_rejects_wrong_feature_count(forest):
+    model, X = forest
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(model).predict(X[:, :3])
+
+
+def test_large_batches_use_sklearn(forest):
+    model, X = forest
+    loads = []
+
+    def load_estimator():
+        loads.append(1)
+        return model
+
+    predictor = ForestPredictor(CompiledForest.from_sklearn(model), load_estimator, max_rows=100)
+    np.testing.assert_array_equal(predictor.predict(X[:10]), model.predict(X[:10]))
+    assert loads == []
+    np.testing.assert_array_equal(predictor.predict_proba(X), model.predict_proba(X))
+    predictor.predict(X)
+    assert loads == [1]
+
+
+def test_large_batches_stay_compiled_without_sklearn_model(forest):
+    model, X = forest
+
+    def missing():
+        raise FileNotFoundError('ml_model.pkl')
+
+    predictor = ForestPredictor(CompiledForest.from_sklearn(model), missing, max_rows=100)
+    np.testing.assert_array_equal(predictor.predict(X), model.predict(X))
@@ -0,0 +1,122 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from generate_nginx_configs import (
+    generate_cloudflare_dns_config, generate_consolidated_nginx_config, iter_docker_ps,
+    parse_docker_ps_output, published_port, sync_configs
+)
+
+NODES = [
+    {'type': 'validator', 'name': '1', 'port': '21001'},
+    {'type': 'member', 'name': '1', 'port': '20000'},
+    {'type': 'member', 'name': '2', 'port': '20002'},
+    {'type': 'rpc', 'name': 'rpcnode', 'port': '8545'}
+]
+
+
+def test_consolidated_config_has_pools_with_keepalive(tmp_path):
+    node_configs = generate_consolidated_nginx_config(NODES, domain='example.com', output_dir=str(tmp_path))
+    config = (tmp_path / 'nginx.conf').read_text()
+
+    assert config.count('worker_processes auto;') == 1
+    assert config.count('http {') == 1
+    assert 'proxy_http_version 1.1;' in config
+    assert 'proxy_set_header Connection "";' in config
+    for upstream in ('besu_member_pool', 'besu_member_1', 'besu_validator_1'):
+        assert f'upstream {upstream} {{' in config
+    # Only the member pool has a server block routing to it
+    assert 'besu_validator_pool' not in config and 'besu_rpc_pool' not in config
+    assert config.count('keepalive 32;') == 5  # The member pool and four nodes
+    pool = config.split('upstream besu_member_pool {')[1].split('}')[0]
+    assert '127.0.0.1:20000' in pool and '127.0.0.1:20002' in pool
+    assert 'server_name rpc.example.com;' in config
+    assert [c['server_name'] for c in node_configs] == [
+        'validator-1.example.com', 'member-1.example.com', 'member-2.example.com', 'rpc-rpcnode.example.com']
+
+
+def test_duplicate_hostnames_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        generate_consolidated_nginx_config(NODES + [NODES[0]], output_dir=str(tmp_path))
+
+
+def test_dns_config_includes_shared_rpc_hostname():
+    records = generate_cloudflare_dns_config([{'subdomain': 'member-1'}], server_ip='10.0.0.1', rpc_hostname='rpc')
+    assert [r['name'] for r in records] == ['rpc', 'member-1']
+
+
+def test_json_lines_are_parsed():
+    lines = [
+        json.dumps({'Names': 'besu-net-validator2-1', 'Status': 'Up 23 hours (healthy)',
+                    'Ports': '0.0.0.0:21002->8545/tcp, [::]:21002->8545/tcp, 0.0.0.0:30304->30303/tcp'}),
+        '',
+        json.dumps({'Names': 'rpcnode', 'Ports': '0.0.0.0:8545-8546->8545-8546/tcp'}),
+        json.dumps({'Names': 'besu-net-member3besu-1', 'Ports': '0.0.0.0:20004->8545/tcp'}),
+        json.dumps({'Names': 'besu-net-member3tessera-1', 'Ports': '0.0.0.0:9083->9080/tcp'}),
+        json.dumps({'Names': 'besu-net-validator5-1', 'Ports': '30303/tcp'})
+    ]
+    nodes = list(iter_docker_ps(lines))
+    assert [(n['type'], n['name'], n['port']) for n in nodes] == [
+        ('validator', '2', '21002'), ('rpc', 'rpcnode', '8545'), ('member', '3', '20004')]
+
+
+def test_invalid_json_line_is_reported():
+    with pytest.raises(ValueError, match='Line 2'):
+        list(iter_docker_ps(['{"Names": "rpcnode", "Ports": ""}', '{not json']))
+
+
+def test_table_with_multi_word_fields_is_parsed():
+    nodes = parse_docker_ps_output(os.path.join(os.path.dirname(__file__), '..', 'docker_ps_output.txt'))
+    assert sorted(f"{n['type']}-{n['name']}:{n['port']}" for n in nodes) == [
+        'member-1:20000', 'member-2:20002', 'member-3:20004', 'rpc-rpcnode:8545',
+        'validator-1:21001', 'validator-2:21002', 'validator-3:21003', 'validator-4:21004']
+
+
+def test_published_port_handles_ranges():
+    assert published_port('0.0.0.0:18545-18546->8545-8546/tcp') == '18545'
+    assert published_port('0.0.0.0:9000-9001->8544-8546/tcp') == '9001'
+    assert published_port('8545/tcp') is None
+
+
+def test_sync_writes_only_changed_files(tmp_path):
+    output_dir = str(tmp_path)
+    changes, _ = sync_configs(NODES, output_dir=output_dir, domain='example.com')
+    assert sorted(changes.added) == ['member-1', 'member-2', 'rpc-rpcnode', 'validator-1']
+    assert len(changes.files_written) == 5  # Four nodes and the DNS records
+
+    mtimes = {name: os.stat(tmp_path / name).st_mtime_ns for name in os.listdir(output_dir)}
+    changes, _ = sync_configs(NODES, output_dir=output_dir, domain='example.com')
+    assert not changes.has_changes
+    assert os.stat(tmp_path / 'nginx_member-1.conf').st_mtime_ns == mtimes['nginx_member-1.conf']
+
+    nodes = [dict(NODES[0], port='21009'), NODES[1], {'type': 'member', 'name': '4', 'port': '20006'}]
+    changes, _ = sync_configs(nodes, output_dir=output_dir, domain='example.com')
+    assert changes.added == ['member-4']
+    assert changes.changed == ['validator-1']
+    assert changes.removed == ['member-2', 'rpc-rpcnode']
+    assert sorted(changes.files_removed) == ['nginx_member-2.conf', 'nginx_rpc-rpcnode.conf']
+    assert sorted(changes.files_written) == ['cloudflare_dns_records.json', 'nginx_member-4.conf',
+                                             'nginx_validator-1.conf']
+    assert json.loads((tmp_path / 'changes.json').read_text())['removed'] == ['member-2', 'rpc-rpcnode']
+    assert not [name for name in os.listdir(output_dir) if name.startswith('.tmp-')]
+
+
+def test_consolidated_sync_reports_node_changes(tmp_path):
+    sync_configs(NODES, output_dir=str(tmp_path), consolidated=True)
+    changes, _ = sync_configs(NODES[:3], output_dir=str(tmp_path), consolidated=True)
+    assert changes.removed == ['rpc-rpcnode']
+    assert changes.files_written == ['nginx.conf', 'cloudflare_dns_records.json']
+    assert changes.files_removed == []
+
+
+def test_switching_modes_removes_the_other_modes_files(tmp_path):
+    sync_configs(NODES, output_dir=str(tmp_path))
+    changes, _ = sync_configs(NODES, output_dir=str(tmp_path), consolidated=True)
+    assert sorted(changes.files_removed) == ['nginx_member-1.conf', 'nginx_member-2.conf',
+                                             'nginx_rpc-rpcnode.conf', 'nginx_validator-1.conf']
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith('nginx_')]
+
+    changes, _ = sync_configs(NODES, output_dir=str(tmp_path))
+    assert changes.files_removed == ['nginx.conf']
+    assert len([name for name in os.listdir(str(tmp_path)) if name.startswith('nginx_')]) == 4
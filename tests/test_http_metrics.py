@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import subprocess
+import textwrap
+from flask import Flask
+from prometheus_client import CollectorRegistry
+import http_metrics
+from http_metrics import HttpMetrics, parse_buckets, status_label
+
+
+def make_app(registry, on_latency=None):
+    app = Flask(__name__)
+    metrics = HttpMetrics(buckets=(0.1, 1.0), registry=registry)
+    http_metrics._metrics = metrics
+    try:
+        http_metrics.init_app(app, on_latency=on_latency)
+    finally:
+        http_metrics._metrics = None
+
+    @app.route('/docs/<page>')
+    def docs(page):
+        return page
+
+    @app.route('/fail', methods=['POST'])
+    def fail():
+        return 'no', 503
+
+    return app
+
+
+def sample(registry, name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_labelled_by_route_template():
+    registry = CollectorRegistry()
+    latencies = []
+    client = make_app(registry, on_latency=latencies.append).test_client()
+    for page in ('setup', 'api', 'faq'):
+        client.get(f'/docs/{page}')
+    client.post('/fail')
+    client.get('/missing-1')
+    client.get('/missing-2')
+
+    assert sample(registry, 'web_requests_total', endpoint='/docs/<page>', method='GET', status='2xx') == 3
+    assert sample(registry, 'web_requests_total', endpoint='/fail', method='POST', status='5xx') == 1
+    assert sample(registry, 'web_requests_total', endpoint='<unmatched>', method='GET', status='4xx') == 2
+    assert sample(registry, 'web_request_latency_seconds_count',
+                  endpoint='/docs/<page>', method='GET', status='2xx') == 3
+    assert len(latencies) == 6
+    endpoints = {s.labels['endpoint'] for m in registry.collect() for s in m.samples if 'endpoint' in s.labels}
+    assert endpoints == {'/docs/<page>', '/fail', '<unmatched>'}
+
+
+def test_configured_buckets():
+    registry = CollectorRegistry()
+    make_app(registry).test_client().get('/docs/setup')
+    assert sample(registry, 'web_request_latency_seconds_bucket',
+                  endpoint='/docs/<page>', method='GET', status='2xx', le='1.0') == 1
+    assert parse_buckets('2, 0.5,1') == (0.5, 1.0, 2.0)
+    assert parse_buckets('') == http_metrics.DEFAULT_BUCKETS
+    assert status_label(204) == '2xx' and status_label(502) == '5xx'
+
+
+def test_metrics_endpoint():
+    response = make_app(CollectorRegistry()).test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    assert b'python_info' in response.data
+
+
+def test_metrics_of_every_process_are_aggregated(tmp_path):
+    # Multiprocess mode is chosen when prometheus_client is imported, so each worker is a fresh interpreter
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    worker = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {root!r})
+        from http_metrics import HttpMetrics
+        metrics = HttpMetrics()
+        for _ in range(2):
+            metrics.observe(None, 'GET', 404, 0.01)
+    """)
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(3):
+        subprocess.run([sys.executable, '-c', worker], env=env, check=True)
+
+    text = http_metrics.exposition(str(tmp_path)).decode()
+    assert 'web_requests_total{endpoint="<unmatched>",method="GET",status="4xx"} 6.0' in text
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+from markdown_helper import MarkdownConverter
+
+
+def _write(path, text):
+    path.write_text(text, encoding='utf-8')
+    # Make sure the modification time changes even on coarse-grained filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def docs(tmp_path):
+    docs_dir = tmp_path / 'docs'
+    docs_dir.mkdir()
+    _write(docs_dir / 'guide.md', '# Guide\n\n{!docs/snippet.md!}\n')
+    _write(docs_dir / 'snippet.md', 'First version\n')
+    return MarkdownConverter(docs_dir=str(docs_dir), include_base_path=str(tmp_path)), docs_dir
+
+
+def test_rendered_pages_are_cached(docs):
+    converter, _ = docs
+    first = converter.render_file('guide')
+    assert '<h1 id="guide">Guide</h1>' in first.html
+    assert 'First version' in first.html
+    assert converter.render_file('guide') is first
+    assert converter.render_file('missing') is None
+
+
+def test_changes_to_page_invalidate_cache(docs):
+    converter, docs_dir = docs
+    first = converter.render_file('guide')
+    _write(docs_dir / 'guide.md', '# Changed\n')
+    second = converter.render_file('guide')
+    assert second is not first
+    assert 'Changed' in second.html
+    assert second.etag != first.etag
+
+
+def test_changes_to_included_files_invalidate_cache(docs):
+    converter, docs_dir = docs
+    first = converter.render_file('guide')
+    _write(docs_dir / 'snippet.md', 'Second version\n')
+    assert 'Second version' in converter.render_file('guide').html
+    assert converter.render_file('guide').etag != first.etag
+
+
+def test_warm_up_renders_every_page(docs):
+    converter, _ = docs
+    assert converter.warm_up() == 2
+    assert {os.path.basename(path) for path in converter._cache} == {'guide.md', 'snippet.md'}
+
+
+def test_each_thread_gets_its_own_parser(docs):
+    converter, _ = docs
+    parsers = []
+    thread = threading.Thread(target=lambda: parsers.append(converter.md))
+    thread.start()
+    thread.join()
+    assert parsers[0] is not converter.md
+
+
+def test_aliases_of_a_page_share_one_cache_entry(docs):
+    converter, _ = docs
+    first = converter.render_file('guide')
+    for alias in ('./guide', '././guide', 'sub/../guide', './' * 50 + 'guide'):
+        assert converter.render_file(alias) is first
+    assert len(converter._cache) == 1
+
+
+def test_pages_outside_the_docs_directory_are_not_served(docs, tmp_path):
+    converter, _ = docs
+    _write(tmp_path / 'secret.md', 'Secret\n')
+    assert converter.render_file('../secret') is None
+    assert converter.render_file(str(tmp_path / 'secret')) is None
+    assert converter._cache == {}
+
+
+def test_least_recently_used_pages_are_dropped(docs):
+    converter, docs_dir = docs
+    converter.max_cached_pages = 2
+    _write(docs_dir / 'other.md', 'Other\n')
+    guide = converter.render_file('guide')
+    converter.render_file('snippet')
+    assert converter.render_file('guide') is guide
+    converter.render_file('other')
+    assert [os.path.basename(path) for path in converter._cache] == ['guide.md', 'other.md']
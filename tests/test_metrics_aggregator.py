@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+from deployment_jobs import DeploymentJobStore, SUCCEEDED
+from metrics_aggregator import LatencyWindow, MetricsAggregator, RingSeries
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ring_series_keeps_the_latest_samples_in_order():
+    series = RingSeries(3)
+    for i in range(5):
+        series.append(float(i), i * 10)
+    timestamps, values = series.arrays()
+    assert timestamps.tolist() == [2.0, 3.0, 4.0]
+    assert values.tolist() == [20.0, 30.0, 40.0]
+    assert len(series) == 3
+
+
+def test_latency_window_percentiles():
+    window = LatencyWindow(capacity=100)
+    assert window.percentiles() == {50: None, 95: None, 99: None}
+    for i in range(1, 201):
+        window.observe(i / 1000)
+    result = window.percentiles((50, 99))
+    assert round(result[50], 4) == 0.1505
+    assert result[99] > 0.19
+
+
+def test_sample_reads_jobs_nodes_and_latency(tmp_path):
+    store = DeploymentJobStore(str(tmp_path / 'jobs.db'))
+    for i in range(3):
+        store.enqueue(f'dep-{i}', 'simple', {})
+    job = store.claim_next('worker-1')
+    store.complete_job(job['id'], SUCCEEDED)
+    snapshot = {'nodes': {'a': {'healthy': True}, 'b': {'healthy': False}}}
+    clock = FakeClock()
+    aggregator = MetricsAggregator(store, lambda: snapshot, history=2, clock=clock)
+    for seconds in (0.1, 0.2, 0.3):
+        aggregator.observe_latency(seconds)
+
+    clock.now += 3700
+    result = aggregator.sample()
+    assert result['deployments'] == 3
+    assert result['queue_depth'] == 2
+    assert result['succeeded'] == 1
+    assert result['nodes'] == {'total': 2, 'healthy': 1, 'unhealthy': 1, 'unknown': 0}
+    assert result['latency_ms']['p50'] == 200.0
+    assert result['uptime'] == '1h 1m'
+    assert aggregator.snapshot() is result
+
+    clock.now += 15
+    aggregator.sample()
+    clock.now += 15
+    aggregator.sample()
+    chart = aggregator.chart_data()
+    assert chart['timestamps'] == [4715.0, 4730.0]
+    assert chart['series']['queue_depth'] == [2.0, 2.0]
+
+
+def test_snapshot_before_first_sample_and_missing_data():
+    aggregator = MetricsAggregator()
+    assert aggregator.snapshot()['deployments'] == 0
+    aggregator.sample()
+    assert aggregator.chart_data()['series']['latency_p95_ms'] == [None]
+
+
+def test_scheduler_samples_in_background():
+    aggregator = MetricsAggregator(interval=60)
+    aggregator.start()
+    try:
+        deadline = time.time() + 5
+        while aggregator.snapshot()['updated_at'] is None and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        aggregator.stop()
+    assert aggregator.snapshot()['updated_at'] is not None
@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import joblib
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+import ml_model
+from ml_model import ModelLoader, ModelUnavailableError
+from feature_encoder import FeatureEncoder
+from train_model import generate_configs
+
+
+@pytest.fixture
+def loader(tmp_path):
+    configs, y = generate_configs(300, random_state=0)
+    encoder = FeatureEncoder()
+    X = encoder.fit_transform(configs)
+    model_path = str(tmp_path / 'model.pkl')
+    encoder_path = str(tmp_path / 'encoder.json')
+    joblib.dump(RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y), model_path)
+    encoder.save(encoder_path)
+    return ModelLoader(model_path, mmap_mode='r', encoder_path=encoder_path), configs
+
+
+def test_model_is_loaded_lazily_once(loader, monkeypatch):
+    loader, _ = loader
+    calls = []
+    real_load = joblib.load
+    monkeypatch.setattr(ml_model.joblib, 'load', lambda *a, **kw: calls.append(kw) or real_load(*a, **kw))
+
+    assert calls == []
+    threads = [threading.Thread(target=loader.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [{'mmap_mode': 'r'}]
+    assert isinstance(loader.get_encoder(), FeatureEncoder)
+
+
+def test_missing_model_is_reported(tmp_path):
+    with pytest.raises(ModelUnavailableError):
+        ModelLoader(str(tmp_path / 'missing.pkl')).get()
+
+
+def test_predict_configs_uses_one_call(loader, monkeypatch):
+    loader, configs = loader
+    monkeypatch.setattr(ml_model, '_loader', loader)
+    model = loader.get()
+    calls = []
+    real_predict = model.predict
+    monkeypatch.setattr(model, 'predict', lambda rows: calls.append(len(rows)) or real_predict(rows))
+
+    predictions = ml_model.predict_configs(configs[:50])
+    assert calls == [50]
+    assert predictions == real_predict(loader.get_encoder().transform(configs[:50])).tolist()
+    assert ml_model.predict_configs([]) == []
+    assert ml_model.predict_optimal_config(configs[0]) == predictions[0]
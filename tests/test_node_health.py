@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import threading
+import requests
+from node_health import NodeHealthMonitor, filter_healthy, load_snapshot, summarize
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class FakeNodes:
+    """Answers probe batches with per-node state: block, peers and syncing, or an exception"""
+
+    def __init__(self, state):
+        self.state = state
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.requests.append((url, [call['method'] for call in json]))
+        node = self.state[url]
+        if isinstance(node, Exception):
+            raise node
+        results = {'eth_syncing': node.get('syncing', False), 'eth_blockNumber': hex(node['block']),
+                   'net_peerCount': hex(node.get('peers', 3))}
+        return FakeResponse([{'jsonrpc': '2.0', 'id': call['id'], 'result': results[call['method']]}
+                             for call in json])
+
+
+def make_monitor(state, **kwargs):
+    session = FakeNodes(state)
+    targets = {url.split('//')[1]: url for url in state}
+    return NodeHealthMonitor(targets, session=session, rise=2, fall=2, max_block_lag=5, **kwargs), session
+
+
+def test_probes_every_node_with_one_batch():
+    monitor, session = make_monitor({'http://a': {'block': 100}, 'http://b': {'block': 98}})
+    snapshot = monitor.probe_once()
+    assert sorted(url for url, _ in session.requests) == ['http://a', 'http://b']
+    assert all(methods == ['eth_syncing', 'eth_blockNumber', 'net_peerCount'] for _, methods in session.requests)
+    assert snapshot['nodes']['b']['lag'] == 2
+    assert snapshot['nodes']['a']['peers'] == 3
+    assert snapshot['nodes']['a']['latency_ms'] is not None
+
+
+def test_health_changes_with_hysteresis():
+    state = {'http://a': {'block': 100}, 'http://b': {'block': 100}}
+    changes = []
+    monitor, _ = make_monitor(state, on_change=changes.append)
+    monitor.probe_once()
+    assert monitor.snapshot()['nodes']['a']['healthy'] is None
+    monitor.probe_once()
+    assert monitor.snapshot()['nodes']['a']['healthy'] is True
+    assert len(changes) == 1
+
+    state['http://b'] = requests.ConnectionError('refused')
+    monitor.probe_once()
+    assert monitor.snapshot()['nodes']['b']['healthy'] is True
+    state['http://b'] = {'block': 100}
+    monitor.probe_once()
+    state['http://b'] = requests.ConnectionError('refused')
+    monitor.probe_once()
+    monitor.probe_once()
+    snapshot = monitor.snapshot()
+    assert snapshot['nodes']['b']['healthy'] is False
+    assert 'refused' in snapshot['nodes']['b']['error']
+    assert summarize(snapshot) == {'total': 2, 'healthy': 1, 'unhealthy': 1, 'unknown': 0}
+
+
+def test_lagging_syncing_and_isolated_nodes_are_bad():
+    state = {'http://a': {'block': 100}, 'http://b': {'block': 90},
+             'http://c': {'block': 80, 'syncing': {'currentBlock': '0x50', 'highestBlock': '0x64'}},
+             'http://d': {'block': 100, 'peers': 0}}
+    monitor, _ = make_monitor(state)
+    monitor.probe_once()
+    snapshot = monitor.probe_once()
+    assert {name: node['healthy'] for name, node in snapshot['nodes'].items()} == \
+        {'a': True, 'b': False, 'c': False, 'd': False}
+    assert snapshot['nodes']['c']['lag'] == 20
+
+
+def test_ring_buffer_is_bounded():
+    monitor, _ = make_monitor({'http://a': {'block': 1}}, history=3)
+    for _ in range(5):
+        monitor.probe_once()
+    assert monitor.snapshot()['nodes']['a']['samples'] == 3
+
+
+def test_snapshot_file_and_filter(tmp_path):
+    path = str(tmp_path / 'health.json')
+    state = {'http://member1': {'block': 100}, 'http://member2': requests.Timeout('timed out')}
+    monitor, _ = make_monitor(state, snapshot_path=path)
+    monitor.probe_once()
+    monitor.probe_once()
+    snapshot = load_snapshot(path)
+    assert snapshot == json.loads(json.dumps(monitor.snapshot()))
+
+    nodes = [{'container_name': 'member1'}, {'container_name': 'member2'}, {'container_name': 'member3'}]
+    assert [n['container_name'] for n in filter_healthy(nodes, snapshot)] == ['member1', 'member3']
+    assert load_snapshot(str(tmp_path / 'missing.json'))['nodes'] == {}
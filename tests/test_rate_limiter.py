@@ -0,0 +1,98 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from rate_limiter import (
+    RateLimiter, MemoryRateLimitBackend, RedisRateLimitBackend, create_rate_limiter, redis
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(MemoryRateLimitBackend(), clock=clock)
+
+
+def test_limit_within_window(limiter):
+    results = [limiter.hit('deploy:user:1', 3, 60) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    rejected = results[3].headers()
+    assert rejected['X-RateLimit-Limit'] == '3'
+    assert rejected['X-RateLimit-Remaining'] == '0'
+    assert int(rejected['Retry-After']) >= 1
+
+
+def test_keys_are_independent(limiter):
+    assert limiter.hit('deploy:user:1', 1, 60).allowed
+    assert not limiter.hit('deploy:user:1', 1, 60).allowed
+    assert limiter.hit('deploy:user:2', 1, 60).allowed
+    assert limiter.hit('validate:user:1', 1, 60).allowed
+
+
+def test_previous_window_slides_out(limiter, clock):
+    for _ in range(10):
+        assert limiter.hit('k', 10, 60).allowed
+    # A quarter into the next window, 75% of the previous window still counts
+    clock.now = 1020 + 15
+    allowed = [limiter.hit('k', 10, 60).allowed for _ in range(4)]
+    assert allowed == [True, True, False, False]
+    # Retry-After points at the time the next request fits again
+    retry_after = limiter.hit('k', 10, 60).retry_after
+    clock.now += retry_after
+    assert limiter.hit('k', 10, 60).allowed
+
+
+def test_old_windows_are_forgotten(limiter, clock):
+    for _ in range(5):
+        limiter.hit('k', 5, 60)
+    clock.now += 120
+    assert limiter.hit('k', 5, 60).remaining == 4
+
+
+def test_stale_keys_are_swept(clock):
+    backend = MemoryRateLimitBackend()
+    backend.SWEEP_INTERVAL = 3
+    limiter = RateLimiter(backend, clock=clock)
+    limiter.hit('a', 5, 60)
+    limiter.hit('b', 5, 60)
+    clock.now += 600
+    limiter.hit('c', 5, 60)
+    assert set(backend._windows) == {'c'}
+
+
+def test_backend_errors_fail_open(clock):
+    class BrokenBackend:
+        def hit(self, *args):
+            raise ConnectionError('redis down')
+
+    assert RateLimiter(BrokenBackend(), clock=clock).hit('k', 1, 60).allowed
+
+
+def test_create_rate_limiter():
+    assert isinstance(create_rate_limiter('memory').backend, MemoryRateLimitBackend)
+    with pytest.raises(ValueError):
+        create_rate_limiter('memcached')
+
+
+@pytest.mark.skipif(not os.getenv('REDIS_URL'), reason='REDIS_URL not set')
+def test_redis_backend_is_shared(clock):
+    client = redis.Redis.from_url(os.getenv('REDIS_URL'))
+    client.delete('test-ratelimit:k:60:16', 'test-ratelimit:k:60:15')
+    first = RateLimiter(RedisRateLimitBackend(client, prefix='test-ratelimit'), clock=clock)
+    second = RateLimiter(RedisRateLimitBackend(client, prefix='test-ratelimit'), clock=clock)
+    assert first.hit('k', 2, 60).allowed
+    assert second.hit('k', 2, 60).allowed
+    assert not first.hit('k', 2, 60).allowed
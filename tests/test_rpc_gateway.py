@@ -0,0 +1,250 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+import requests
+from rpc_gateway import (BLOCK, PERMANENT, RpcGateway, SingleFlight, TTLCache, UpstreamPool,
+                         create_gateway_app, request_scope)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeNode:
+    """Besu node answering from a table of results, keyed by method"""
+
+    def __init__(self, head=100, results=None, delay=0.0):
+        self.head = head
+        self.results = results or {}
+        self.delay = delay
+        self.down = False
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.calls.append((url, json['method'], json['params']))
+        if self.down:
+            raise requests.ConnectionError('Connection refused')
+        if self.delay:
+            time.sleep(self.delay)
+        if json['method'] == 'eth_blockNumber':
+            result = hex(self.head)
+        else:
+            result = self.results.get(json['method'])
+        if isinstance(result, Exception):
+            raise result
+        return FakeResponse({'jsonrpc': '2.0', 'id': json['id'], 'result': result})
+
+    def methods(self):
+        return [method for _, method, _ in self.calls if method != 'eth_blockNumber']
+
+
+def make_gateway(node, urls=('http://node1:8545',), clock=None, **kwargs):
+    clock = clock or FakeClock()
+    pool = UpstreamPool(urls, session=node, clock=clock)
+    return RpcGateway(pool, clock=clock, **kwargs), clock
+
+
+def test_request_scope():
+    assert request_scope('eth_chainId', [], 100) == PERMANENT
+    assert request_scope('eth_getBlockByNumber', ['0x10', False], 100) == PERMANENT
+    assert request_scope('eth_getBlockByNumber', ['latest', False], 100) == BLOCK
+    assert request_scope('eth_getBlockByNumber', ['0x70', False], 100) == BLOCK
+    assert request_scope('eth_getBalance', ['0xabc'], 100) == BLOCK
+    assert request_scope('eth_getBalance', ['0xabc', 'pending'], 100) is None
+    assert request_scope('eth_call', [{}, {'blockNumber': '0x1'}], 100) == PERMANENT
+    assert request_scope('eth_sendRawTransaction', ['0x00'], 100) is None
+
+
+def test_static_calls_are_cached_forever():
+    node = FakeNode(results={'eth_chainId': '0x539'})
+    gateway, clock = make_gateway(node)
+    for _ in range(3):
+        clock.now += 100
+        assert gateway.call('eth_chainId', [])['result'] == '0x539'
+    assert node.methods() == ['eth_chainId']
+
+
+def test_head_dependent_calls_are_cached_per_block():
+    node = FakeNode(results={'eth_gasPrice': '0x1'})
+    gateway, clock = make_gateway(node, head_ttl=1.0)
+    gateway.call('eth_gasPrice', [])
+    gateway.call('eth_gasPrice', [])
+    assert node.methods() == ['eth_gasPrice']
+
+    node.head = 101
+    clock.now += 2
+    assert gateway.call('eth_blockNumber', [])['result'] == hex(101)
+    gateway.call('eth_gasPrice', [])
+    assert node.methods() == ['eth_gasPrice', 'eth_gasPrice']
+
+
+def test_finalized_blocks_are_cached_forever_and_recent_ones_per_block():
+    node = FakeNode(results={'eth_getBlockByNumber': {'number': '0x5'}})
+    gateway, clock = make_gateway(node, finality_depth=10)
+    gateway.call('eth_getBlockByNumber', ['0x5', False])
+    gateway.call('eth_getBlockByNumber', ['0x60', False])
+    node.head = 200
+    clock.now += 5
+    gateway.call('eth_getBlockByNumber', ['0x5', False])
+    gateway.call('eth_getBlockByNumber', ['0x60', False])
+    assert [params[0] for _, method, params in node.calls if method != 'eth_blockNumber'] == \
+        ['0x5', '0x60', '0x60']
+
+
+def test_pending_transactions_are_not_cached_forever():
+    node = FakeNode(results={'eth_getTransactionReceipt': None})
+    gateway, clock = make_gateway(node)
+    assert gateway.call('eth_getTransactionReceipt', ['0xaa'])['result'] is None
+    node.head = 101
+    node.results['eth_getTransactionReceipt'] = {'blockNumber': hex(101)}
+    clock.now += 5
+    assert gateway.call('eth_getTransactionReceipt', ['0xaa'])['result'] == {'blockNumber': hex(101)}
+    node.head = 150
+    clock.now += 5
+    gateway.call('eth_getTransactionReceipt', ['0xaa'])
+    assert node.methods() == ['eth_getTransactionReceipt'] * 2
+
+
+def test_writes_are_forwarded_every_time():
+    node = FakeNode(results={'eth_sendRawTransaction': '0xhash'})
+    gateway, _ = make_gateway(node)
+    gateway.call('eth_sendRawTransaction', ['0x00'])
+    gateway.call('eth_sendRawTransaction', ['0x00'])
+    assert node.methods() == ['eth_sendRawTransaction'] * 2
+
+
+def test_batches_are_split_and_keep_order():
+    node = FakeNode(results={'eth_chainId': '0x539', 'net_version': '1337'})
+    gateway, _ = make_gateway(node)
+    gateway.call('eth_chainId', [])
+    response = gateway.handle([
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'net_version', 'params': []},
+        {'jsonrpc': '2.0', 'method': 'eth_chainId', 'params': []},
+        {'jsonrpc': '2.0', 'id': 'b', 'method': 'eth_chainId'},
+        {'id': 3}
+    ])
+    assert [r['id'] for r in response] == [1, 'b', None]
+    assert response[0]['result'] == '1337'
+    assert response[1]['result'] == '0x539'
+    assert response[2]['error']['code'] == -32600
+    assert node.methods() == ['eth_chainId', 'net_version']
+
+
+def test_identical_concurrent_calls_share_one_upstream_request():
+    node = FakeNode(results={'eth_getBalance': '0x10'}, delay=0.1)
+    gateway, _ = make_gateway(node)
+    gateway.head()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.call('eth_getBalance', ['0xabc'])))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [r['result'] for r in results] == ['0x10'] * 8
+    assert node.methods() == ['eth_getBalance']
+
+
+def test_single_flight_propagates_errors():
+    flight = SingleFlight()
+    try:
+        flight.do('key', lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError('expected ZeroDivisionError')
+    assert flight.do('key', lambda: 2) == (2, False)
+
+
+def test_ttl_cache_expires_and_evicts():
+    clock = FakeClock()
+    cache = TTLCache(max_size=2, clock=clock)
+    cache.put('a', 1, 5)
+    cache.put('b', 2, None)
+    clock.now = 6
+    assert cache.get('a') is None
+    cache.put('c', 3, None)
+    cache.put('d', 4, None)
+    assert cache.get('b') is None
+    assert cache.get('d') == 4
+
+
+def test_pool_balances_and_fails_over():
+    node = FakeNode(results={'eth_getBalance': '0x1'})
+    clock = FakeClock()
+    pool = UpstreamPool(['http://a', 'http://b'], session=node, clock=clock, cooldown=10)
+    pool._in_flight['http://a'] = 1
+    pool.call({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_getBalance', 'params': []})
+    assert node.calls[-1][0] == 'http://b'
+
+    node.results['eth_getBalance'] = requests.ConnectionError('refused')
+    try:
+        pool.call({'jsonrpc': '2.0', 'id': 2, 'method': 'eth_getBalance', 'params': []})
+    except Exception:
+        pass
+    # Both nodes are cooling down; a healthy call goes to the least busy one
+    node.results['eth_getBalance'] = '0x1'
+    pool._in_flight['http://a'] = 0
+    pool.call({'jsonrpc': '2.0', 'id': 3, 'method': 'eth_getBalance', 'params': []})
+    assert node.calls[-1][0] == 'http://a'
+
+
+def test_upstream_errors_are_returned_not_cached():
+    node = FakeNode(results={'eth_getCode': requests.ConnectionError('refused')})
+    gateway, clock = make_gateway(node, urls=('http://a', 'http://b'))
+    assert gateway.call('eth_getCode', ['0xabc'])['error']['code'] == -32603
+    node.results['eth_getCode'] = '0x60'
+    clock.now += 20
+    assert gateway.call('eth_getCode', ['0xabc'])['result'] == '0x60'
+
+
+def test_flask_endpoint():
+    node = FakeNode(results={'eth_chainId': '0x539'})
+    gateway, _ = make_gateway(node)
+    client = create_gateway_app(gateway).test_client()
+    response = client.post('/json-rpc', json={'jsonrpc': '2.0', 'id': 7, 'method': 'eth_chainId'})
+    assert response.get_json() == {'jsonrpc': '2.0', 'id': 7, 'result': '0x539'}
+    response = client.post('/', data='{not json')
+    assert response.get_json()['error']['code'] == -32700
+    assert client.post('/', json={'jsonrpc': '2.0', 'method': 'eth_chainId'}).status_code == 204
+
+
+def test_stale_head_is_bounded_when_nodes_go_down():
+    node = FakeNode(head=0x10, results={'eth_getBalance': '0x1'})
+    gateway, clock = make_gateway(node, head_ttl=1.0, max_head_age=3.0)
+    assert gateway.call('eth_blockNumber', []) == {'result': '0x10'}
+
+    node.down = True
+    clock.now = 1.5
+    assert gateway.call('eth_blockNumber', []) == {'result': '0x10'}
+    attempts = len(node.calls)
+    # Failed reads are not retried within head_ttl
+    clock.now = 2.0
+    gateway.call('eth_blockNumber', [])
+    assert len(node.calls) == attempts
+
+    clock.now = 3.5
+    assert gateway.call('eth_blockNumber', [])['error']['code'] == -32603
+    assert gateway.call('eth_getBalance', ['0xabc'])['error']['code'] == -32603
+
+    node.down = False
+    node.head = 0x11
+    clock.now = 20.0
+    assert gateway.call('eth_blockNumber', []) == {'result': '0x11'}
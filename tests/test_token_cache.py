@@ -0,0 +1,149 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import jwt
+import pytest
+from token_cache import RedisRevocationStore, TokenVerifier, VerifiedTokenCache, TOKEN_CACHE_REQUESTS
+
+SECRET = 'test-secret-key-with-at-least-32-bytes'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def _token(exp_in=3600, **claims):
+    claims.setdefault('user_id', 'user-1')
+    if exp_in is not None:
+        claims['exp'] = int(time.time()) + exp_in
+    return jwt.encode(claims, SECRET, algorithm='HS256')
+
+
+def _count(result):
+    return TOKEN_CACHE_REQUESTS.labels(result=result)._value.get()
+
+
+def test_repeated_tokens_are_served_from_cache():
+    built = []
+    verifier = TokenVerifier(SECRET, factory=lambda claims: built.append(claims) or claims['user_id'])
+    token = _token()
+    hits, misses = _count('hit'), _count('miss')
+    assert verifier.verify(token) == 'user-1'
+    assert verifier.verify(token) == 'user-1'
+    assert len(built) == 1
+    assert (_count('hit') - hits, _count('miss') - misses) == (1, 1)
+
+
+def test_invalid_tokens_are_not_cached():
+    verifier = TokenVerifier(SECRET)
+    bad = jwt.encode({'user_id': 'x'}, 'another-secret-key-with-at-least-32-bytes', algorithm='HS256')
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(bad)
+    assert len(verifier.cache) == 0
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(_token(exp_in=-10))
+
+
+def test_entries_expire_with_the_token():
+    clock = FakeClock()
+    verifier = TokenVerifier(SECRET, clock=clock)
+    token = _token(exp_in=60)
+    verifier.verify(token)
+    clock.now += 120
+    assert verifier.cache.get(next(iter(verifier.cache._entries))) is None
+
+
+def test_tokens_without_exp_use_max_ttl():
+    clock = FakeClock()
+    verifier = TokenVerifier(SECRET, max_ttl=10, clock=clock)
+    verifier.verify(_token(exp_in=None))
+    (expires_at, _), = verifier.cache._entries.values()
+    assert expires_at == pytest.approx(clock.now + 10)
+
+
+def test_revoked_tokens_are_rejected():
+    verifier = TokenVerifier(SECRET)
+    token = _token()
+    verifier.verify(token)
+    verifier.revoke(token)
+    with pytest.raises(jwt.InvalidTokenError, match='revoked'):
+        verifier.verify(token)
+    verifier.revoke('not-a-token')
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = (value, ex)
+
+    def exists(self, key):
+        return int(key in self.values)
+
+
+def test_revocations_are_shared_between_processes():
+    client = FakeRedis()
+    clock = FakeClock()
+    worker_a = TokenVerifier(SECRET, revocations=RedisRevocationStore(client))
+    worker_b = TokenVerifier(SECRET, revocations=RedisRevocationStore(client), clock=clock,
+                             revocation_check_interval=1.0)
+    token = _token()
+    worker_b.verify(token)  # Cached in worker b before the logout
+    worker_a.revoke(token)
+    worker_b.verify(token)  # Not looked up again within the check interval
+    clock.now += 1.0
+    with pytest.raises(jwt.InvalidTokenError, match='revoked'):
+        worker_b.verify(token)
+    (_, ttl), = client.values.values()
+    assert 0 < ttl <= 3600
+
+
+class DownRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def exists(self, key):
+        self.calls += 1
+        raise ConnectionError('Connection refused')
+
+    set = exists
+
+
+def test_unreachable_revocation_store_fails_open_with_throttled_errors(caplog):
+    client = DownRedis()
+    clock = FakeClock()
+    verifier = TokenVerifier(SECRET, revocations=RedisRevocationStore(client), clock=clock,
+                             revocation_check_interval=1.0, error_log_interval=60.0)
+    token = _token()
+    for _ in range(5):
+        verifier.verify(token)
+    assert client.calls == 1
+    for _ in range(5):
+        clock.now += 1.0
+        verifier.verify(token)
+    assert client.calls == 6
+    verifier.revoke(token)
+    errors = [r.getMessage() for r in caplog.records if r.levelname == 'ERROR']
+    assert errors == ['Failed to check token revocation: Connection refused']
+
+    clock.now += 60.0
+    verifier.verify(_token(user_id='user-2'))
+    assert caplog.records[-1].getMessage() == \
+        'Failed to check token revocation: Connection refused (6 more failures since the last report)'
+
+
+def test_cache_is_bounded_lru():
+    cache = VerifiedTokenCache(max_size=2)
+    expires_at = time.time() + 60
+    cache.put(b'a', 1, expires_at)
+    cache.put(b'b', 2, expires_at)
+    cache.get(b'a')
+    cache.put(b'c', 3, expires_at)
+    assert cache.get(b'b') is None
+    assert (cache.get(b'a'), cache.get(b'c')) == (1, 3)
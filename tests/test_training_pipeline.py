@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+import ml_model
+from deployment_jobs import SUCCEEDED, FAILED, CANCELLED
+from deployment_telemetry import DeploymentTelemetryStore
+from ml_model import ModelLoader
+from model_registry import ModelRegistry
+from train_model import generate_configs
+from training_pipeline import TrainingSet, train
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def telemetry(tmp_path):
+    return DeploymentTelemetryStore(str(tmp_path / 'telemetry.db'))
+
+
+def record_synthetic(telemetry, n, random_state=0):
+    configs, labels = generate_configs(n, random_state=random_state)
+    for i, (config, label) in enumerate(zip(configs, labels)):
+        telemetry.record(f'dep-{random_state}-{i}', 'simple', config, bool(label), duration_seconds=60.0)
+
+
+def test_record_job_skips_cancelled(telemetry):
+    job = {'id': 'dep-1', 'mode': 'simple',
+           'payload': {'location': 'eastus', 'vmSize': 'Standard_B2s', 'nodeType': 'validator'}}
+    telemetry.record_job(job, SUCCEEDED, 12.5)
+    telemetry.record_job(dict(job, id='dep-2'), FAILED, 3.0, 'quota exceeded')
+    telemetry.record_job(dict(job, id='dep-3'), CANCELLED, 1.0)
+
+    outcomes = telemetry.fetch_since(0)
+    assert [(o['deployment_id'], o['success'], o['error']) for o in outcomes] == [
+        ('dep-1', True, None), ('dep-2', False, 'quota exceeded')]
+    assert outcomes[0]['vm_size'] == 'Standard_B2s'
+    assert outcomes[0]['node_type'] == 'validator'
+    assert outcomes[0]['duration_seconds'] == 12.5
+    assert telemetry.fetch_since(outcomes[0]['id']) == outcomes[1:]
+
+
+def test_training_set_is_built_incrementally(telemetry, tmp_path):
+    training_set = TrainingSet(str(tmp_path / 'training'))
+    record_synthetic(telemetry, 30)
+    assert training_set.update(telemetry, page_size=7) == 30
+    assert training_set.update(telemetry) == 0
+    record_synthetic(telemetry, 10, random_state=1)
+    assert training_set.update(telemetry) == 10
+
+    configs, labels = training_set.load()
+    assert len(configs) == len(labels) == 40
+    assert training_set.cursor() == 40
+
+
+def test_train_publishes_versions(telemetry, tmp_path):
+    training_set = TrainingSet(str(tmp_path / 'training'))
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    record_synthetic(telemetry, 20)
+    training_set.update(telemetry)
+    assert train(training_set, registry, min_samples=50, n_estimators=5) is None
+
+    record_synthetic(telemetry, 100, random_state=1)
+    training_set.update(telemetry)
+    assert train(training_set, registry, min_samples=50, n_estimators=5) == 'v0001'
+    assert registry.current_version() == 'v0001'
+    metadata = registry.metadata('v0001')
+    assert metadata['n_samples'] == 120
+    assert metadata['telemetry_cursor'] == 120
+
+    assert train(training_set, registry, n_estimators=5, activate=False) == 'v0002'
+    assert registry.current_version() == 'v0001'
+    assert registry.list_versions() == ['v0001', 'v0002']
+
+
+def test_loader_swaps_to_activated_version(telemetry, tmp_path):
+    training_set = TrainingSet(str(tmp_path / 'training'))
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    record_synthetic(telemetry, 100)
+    training_set.update(telemetry)
+    train(training_set, registry, n_estimators=5)
+
+    clock = FakeClock()
+    loader = ModelLoader(str(tmp_path / 'missing.pkl'), registry=registry, reload_interval=30, clock=clock)
+    first = loader.bundle()
+    assert first.version == 'v0001'
+    assert ml_model.MODEL_VERSION._value.get() == 1
+
+    train(training_set, registry, n_estimators=7)
+    assert loader.bundle() is first  # Not checked again before reload_interval
+
+    clock.now = 31
+    threads = [threading.Thread(target=loader.bundle) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    second = loader.bundle()
+    assert second.version == 'v0002'
+    assert len(second.model.compiled.roots) == 7
+    assert ml_model.MODEL_VERSION._value.get() == 2
+
+
+def test_loader_keeps_serving_when_new_version_is_broken(telemetry, tmp_path):
+    training_set = TrainingSet(str(tmp_path / 'training'))
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    record_synthetic(telemetry, 100)
+    training_set.update(telemetry)
+    train(training_set, registry, n_estimators=5)
+
+    clock = FakeClock()
+    loader = ModelLoader(registry=registry, clock=clock)
+    first = loader.bundle()
+    os.makedirs(registry.version_dir('v0002'))
+    registry.activate('v0002')
+
+    clock.now = 60
+    assert loader.bundle() is first
@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from validation_schema import (
+    SIMPLE_SCHEMA, EXPERT_SCHEMA, OPERATION_SCHEMA, compile_schema, validation_result
+)
+from validation_helpers import (
+    validate_firewall_rules, validate_monitoring_config, validate_config_batch, parse_ndjson
+)
+
+SIMPLE = {
+    'resourceGroup': 'my-resource-group',
+    'location': 'eastus',
+    'nodeType': 'validator',
+    'vmSize': 'Standard_D2s_v3'
+}
+
+EXPERT = {
+    'network': {'vnetName': 'test-vnet', 'subnetPrefix': '10.0.0.0/24'},
+    'nodes': {'count': 3, 'consensusProtocol': 'ibft2'},
+    'monitoring': {'enabled': True, 'retention': 30, 'alertEmail': 'ops@example.com'},
+    'security': {'firewall_rules': [{'port': 30303, 'protocol': 'tcp'}]}
+}
+
+
+def _paths(errors):
+    return [error.path for error in errors]
+
+
+def test_valid_configs():
+    assert SIMPLE_SCHEMA.validate(SIMPLE) == []
+    assert EXPERT_SCHEMA.validate(EXPERT) == []
+
+
+def test_simple_errors_have_field_paths():
+    errors = SIMPLE_SCHEMA.validate(dict(SIMPLE, resourceGroup='rg; rm -rf /', vmSize='huge'))
+    assert _paths(errors) == ['resourceGroup', 'vmSize']
+    assert [e.message for e in errors] == ['Invalid resource group name', 'Invalid VM size']
+
+
+def test_missing_and_non_object_input():
+    assert [e.message for e in SIMPLE_SCHEMA.validate(None)] == ['No data provided']
+    assert _paths(SIMPLE_SCHEMA.validate({})) == ['resourceGroup', 'location', 'nodeType', 'vmSize']
+    assert SIMPLE_SCHEMA.validate(dict(SIMPLE, resourceGroup=42))[0].message == 'Invalid resource group name'
+
+
+def test_trailing_newline_is_rejected():
+    assert _paths(SIMPLE_SCHEMA.validate(dict(SIMPLE, resourceGroup='my-group\n'))) == ['resourceGroup']
+
+
+def test_expert_nested_errors():
+    config = {
+        'network': {'vnetName': 'x', 'subnetPrefix': '10.0.0.0/8'},
+        'nodes': {'count': 'many', 'consensusProtocol': 'pow'},
+        'monitoring': {'enabled': True, 'retention': 400},
+        'security': {'firewall_rules': [{'port': 70000, 'protocol': 'icmp'}]}
+    }
+    result = validation_result(EXPERT_SCHEMA.validate(config))
+    assert not result['valid']
+    assert result['field_errors'] == [
+        {'path': 'network.vnetName',
+         'message': 'Invalid virtual network name (2-64 chars, alphanumeric, hyphens, underscores)'},
+        {'path': 'network.subnetPrefix', 'message': 'Subnet prefix must be between /16 and /29'},
+        {'path': 'nodes.count', 'message': 'Invalid node count'},
+        {'path': 'nodes.consensusProtocol', 'message': 'Invalid consensus protocol. Must be one of: ibft2, qbft, clique'},
+        {'path': 'monitoring.retention', 'message': 'Retention period must be between 1 and 90 days'},
+        {'path': 'security.firewall_rules[0].port', 'message': 'Invalid port number: 70000. Must be between 1 and 65535'},
+        {'path': 'security.firewall_rules[0].protocol', 'message': 'Invalid protocol: icmp. Must be TCP or UDP'}
+    ]
+
+
+def test_expert_defaults_and_disabled_monitoring():
+    errors = EXPERT_SCHEMA.validate({'monitoring': {'enabled': False, 'retention': 'bad'}})
+    assert _paths(errors) == ['network.vnetName', 'nodes.count', 'nodes.consensusProtocol']
+
+
+def test_operation_schema():
+    config = {'name': 'rg-1', 'location': 'eastus', 'resource_group': 'rg-1',
+              'vm_name': 'node-1', 'admin_username': 'azureuser'}
+    assert OPERATION_SCHEMA.validate(config) == []
+    errors = OPERATION_SCHEMA.validate(dict(config, vm_name='', network={'subnet_prefix': 'x'}))
+    assert [e.message for e in errors] == [
+        'Missing required field: vm_name', 'Invalid virtual network name', 'Invalid subnet prefix format'
+    ]
+
+
+def test_helpers_share_the_schema():
+    assert validate_monitoring_config({'enabled': True, 'retention': 0}) == [
+        'Retention period must be between 1 and 90 days']
+    assert validate_firewall_rules([{'port': 22, 'protocol': 'UDP', 'sourceAddress': '10.0.0.300'}]) == [
+        'Invalid source IP address: 10.0.0.300']
+
+
+def test_compile_schema_normalizes_enums():
+    schema = compile_schema({'type': 'object', 'fields': {
+        'protocol': {'required': True, 'enum': ['TCP'], 'normalize': 'upper', 'message': 'bad {value}'}
+    }})
+    assert schema.validate({'protocol': 'tcp'}) == []
+    assert schema.validate({'protocol': 'udp'})[0].message == 'bad udp'
+
+
+def _expert(vm_name, prefix):
+    return dict(EXPERT, mode='expert', vmName=vm_name,
+                network={'vnetName': 'test-vnet', 'subnetPrefix': prefix})
+
+
+def test_batch_cross_config_checks():
+    configs = [
+        _expert('node-a', '10.0.0.0/16'),
+        _expert('node-b', '10.1.0.0/24'),
+        _expert('Node-A', '10.0.4.0/24'),
+        dict(SIMPLE, vmName='node-c'),
+        _expert('node-d', '10.1.0.0/24')
+    ]
+    results = list(validate_config_batch(configs))
+    assert [r['index'] for r in results] == [0, 1, 2, 3, 4]
+    assert [r['valid'] for r in results] == [True, True, False, True, False]
+    assert results[2]['field_errors'] == [
+        {'path': 'vmName', 'message': 'Duplicate VM name Node-A (also used by config 0)'},
+        {'path': 'network.subnetPrefix', 'message': 'Subnet prefix 10.0.4.0/24 overlaps with config 0'}
+    ]
+    assert results[4]['errors'] == ['Subnet prefix 10.1.0.0/24 overlaps with config 1']
+
+
+def test_batch_supernet_after_subnet_overlaps():
+    results = list(validate_config_batch([_expert('node-a', '10.2.3.0/24'), _expert('node-b', '10.2.0.0/16')]))
+    assert results[1]['errors'] == ['Subnet prefix 10.2.0.0/16 overlaps with config 0']
+
+
+def test_batch_from_ndjson():
+    lines = [json.dumps(SIMPLE).encode(), b'', b'{not json', json.dumps({'mode': 'simple'}).encode()]
+    results = list(validate_config_batch(parse_ndjson(lines)))
+    assert [r['valid'] for r in results] == [True, False, False]
+    assert results[1]['errors'][0].startswith('Invalid JSON on line 3')
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+import jwt
+from prometheus_client import Counter
+
+TOKEN_CACHE_REQUESTS = Counter(
+    'jwt_cache_requests_total', 'Verified token cache lookups', ['result']
+)
+
+
+def token_digest(token: str) -> bytes:
+    """Cache key of a token, so raw tokens are never kept in memory"""
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU cache of verified tokens; each entry expires with its token"""
+
+    def __init__(self, max_size: int = 10000, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: 'OrderedDict[bytes, tuple]' = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[Any]:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return value
+
+    def put(self, digest: bytes, value: Any, expires_at: float) -> None:
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._entries[digest] = (expires_at, value)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revoke(self, digest: bytes, expires_at: float) -> None:
+        """Drop a token and refuse it until it would have expired anyway"""
+        now = self.clock()
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked = {d: exp for d, exp in self._revoked.items() if exp > now}
+            self._revoked[digest] = expires_at
+
+    def is_revoked(self, digest: bytes) -> bool:
+        with self._lock:
+            expires_at = self._revoked.get(digest)
+        return expires_at is not None and expires_at > self.clock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisRevocationStore:
+    """Revoked token digests in Redis, so a logout is seen by every worker process"""
+
+    def __init__(self, client, prefix: str = 'revoked_token', clock: Callable[[], float] = time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    def _key(self, digest: bytes) -> str:
+        return f"{self.prefix}:{digest.hex()}"
+
+    def revoke(self, digest: bytes, expires_at: float) -> None:
+        # Kept until the token would have expired anyway; tokens without exp for a day
+        ttl = expires_at - self.clock() if expires_at != float('inf') else 86400
+        if ttl > 0:
+            self.client.set(self._key(digest), 1, ex=max(1, math.ceil(ttl)))
+
+    def is_revoked(self, digest: bytes) -> bool:
+        return bool(self.client.exists(self._key(digest)))
+
+
+class TokenVerifier:
+    """Verifies JWTs once and serves repeated requests with the same token from a cache.
+
+    factory turns verified claims into the object returned to callers (e.g.
+    a User), so that object is built once per token as well. Tokens without
+    an exp claim are cached for at most max_ttl seconds.
+
+    Revocations are kept in this process unless a shared revocation store is
+    given. A token found not revoked there is not looked up again for
+    revocation_check_interval seconds, so revocations by other processes
+    take up to that long to apply. When the store cannot be reached, tokens
+    are accepted (fail open) and the error is logged at most once every
+    error_log_interval seconds.
+    """
+
+    def __init__(self, secret_key: str, factory: Callable[[Dict[str, Any]], Any] = dict,
+                 algorithms: Sequence[str] = ('HS256',), max_size: int = 10000,
+                 max_ttl: float = 300, clock: Callable[[], float] = time.time,
+                 revocations: Optional[RedisRevocationStore] = None,
+                 revocation_check_interval: float = 1.0, error_log_interval: float = 60.0):
+        self.secret_key = secret_key
+        self.factory = factory
+        self.algorithms = list(algorithms)
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self.cache = VerifiedTokenCache(max_size, clock)
+        self.revocations = revocations
+        self.revocation_check_interval = revocation_check_interval
+        self.error_log_interval = error_log_interval
+        # digest -> time it was last found not revoked in the shared store
+        self._not_revoked: 'OrderedDict[bytes, float]' = OrderedDict()
+        self._error_logged_at = float('-inf')
+        self._errors_suppressed = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _log_store_error(self, action: str, error: Exception) -> None:
+        now = self.clock()
+        with self._lock:
+            if now - self._error_logged_at < self.error_log_interval:
+                self._errors_suppressed += 1
+                return
+            suppressed, self._errors_suppressed = self._errors_suppressed, 0
+            self._error_logged_at = now
+        repeated = f" ({suppressed} more failures since the last report)" if suppressed else ''
+        self.logger.error(f"Failed to {action}: {str(error)}{repeated}")
+
+    def _revoked_elsewhere(self, digest: bytes) -> bool:
+        if self.revocations is None:
+            return False
+        now = self.clock()
+        with self._lock:
+            checked_at = self._not_revoked.get(digest)
+        if checked_at is not None and now - checked_at < self.revocation_check_interval:
+            return False
+        try:
+            revoked = self.revocations.is_revoked(digest)
+        except Exception as e:
+            self._log_store_error('check token revocation', e)
+            revoked = False
+        if not revoked:
+            with self._lock:
+                self._not_revoked[digest] = now
+                self._not_revoked.move_to_end(digest)
+                while len(self._not_revoked) > self.max_size:
+                    self._not_revoked.popitem(last=False)
+        return revoked
+
+    def verify(self, token: str) -> Any:
+        """Return the object for a valid token; raises jwt.InvalidTokenError otherwise"""
+        digest = token_digest(token)
+        if self._revoked_elsewhere(digest):
+            raise jwt.InvalidTokenError('Token has been revoked')
+        value = self.cache.get(digest)
+        if value is not None:
+            TOKEN_CACHE_REQUESTS.labels(result='hit').inc()
+            return value
+        TOKEN_CACHE_REQUESTS.labels(result='miss').inc()
+
+        claims = jwt.decode(token, self.secret_key, algorithms=self.algorithms)
+        if self.cache.is_revoked(digest):
+            raise jwt.InvalidTokenError('Token has been revoked')
+        value = self.factory(claims)
+        expires_at = claims.get('exp', self.clock() + self.max_ttl)
+        self.cache.put(digest, value, expires_at)
+        return value
+
+    def revoke(self, token: str) -> None:
+        """Revoke a token, e.g. on logout; invalid tokens are ignored"""
+        try:
+            claims = jwt.decode(token, self.secret_key, algorithms=self.algorithms,
+                                options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            return
+        digest, expires_at = token_digest(token), claims.get('exp', float('inf'))
+        self.cache.revoke(digest, expires_at)
+        if self.revocations is not None:
+            try:
+                self.revocations.revoke(digest, expires_at)
+            except Exception as e:
+                self._log_store_error('share token revocation', e)
@@ -1,13 +1,51 @@
 import joblib
+import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.datasets import make_classification
+from feature_encoder import FeatureEncoder, VM_SIZE_SPECS, vm_size_spec
+from forest_compiler import compile_forest
 
-# Generate a random dataset for training
-X, y = make_classification(n_samples=1000, n_features=5, random_state=42)
+LOCATIONS = ['eastus', 'westus', 'northeurope', 'westeurope']
+IMAGES = ['UbuntuLTS', 'Debian11', 'CentOS85Gen2']
+NODE_TYPES = ['validator', 'observer', 'bootnode']
+# Minimum vCPUs a node type needs to keep up with the chain
+MIN_VCPUS = {'validator': 4, 'observer': 2, 'bootnode': 1}
 
-# Train a RandomForestClassifier
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X, y)
+def generate_configs(n_samples, random_state=42):
+    """Generate a synthetic set of deployment configs and whether each one is optimal"""
+    rng = np.random.default_rng(random_state)
+    configs = [
+        {
+            'location': str(rng.choice(LOCATIONS)),
+            'image': str(rng.choice(IMAGES)),
+            'vm_size': str(rng.choice(list(VM_SIZE_SPECS))),
+            'node_type': str(rng.choice(NODE_TYPES)),
+            'node_count': int(rng.integers(1, 11))
+        }
+        for _ in range(n_samples)
+    ]
+    labels = np.array([
+        vm_size_spec(c['vm_size'])[0] >= MIN_VCPUS[c['node_type']] for c in configs
+    ], dtype=int)
+    # Flip a few labels so the model has noise to cope with
+    noise = rng.random(n_samples) < 0.05
+    labels[noise] = 1 - labels[noise]
+    return configs, labels
 
-# Save the trained model to a file
-joblib.dump(model, 'ml_model.pkl')
+if __name__ == '__main__':
+    configs, y = generate_configs(1000)
+
+    # Fit the feature encoder shared with ml_model
+    encoder = FeatureEncoder()
+    X = encoder.fit_transform(configs)
+
+    # Train a RandomForestClassifier
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X, y)
+
+    # Save the trained model and its encoder
+    joblib.dump(model, 'ml_model.pkl')
+    encoder.save('feature_encoder.json')
+
+    # Compile the forest for serving, checked against scikit-learn on fresh configs too
+    check_configs, _ = generate_configs(5000, random_state=0)
+    compile_forest(model, np.vstack([X, encoder.transform(check_configs)]), 'compiled_model')
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Train the deployment model on recorded deployment outcomes.
+
+Runs outside the web process (e.g. from cron). New outcomes are appended
+to a local training set since the last cursor, a forest is trained on the
+whole set and published as a new version in the model registry, which
+running workers switch to without a restart.
+
+Usage: python training_pipeline.py [--min-samples 50] [--no-activate]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from deployment_telemetry import DeploymentTelemetryStore
+from feature_encoder import FeatureEncoder
+from model_registry import ModelRegistry
+from train_model import generate_configs
+
+DATA_FILE = 'outcomes.jsonl'
+CURSOR_FILE = 'cursor.json'
+
+
+class TrainingSet:
+    """Deployment outcomes accumulated as JSON lines, with the id of the last one read"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.data_path = os.path.join(directory, DATA_FILE)
+        self.cursor_path = os.path.join(directory, CURSOR_FILE)
+        self.logger = logging.getLogger(__name__)
+
+    def cursor(self) -> int:
+        try:
+            with open(self.cursor_path, 'r', encoding='utf-8') as f:
+                return int(json.load(f)['last_id'])
+        except FileNotFoundError:
+            return 0
+
+    def _save_cursor(self, last_id: int) -> None:
+        fd, tmp_path = tempfile.mkstemp(prefix='.cursor-', dir=self.directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(tmp_path, self.cursor_path)
+
+    def update(self, store: DeploymentTelemetryStore, page_size: int = 5000) -> int:
+        """Append the outcomes recorded since the cursor; returns how many were added"""
+        os.makedirs(self.directory, exist_ok=True)
+        cursor = self.cursor()
+        added = 0
+        while True:
+            outcomes = store.fetch_since(cursor, page_size)
+            if not outcomes:
+                break
+            with open(self.data_path, 'a', encoding='utf-8') as f:
+                for outcome in outcomes:
+                    f.write(json.dumps({
+                        'id': outcome['id'],
+                        'config': outcome['config'],
+                        'success': outcome['success'],
+                        'duration_seconds': outcome['duration_seconds']
+                    }) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            cursor = outcomes[-1]['id']
+            self._save_cursor(cursor)
+            added += len(outcomes)
+        if added:
+            self.logger.info(f"Added {added} deployment outcomes to the training set")
+        return added
+
+    def load(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Configs and success labels of every outcome in the set"""
+        configs, labels = [], []
+        last_id = 0
+        try:
+            with open(self.data_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    outcome = json.loads(line)
+                    # Rows appended again after a crash before the cursor was saved
+                    if outcome['id'] <= last_id:
+                        continue
+                    last_id = outcome['id']
+                    configs.append(outcome['config'])
+                    labels.append(int(outcome['success']))
+        except FileNotFoundError:
+            pass
+        return configs, np.array(labels, dtype=int)
+
+
+def train(training_set: TrainingSet, registry: ModelRegistry, min_samples: int = 50,
+          n_estimators: int = 100, random_state: int = 42, activate: bool = True) -> Optional[str]:
+    """Train on the whole training set and publish a model version; None if there is too little data"""
+    logger = logging.getLogger(__name__)
+    configs, y = training_set.load()
+    if len(configs) < min_samples:
+        logger.info(f"Not training: {len(configs)} outcomes, {min_samples} needed")
+        return None
+    if len(np.unique(y)) < 2:
+        logger.info("Not training: every recorded deployment has the same outcome")
+        return None
+
+    encoder = FeatureEncoder()
+    X = encoder.fit_transform(configs)
+    model = RandomForestClassifier(n_estimators=n_estimators, oob_score=True, random_state=random_state)
+    model.fit(X, y)
+
+    # Check the compiled forest on unseen combinations as well as on the training rows
+    check_configs, _ = generate_configs(2000, random_state=0)
+    X_check = np.vstack([X, encoder.transform(check_configs)])
+    return registry.publish(model, encoder, X_check, {
+        'source': 'telemetry',
+        'n_samples': len(configs),
+        'success_rate': float(y.mean()),
+        'oob_accuracy': float(model.oob_score_),
+        'n_estimators': n_estimators,
+        'telemetry_cursor': training_set.cursor(),
+        'feature_names': encoder.feature_names
+    }, activate=activate)
+
+
+def main():
+    from dependency_container import container
+
+    parser = argparse.ArgumentParser(description='Train the deployment model on recorded outcomes')
+    parser.add_argument('--training-dir', default='data/training_set')
+    parser.add_argument('--min-samples', type=int, default=50)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--no-activate', action='store_true',
+                        help='Publish the new version without making it current')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    container.load_config_from_env()
+    ml_config = container.get_config('app_config')['ml']
+
+    training_set = TrainingSet(args.training_dir)
+    training_set.update(DeploymentTelemetryStore(ml_config['telemetry_db_path']))
+    version = train(training_set, ModelRegistry(ml_config['registry_dir']), args.min_samples,
+                    args.n_estimators, activate=not args.no_activate)
+    if version:
+        logging.info(f"Trained model {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
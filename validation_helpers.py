@@ -1,8 +1,14 @@
 import re
 import html
 import json
-from typing import Dict, Any, Tuple, Optional, List
+from typing import Dict, Any, Tuple, Optional, List, Iterable, Iterator
 import ipaddress
+from validation_schema import (
+    RESOURCE_NAME_RE, SUBNET_PREFIX_RE, EMAIL_RE, MONITORING_SCHEMA, FIREWALL_RULE_SCHEMA,
+    SIMPLE_SCHEMA, EXPERT_SCHEMA, FieldError, error_messages, validation_result
+)
+
+_UNSAFE_CHARS_RE = re.compile(r'[;&<>`\'"]')
 
 class InputValidationError(Exception):
     pass
@@ -12,7 +18,7 @@ def sanitize_input(value: str) -> str:
     # HTML encode special characters
     sanitized = html.escape(value)
     # Remove potentially dangerous characters
-    sanitized = re.sub(r'[;&<>`\'"]', '', sanitized)
+    sanitized = _UNSAFE_CHARS_RE.sub('', sanitized)
     return sanitized
 
 def validate_ip_address(ip: str) -> bool:
@@ -29,7 +35,7 @@ def validate_port_range(port: int) -> bool:
 
 def validate_resource_name(name: str) -> Tuple[bool, Optional[str]]:
     """Validate Azure resource name"""
-    if not re.match(r'^[a-zA-Z0-9-_]{3,64}$', name):
+    if not RESOURCE_NAME_RE.fullmatch(name):
         return False, "Resource name must be 3-64 characters and contain only letters, numbers, hyphens, and underscores"
     return True, None
 
@@ -41,7 +47,7 @@ def validate_location(location: str, valid_locations: List[str]) -> Tuple[bool,
 
 def validate_subnet_prefix(prefix: str) -> Tuple[bool, Optional[str]]:
     """Validate subnet prefix format and range"""
-    if not re.match(r'^([0-9]{1,3}\.){3}[0-9]{1,3}\/[0-9]{1,2}$', prefix):
+    if not SUBNET_PREFIX_RE.fullmatch(prefix):
         return False, "Invalid subnet prefix format (e.g., 10.0.0.0/24)"
     
     try:
@@ -55,48 +61,19 @@ def validate_subnet_prefix(prefix: str) -> Tuple[bool, Optional[str]]:
 
 def validate_email(email: str) -> Tuple[bool, Optional[str]]:
     """Validate email address format"""
-    if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+    if not EMAIL_RE.fullmatch(email):
         return False, "Invalid email address format"
     return True, None
 
 def validate_monitoring_config(config: Dict[str, Any]) -> List[str]:
     """Validate monitoring configuration"""
-    errors = []
-    
-    if config.get('enabled'):
-        try:
-            retention = int(config.get('retention', 0))
-            if not 1 <= retention <= 90:
-                errors.append("Retention period must be between 1 and 90 days")
-        except ValueError:
-            errors.append("Invalid retention period value")
-
-        if config.get('alertEmail'):
-            valid, error = validate_email(config['alertEmail'])
-            if not valid:
-                errors.append(error)
-                
-    return errors
+    return error_messages(MONITORING_SCHEMA.validate(config))
 
 def validate_firewall_rules(rules: List[Dict[str, Any]]) -> List[str]:
     """Validate firewall rules configuration"""
     errors = []
-    
-    for rule in rules:
-        try:
-            port = int(rule.get('port', -1))
-            if not validate_port_range(port):
-                errors.append(f"Invalid port number: {port}. Must be between 1 and 65535")
-        except ValueError:
-            errors.append(f"Invalid port value: {rule.get('port')}")
-
-        if rule.get('protocol', '').upper() not in ['TCP', 'UDP']:
-            errors.append(f"Invalid protocol: {rule.get('protocol')}. Must be TCP or UDP")
-            
-        if 'sourceAddress' in rule:
-            if not validate_ip_address(rule['sourceAddress']):
-                errors.append(f"Invalid source IP address: {rule['sourceAddress']}")
-                
+    for i, rule in enumerate(rules):
+        errors.extend(error_messages(FIREWALL_RULE_SCHEMA.validate(rule, f'[{i}]')))
     return errors
 
 def sanitize_json_input(json_str: str) -> Tuple[Dict[str, Any], Optional[str]]:
@@ -120,4 +97,84 @@ def sanitize_json_input(json_str: str) -> Tuple[Dict[str, Any], Optional[str]]:
     except json.JSONDecodeError as e:
         return {}, f"Invalid JSON format: {str(e)}"
     except Exception as e:
-        return {}, f"Validation error: {str(e)}"
\ No newline at end of file
+        return {}, f"Validation error: {str(e)}"
+
+def parse_ndjson(lines: Iterable[Any]) -> Iterator[Any]:
+    """Parse newline-delimited JSON lazily; malformed lines yield an InputValidationError"""
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield InputValidationError(f"Invalid JSON on line {number}: {str(e)}")
+
+class _SubnetIndex:
+    """Finds overlapping CIDR blocks in constant time per lookup.
+
+    Two CIDR blocks overlap only if one contains the other, so it is enough
+    to index every block under each of its supernets.
+    """
+
+    def __init__(self):
+        self._blocks: Dict[Any, int] = {}
+        self._covered: Dict[Any, int] = {}
+
+    def find_overlap(self, network) -> Optional[int]:
+        if network in self._covered:
+            return self._covered[network]
+        for prefixlen in range(network.prefixlen):
+            owner = self._blocks.get(network.supernet(new_prefix=prefixlen))
+            if owner is not None:
+                return owner
+        return None
+
+    def add(self, network, index: int) -> None:
+        self._blocks.setdefault(network, index)
+        for prefixlen in range(network.prefixlen + 1):
+            self._covered.setdefault(network.supernet(new_prefix=prefixlen), index)
+
+def validate_config_batch(configs: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Validate configurations in one pass, yielding a result per config.
+
+    Each config is checked against the schema of its mode, and against the
+    configs before it for duplicate VM names and overlapping subnet prefixes.
+    """
+    vm_names: Dict[str, int] = {}
+    subnets = _SubnetIndex()
+
+    for index, config in enumerate(configs):
+        if isinstance(config, InputValidationError):
+            result = validation_result([FieldError('', str(config))])
+            result['index'] = index
+            yield result
+            continue
+
+        is_expert = isinstance(config, dict) and config.get('mode') == 'expert'
+        errors = (EXPERT_SCHEMA if is_expert else SIMPLE_SCHEMA).validate(config)
+        invalid_paths = {error.path for error in errors}
+
+        if isinstance(config, dict):
+            vm_name = config.get('vmName')
+            if vm_name and 'vmName' not in invalid_paths:
+                first = vm_names.setdefault(vm_name.lower(), index)
+                if first != index:
+                    errors.append(FieldError('vmName', f"Duplicate VM name {vm_name} (also used by config {first})"))
+
+            network = config.get('network')
+            prefix = network.get('subnetPrefix') if is_expert and isinstance(network, dict) else None
+            if prefix and 'network.subnetPrefix' not in invalid_paths:
+                block = ipaddress.ip_network(prefix)
+                owner = subnets.find_overlap(block)
+                if owner is not None:
+                    errors.append(FieldError('network.subnetPrefix',
+                                             f"Subnet prefix {prefix} overlaps with config {owner}"))
+                subnets.add(block, index)
+
+        result = validation_result(errors)
+        result['index'] = index
+        yield result
+
@@ -0,0 +1,371 @@
+"""Declarative schemas for deployment configurations.
+
+Schemas are plain dicts describing each field. compile_schema() turns a
+schema into a tree of closures once, with regular expressions compiled and
+allowed values stored in frozensets, so validating a config does no
+per-call setup. Errors carry the path of the offending field.
+"""
+import ipaddress
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Shared patterns (matched against the whole value)
+RESOURCE_NAME_PATTERN = r'[a-zA-Z0-9-_]{3,64}'
+VNET_NAME_PATTERN = r'[a-zA-Z0-9-_]{2,64}'
+SUBNET_PREFIX_PATTERN = r'([0-9]{1,3}\.){3}[0-9]{1,3}/[0-9]{1,2}'
+EMAIL_PATTERN = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+LOCATION_NAME_PATTERN = r'[a-zA-Z][a-zA-Z0-9-]+'
+VM_NAME_PATTERN = r'[a-zA-Z][a-zA-Z0-9-]{2,63}'
+ADMIN_USERNAME_PATTERN = r'[a-zA-Z][a-zA-Z0-9-]{2,31}'
+
+RESOURCE_NAME_RE = re.compile(RESOURCE_NAME_PATTERN)
+VNET_NAME_RE = re.compile(VNET_NAME_PATTERN)
+SUBNET_PREFIX_RE = re.compile(SUBNET_PREFIX_PATTERN)
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+
+LOCATIONS = ('eastus', 'westus', 'northeurope')
+NODE_TYPES = ('validator', 'observer', 'bootnode')
+VM_SIZES = ('Standard_D2s_v3', 'Standard_D4s_v3', 'Standard_D8s_v3')
+CONSENSUS_PROTOCOLS = ('ibft2', 'qbft', 'clique')
+PROTOCOLS = ('TCP', 'UDP')
+
+_MISSING = object()
+
+
+class FieldError:
+    """A validation failure of a single field"""
+
+    __slots__ = ('path', 'message')
+
+    def __init__(self, path: str, message: str):
+        self.path = path
+        self.message = message
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'path': self.path, 'message': self.message}
+
+    def __repr__(self):
+        return f"FieldError({self.path!r}, {self.message!r})"
+
+
+class CompiledSchema:
+    """A schema compiled into validator closures"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self._validate = _compile_field(spec)
+
+    def validate(self, data: Any, path: str = '') -> List[FieldError]:
+        """Validate data and return every error found (empty when valid)"""
+        errors: List[FieldError] = []
+        self._validate(data, path, errors)
+        return errors
+
+
+def compile_schema(spec: Dict[str, Any]) -> CompiledSchema:
+    """Compile a field spec (usually an object spec) into a reusable validator"""
+    return CompiledSchema(spec)
+
+
+def error_messages(errors: List[FieldError]) -> List[str]:
+    return [error.message for error in errors]
+
+
+def validation_result(errors: List[FieldError]) -> Dict[str, Any]:
+    """Response body of the validation endpoints"""
+    return {
+        'valid': not errors,
+        'errors': error_messages(errors),
+        'field_errors': [error.to_dict() for error in errors]
+    }
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path}.{name}" if path else name
+
+
+_NORMALIZERS = {
+    'upper': lambda value: value.upper() if isinstance(value, str) else value,
+    'lower': lambda value: value.lower() if isinstance(value, str) else value
+}
+
+
+def _compile_field(spec: Dict[str, Any]) -> Callable[[Any, str, List[FieldError]], None]:
+    """Compile one field spec.
+
+    Supported keys: type (string, integer, object, array), required, default,
+    pattern, enum, normalize, min, max, check (callable returning an error
+    message or None), fields (object), items (array), only_if (name of a
+    sibling flag inside an object that enables validating its fields), and
+    message / required_message / type_message, formatted with {value}.
+    """
+    kind = spec.get('type', 'string')
+    required = spec.get('required', False)
+    default = spec.get('default', _MISSING)
+    message = spec.get('message', 'Invalid value')
+    required_message = spec.get('required_message', message)
+    type_message = spec.get('type_message', message)
+    pattern = re.compile(spec['pattern']) if 'pattern' in spec else None
+    choices = frozenset(spec['enum']) if 'enum' in spec else None
+    normalize = _NORMALIZERS[spec['normalize']] if 'normalize' in spec else None
+    minimum = spec.get('min')
+    maximum = spec.get('max')
+    check = spec.get('check')
+    only_if = spec.get('only_if')
+    fields = [(name, _compile_field(child)) for name, child in spec.get('fields', {}).items()]
+    validate_item = _compile_field(spec['items']) if 'items' in spec else None
+
+    def fail(errors, path, template, value):
+        errors.append(FieldError(path, template.format(value=value)))
+
+    def validate(value, path, errors):
+        if value is _MISSING or value is None or value == '':
+            if default is not _MISSING:
+                value = default
+            elif required:
+                fail(errors, path, required_message, None if value is _MISSING else value)
+                return
+            else:
+                return
+
+        if kind == 'object':
+            if not isinstance(value, dict):
+                fail(errors, path, type_message, value)
+                return
+            if only_if is not None and not value.get(only_if):
+                return
+            for name, validate_child in fields:
+                validate_child(value.get(name, _MISSING), _join(path, name), errors)
+            return
+
+        if kind == 'array':
+            if not isinstance(value, list):
+                fail(errors, path, type_message, value)
+                return
+            for i, item in enumerate(value):
+                validate_item(item, f"{path}[{i}]", errors)
+            return
+
+        if kind == 'integer':
+            try:
+                number = int(value)
+            except (TypeError, ValueError):
+                fail(errors, path, type_message, value)
+                return
+            if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+                fail(errors, path, message, number)
+            return
+
+        if not isinstance(value, str):
+            fail(errors, path, type_message, value)
+            return
+        normalized = normalize(value) if normalize else value
+        if pattern is not None and not pattern.fullmatch(normalized):
+            fail(errors, path, message, value)
+            return
+        if choices is not None and normalized not in choices:
+            fail(errors, path, message, value)
+            return
+        if check is not None:
+            problem = check(normalized)
+            if problem:
+                fail(errors, path, problem, value)
+
+    return validate
+
+
+def _check_subnet_range(prefix: str) -> Optional[str]:
+    try:
+        ipaddress.ip_network(prefix)
+    except ValueError as e:
+        return str(e)
+    if not 16 <= int(prefix.split('/')[-1]) <= 29:
+        return 'Subnet prefix must be between /16 and /29'
+    return None
+
+
+def _check_ip_address(address: str) -> Optional[str]:
+    try:
+        ipaddress.ip_address(address)
+    except ValueError:
+        return 'Invalid source IP address: {value}'
+    return None
+
+
+MONITORING_SPEC = {
+    'type': 'object',
+    'only_if': 'enabled',
+    'message': 'Monitoring configuration must be an object',
+    'fields': {
+        'retention': {
+            'type': 'integer', 'default': 0, 'min': 1, 'max': 90,
+            'message': 'Retention period must be between 1 and 90 days',
+            'type_message': 'Invalid retention period'
+        },
+        'alertEmail': {
+            'pattern': EMAIL_PATTERN,
+            'message': 'Invalid email address format'
+        }
+    }
+}
+
+FIREWALL_RULE_SPEC = {
+    'type': 'object',
+    'message': 'Firewall rule must be an object',
+    'fields': {
+        'port': {
+            'type': 'integer', 'default': -1, 'min': 1, 'max': 65535,
+            'message': 'Invalid port number: {value}. Must be between 1 and 65535',
+            'type_message': 'Invalid port value: {value}'
+        },
+        'protocol': {
+            'required': True, 'normalize': 'upper', 'enum': PROTOCOLS,
+            'message': 'Invalid protocol: {value}. Must be TCP or UDP'
+        },
+        'sourceAddress': {
+            'check': _check_ip_address,
+            'message': 'Invalid source IP address: {value}'
+        }
+    }
+}
+
+SIMPLE_CONFIG_SPEC = {
+    'type': 'object',
+    'required': True,
+    'message': 'No data provided',
+    'fields': {
+        'resourceGroup': {'required': True, 'pattern': RESOURCE_NAME_PATTERN,
+                          'message': 'Invalid resource group name'},
+        'location': {'required': True, 'enum': LOCATIONS, 'message': 'Invalid location'},
+        'nodeType': {'required': True, 'enum': NODE_TYPES, 'message': 'Invalid node type'},
+        'vmSize': {'required': True, 'enum': VM_SIZES, 'message': 'Invalid VM size'},
+        'vmName': {'pattern': VM_NAME_PATTERN, 'message': 'Invalid VM name'}
+    }
+}
+
+EXPERT_CONFIG_SPEC = {
+    'type': 'object',
+    'required': True,
+    'message': 'No data provided',
+    'fields': {
+        'resourceGroup': {'pattern': RESOURCE_NAME_PATTERN, 'message': 'Invalid resource group name'},
+        'vmName': {'pattern': VM_NAME_PATTERN, 'message': 'Invalid VM name'},
+        'location': {'enum': LOCATIONS,
+                     'message': f'Invalid location. Must be one of: {", ".join(LOCATIONS)}'},
+        'network': {
+            'type': 'object',
+            'default': {},
+            'message': 'Network configuration must be an object',
+            'fields': {
+                'vnetName': {
+                    'required': True, 'pattern': VNET_NAME_PATTERN,
+                    'message': 'Invalid virtual network name (2-64 chars, alphanumeric, hyphens, underscores)'
+                },
+                'subnetPrefix': {
+                    'pattern': SUBNET_PREFIX_PATTERN, 'check': _check_subnet_range,
+                    'message': 'Invalid subnet prefix format (e.g., 10.0.0.0/24)'
+                }
+            }
+        },
+        'nodes': {
+            'type': 'object',
+            'default': {},
+            'message': 'Node configuration must be an object',
+            'fields': {
+                'count': {
+                    'type': 'integer', 'default': 0, 'min': 1, 'max': 10,
+                    'message': 'Node count must be between 1 and 10',
+                    'type_message': 'Invalid node count'
+                },
+                'consensusProtocol': {
+                    'required': True, 'enum': CONSENSUS_PROTOCOLS,
+                    'message': f'Invalid consensus protocol. Must be one of: {", ".join(CONSENSUS_PROTOCOLS)}'
+                }
+            }
+        },
+        'monitoring': MONITORING_SPEC,
+        'storage': {
+            'type': 'object',
+            'message': 'Storage configuration must be an object',
+            'fields': {
+                'accountName': {'pattern': r'[a-z0-9]{3,24}',
+                                'message': 'Invalid storage account name (3-24 lowercase letters and numbers)'}
+            }
+        },
+        'security': {
+            'type': 'object',
+            'message': 'Security configuration must be an object',
+            'fields': {
+                'firewall_rules': {
+                    'type': 'array',
+                    'items': FIREWALL_RULE_SPEC,
+                    'message': 'Firewall rules must be a list'
+                }
+            }
+        }
+    }
+}
+
+# Configs passed to the azure_operations functions
+OPERATION_CONFIG_SPEC = {
+    'type': 'object',
+    'required': True,
+    'message': 'Configuration must be an object',
+    'fields': dict(
+        {
+            field: {'required': True, 'pattern': pattern,
+                    'required_message': f'Missing required field: {field}',
+                    'message': f'Invalid {field} format'}
+            for field, pattern in (
+                ('name', RESOURCE_NAME_PATTERN),
+                ('location', LOCATION_NAME_PATTERN),
+                ('resource_group', RESOURCE_NAME_PATTERN),
+                ('vm_name', VM_NAME_PATTERN),
+                ('admin_username', ADMIN_USERNAME_PATTERN)
+            )
+        },
+        network={
+            'type': 'object',
+            'message': 'Invalid network configuration',
+            'fields': {
+                'vnet': {'required': True, 'pattern': VNET_NAME_PATTERN,
+                         'message': 'Invalid virtual network name'},
+                'subnet_prefix': {'pattern': SUBNET_PREFIX_PATTERN,
+                                  'message': 'Invalid subnet prefix format'}
+            }
+        },
+        security={
+            'type': 'object',
+            'message': 'Invalid security configuration',
+            'fields': {
+                'firewall_rules': {
+                    'type': 'array',
+                    'message': 'Firewall rules must be a list',
+                    'items': {
+                        'type': 'object',
+                        'message': 'Firewall rule must be an object',
+                        'fields': {
+                            'port': {'type': 'integer', 'default': -1, 'min': 0, 'max': 65535,
+                                     'message': 'Invalid port number: {value}'}
+                        }
+                    }
+                }
+            }
+        },
+        monitoring={
+            'type': 'object',
+            'only_if': 'enabled',
+            'message': 'Invalid monitoring configuration',
+            'fields': {
+                'retention': {'type': 'integer', 'default': 0, 'min': 1, 'max': 365,
+                              'message': 'Retention period must be between 1 and 365 days',
+                              'type_message': 'Invalid retention period value'}
+            }
+        }
+    )
+}
+
+SIMPLE_SCHEMA = compile_schema(SIMPLE_CONFIG_SPEC)
+EXPERT_SCHEMA = compile_schema(EXPERT_CONFIG_SPEC)
+OPERATION_SCHEMA = compile_schema(OPERATION_CONFIG_SPEC)
+MONITORING_SCHEMA = compile_schema(MONITORING_SPEC)
+FIREWALL_RULE_SCHEMA = compile_schema(FIREWALL_RULE_SPEC)